@@ -5,19 +5,49 @@ import plotly.express as px
 import plotly.graph_objects as go
 import folium
 from streamlit_folium import st_folium
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import math
 import time
 import requests
 import json
+import re
 import xml.etree.ElementTree as ET
-from datetime import datetime, timedelta
 try:
     from fpdf import FPDF
     FPDF_AVAILABLE = True
 except Exception:
     FPDF_AVAILABLE = False
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except Exception:
+    REDIS_AVAILABLE = False
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except Exception:
+    FCNTL_AVAILABLE = False
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pa_dataset
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except Exception:
+    PYARROW_AVAILABLE = False
 import textwrap
+import io
+import contextlib
+import sqlite3
+import copy
+import os
+import shutil
+import hashlib
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import threading
+from collections import OrderedDict
 
 
 def create_simple_pdf(title: str, content: str) -> bytes:
@@ -75,13 +105,8 @@ def create_simple_pdf(title: str, content: str) -> bytes:
         return raw
     return str(raw).encode('latin-1')
 
-st.set_page_config(
-    page_title="CivAI",
-    page_icon="🌍",
-    layout="wide"
-)
-
-st.markdown("""
+# Global styles, applied by configure_page
+PAGE_CSS = """
 <style>
     @import url('https://fonts.googleapis.com/css2?family=Orbitron:wght@400;700;900&family=Inter:wght@300;400;600;700&display=swap');
     
@@ -296,7 +321,7 @@ st.markdown("""
         border: 1px solid rgba(255,255,255,0.15);
     }
 </style>
-""", unsafe_allow_html=True)
+"""
 
 
 GLOBAL_CITIES = {
@@ -341,18 +366,950 @@ GLOBAL_CITIES = {
     "Zurich": {"coords": (47.3769, 8.5417), "country": "Switzerland", "pollution_base": 25},
     "Vienna": {"coords": (48.2082, 16.3738), "country": "Austria", "pollution_base": 35},
 }
+POPULAR_CITIES = [
+    "New York", "London", "Tokyo", "Delhi", "Mumbai", "Beijing", 
+    "São Paulo", "Los Angeles", "Paris", "Sydney", "Dubai", "Singapore"
+]
+METERS_PER_DEGREE = 111320
+GRID_MEMORY_BUDGET_MB = 256
+GRID_LAYERS = 3  # dispersion, effectiveness and the post-intervention grid
+CANOPY_INFLUENCE_RADIUS_M = 300
+HEATMAP_MAX_SIDE = 200
+DIRECT_CONVOLUTION_MAX_OPS = 2_000_000
+DISPERSION_CACHE_SIZE = 8
+SCENARIO_MODEL_VERSION = "1"  # bump whenever model changes alter scenario outputs
+SCENARIO_CACHE_DIR = os.environ.get(
+    "CIVAI_SCENARIO_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "civai", "scenarios")
+)
+SCENARIO_CACHE_MAX_MB = 512
+SCENARIO_CACHE_TTL_S = 7 * 24 * 3600  # expiry for scenario results on shared (e.g. Redis) backends
+# Shared cache backend for provider data and scenarios: 'memory' (per process, the
+# default), or opt in to 'sqlite' (shared by processes on one node) or 'redis'
+# (shared by the deployment)
+CACHE_BACKEND = os.environ.get("CIVAI_CACHE_BACKEND", "memory")
+CACHE_SQLITE_PATH = os.environ.get(
+    "CIVAI_CACHE_SQLITE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "civai", "provider_cache.sqlite")
+)
+CACHE_REDIS_URL = os.environ.get("CIVAI_REDIS_URL", "redis://localhost:6379/0")
+CACHE_MAX_ENTRIES = 2048
+TIMELINE_MULTIPLIERS = {
+    "6 months (Emergency)": 0.6,
+    "1 year (Standard)": 1.0,
+    "2 years (Comprehensive)": 1.4
+}
+
+
+TIME_SERIES_CHUNK_CELLS = 4_000_000  # frames x kernel cells evaluated per batch
+PROVIDER_SETTINGS = {
+    # provider: (timeout seconds, retries)
+    'openweather': (10, 2),
+    'waqi': (15, 2),
+    'purpleair': (15, 2),
+    'openaq': (15, 1),
+    'nasa_giovanni': (30, 1),
+    'nasa_firms': (20, 2),
+}
+RETRY_BACKOFF_S = 0.5
+CIRCUIT_FAILURE_THRESHOLD = 3  # consecutive failed requests before a provider is skipped
+CIRCUIT_RESET_S = 120          # how long a tripped provider is skipped before one trial request
+PROVIDER_CACHE_TTLS = {
+    # provider: (soft TTL, hard TTL) in seconds
+    'openweather': (600, 3600),
+    'waqi': (900, 3600),
+    'purpleair': (600, 3600),
+    'openaq': (1800, 7200),
+    'nasa_giovanni': (3600, 6 * 3600),
+    'nasa_firms': (1800, 3 * 3600),
+}
+# Geohash precision each provider's lookups are snapped to, matched to its
+# spatial resolution (precision 6 ~ 1.2 km, 5 ~ 5 km, 4 ~ 39 km cells)
+PROVIDER_GEOHASH_PRECISION = {
+    'openweather': 5,
+    'waqi': 5,
+    'purpleair': 6,
+    'openaq': 5,
+    'nasa_giovanni': 4,
+    'nasa_firms': 5,
+}
+PROVIDER_REFRESH_WORKERS = 4
+STORE_SYNC_WORKERS = 2  # background syncs of the local fire, AOD and history stores
+PREFETCH_INTERVAL_S = 480  # shorter than the smallest soft TTL, so catalogue data never goes stale
+PREFETCH_STAGGER_S = 2     # pause between upstream requests to respect provider rate limits
+FIRE_RADIUS_KM = 50
+FIRE_HISTORY_DAYS = 30
+FIRE_STORE_DIR = os.environ.get(
+    "CIVAI_FIRE_STORE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "civai", "fires")
+)
+FIRE_SENSORS = {
+    'VIIRS_SNPP_NRT': 'VIIRS SNPP',
+    'VIIRS_NOAA20_NRT': 'VIIRS NOAA-20',
+    'MODIS_NRT': 'MODIS',
+}
+FIRE_TILE_DEG = 10
+FIRMS_MAX_DAY_RANGE = 10       # most days FIRMS returns per area request
+FIRE_TODAY_REFRESH_S = 3 * 3600  # today's partitions are still filling and are refetched
+FIRMS_CHUNK_ROWS = 4096
+# Column names in FIRMS CSVs, by preference (VIIRS reports bright_ti4, MODIS brightness)
+FIRMS_COLUMNS = {
+    'lat': ('latitude',),
+    'lon': ('longitude',),
+    'brightness': ('bright_ti4', 'brightness'),
+    'frp': ('frp',),
+    'confidence': ('confidence',),
+    'acq_date': ('acq_date',),
+    'acq_time': ('acq_time',),
+}
+AOD_STORE_DIR = os.environ.get(
+    "CIVAI_AOD_STORE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "civai", "aod")
+)
+AOD_SEED_DIR = os.environ.get("CIVAI_AOD_SEED_DIR")  # local grids/CSVs to seed the store from (offline use)
+AOD_GRID_SHAPE = (180, 360)     # MOD08_D3 1 degree global grid
+AOD_WINDOW_DAYS = 7
+AOD_RECENT_DAYS = 3             # MOD08_D3 lags a day or two, so recent grids may still fill in
+AOD_RECENT_REFRESH_S = 6 * 3600
+AOD_GRID_TIMEOUT_S = 120        # a global map takes far longer than a point request
+AOD_OPEN_GRIDS = 64             # memory-mapped grids kept open
+AOD_TO_PM25 = 85                # ug/m3 of PM2.5 per unit AOD
+TREE_AOD_REDUCTION = 0.15       # trees reduce AOD by approximately 12-18% in urban areas
+HIGH_AOD = 0.3
+SATELLITE_GRID_EXTENT_M = 25000  # covers hotspot and corridor tree placements
+SATELLITE_GRID_CELL_M = 250
+HISTORY_STORE_DIR = os.environ.get(
+    "CIVAI_HISTORY_STORE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "civai", "history")
+)
+HISTORY_BACKFILL_DAYS = 90
+HISTORY_FETCH_WINDOW_DAYS = 30  # span of one paginated OpenAQ measurements query
+HISTORY_PAGE_LIMIT = 1000
+HISTORY_MAX_PAGES = 50
+HISTORY_RADIUS_KM = 25
+HISTORY_REFRESH_S = 3600        # minimum time between incremental syncs of a city
+HISTORY_BATCH_ROWS = 65536      # rows per record batch when reading history
+NO2_UG_PER_PPM = 1880           # NO2 at 25 C and 1 atm
+OPENAQ_MAX_WORKERS = 8  # threads in the shared per-station request pool
+OPENAQ_DEADLINE_S = 8  # total budget for per-station requests
+HTTP_POOL_SIZE = 16
+WIND_ROSE_BINS = 36  # 10 degree direction bins
+WIND_ROSE_CACHE_SIZE = 8
+_ROTATION_TABLES = OrderedDict()
+
+# US EPA AQI breakpoints (2024 revision): concentration low/high and AQI low/high per
+# category, with the truncation (decimal places) EPA applies before looking a value up.
+# Units: PM2.5 and PM10 ug/m3 (24-hour), NO2 ppb (1-hour), O3 ppm (8-hour, and 1-hour
+# for the higher categories).
+AQI_BREAKPOINTS = {
+    'pm25': (1, [(0.0, 9.0, 0, 50), (9.1, 35.4, 51, 100), (35.5, 55.4, 101, 150),
+                 (55.5, 125.4, 151, 200), (125.5, 225.4, 201, 300), (225.5, 325.4, 301, 500)]),
+    'pm10': (0, [(0, 54, 0, 50), (55, 154, 51, 100), (155, 254, 101, 150),
+                 (255, 354, 151, 200), (355, 424, 201, 300), (425, 604, 301, 500)]),
+    'no2': (0, [(0, 53, 0, 50), (54, 100, 51, 100), (101, 360, 101, 150),
+                (361, 649, 151, 200), (650, 1249, 201, 300), (1250, 2049, 301, 500)]),
+    'o3': (3, [(0.000, 0.054, 0, 50), (0.055, 0.070, 51, 100), (0.071, 0.085, 101, 150),
+               (0.086, 0.105, 151, 200), (0.106, 0.200, 201, 300)]),
+    'o3_1h': (3, [(0.125, 0.164, 101, 150), (0.165, 0.204, 151, 200),
+                  (0.205, 0.404, 201, 300), (0.405, 0.604, 301, 500)]),
+}
+# 'legacy' keeps the simplified PM2.5 mapping the app has always shown; 'epa' uses the table above
+AQI_MODE = os.environ.get("CIVAI_AQI_MODE", "legacy")
+
+
+# Monte Carlo input uncertainty
+TREE_EFFECTIVENESS_SD = 0.15      # relative, per realization
+WIND_DIRECTION_SD = 25            # degrees
+HOTSPOT_INTENSITY_SD = 0.3        # lognormal sigma, per source
+MONTE_CARLO_CHUNK_SIZE = 250
+MONTE_CARLO_SEED = 20240601       # fixed seed for the simulator, so bands do not jump between reruns
+MONTE_CARLO_CACHE_SIZE = 8
+MONTE_CARLO_CONFIDENCE_TOLERANCE = 0.25  # confidence = share of realizations within 25% of the median
+
+
+def species_diversity_factor(species_diversity):
+    """Resilience multiplier for a 1-10 species mix (1.0 at the default of 5)"""
+    return 1 + 0.02 * (np.asarray(species_diversity, dtype=float) - 5)
+
+
+def convolve_full(raster, kernel):
+    """Full 2D convolution of a (..., rows, cols) raster stack with a small kernel
+
+    Small problems are summed tap by tap; larger ones go through a batched FFT.
+    """
+    rows, cols = raster.shape[-2:]
+    out_shape = raster.shape[:-2] + (rows + kernel.shape[0] - 1, cols + kernel.shape[1] - 1)
+    taps = np.argwhere(kernel != 0)
+
+    if len(taps) * rows * cols <= DIRECT_CONVOLUTION_MAX_OPS:
+        out = np.zeros(out_shape)
+        for a, b in taps:
+            out[..., a:a + rows, b:b + cols] += kernel[a, b] * raster
+        return out
+
+    fft_shape = out_shape[-2:]
+    spectrum = np.fft.rfft2(raster, s=fft_shape) * np.fft.rfft2(kernel, s=fft_shape)
+    out = np.fft.irfft2(spectrum, s=fft_shape)
+    # Drop FFT round-off so untouched cells stay exactly zero
+    out[np.abs(out) <= 1e-12 * np.abs(out).max(initial=0)] = 0
+    return out
+
+
+def plume_axes(d_north, d_east, wind_rad):
+    """Downwind and crosswind distances of (north, east) offsets from a source
+
+    wind_rad is the direction the wind blows from, clockwise from north, so
+    downwind is (-cos, -sin) in (north, east): a north wind carries the
+    plume south. The map is its own inverse, so plume-frame offsets turn
+    back into (north, east) offsets with the same call.
+    """
+    cos_w, sin_w = np.cos(wind_rad), np.sin(wind_rad)
+    return -d_north * cos_w - d_east * sin_w, -d_north * sin_w + d_east * cos_w
+
+
+class TiledGrid:
+    """Sparse 2D grid stored as lazily allocated square tiles"""
+
+    def __init__(self, shape, tile_size, dtype=np.float64):
+        self.shape = tuple(shape)
+        self.tile_size = tile_size
+        self.dtype = np.dtype(dtype)
+        self.tiles = {}
+
+    @property
+    def size(self):
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def nbytes(self):
+        return sum(tile.nbytes for tile in self.tiles.values())
+
+    def _tile(self, key):
+        tile = self.tiles.get(key)
+        if tile is None:
+            tile = np.zeros((self.tile_size, self.tile_size), dtype=self.dtype)
+            self.tiles[key] = tile
+        return tile
+
+    def add_points(self, rows, cols, weights):
+        """Accumulate weights at (row, col) cells, touching only the tiles they fall in"""
+        if len(rows) == 0:
+            return
+        size = self.tile_size
+        tiles_per_row = -(-self.shape[1] // size)
+        tile_ids = (rows // size) * tiles_per_row + cols // size
+
+        order = np.argsort(tile_ids, kind='stable')
+        tile_ids, rows, cols, weights = tile_ids[order], rows[order], cols[order], weights[order]
+        bounds = np.flatnonzero(np.diff(tile_ids)) + 1
+
+        for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(tile_ids)]):
+            key = divmod(int(tile_ids[start]), tiles_per_row)
+            local = (rows[start:stop] - key[0] * size) * size + (cols[start:stop] - key[1] * size)
+            counts = np.bincount(local, weights=weights[start:stop], minlength=size * size)
+            self._tile(key)[...] += counts.reshape(size, size).astype(self.dtype, copy=False)
+
+    def add_block(self, row0, col0, block):
+        """Add a dense block whose top-left cell is (row0, col0), clipped to the grid"""
+        r_start, c_start = max(row0, 0), max(col0, 0)
+        r_stop = min(row0 + block.shape[0], self.shape[0])
+        c_stop = min(col0 + block.shape[1], self.shape[1])
+        size = self.tile_size
+
+        for tile_row in range(r_start // size, (r_stop - 1) // size + 1):
+            for tile_col in range(c_start // size, (c_stop - 1) // size + 1):
+                tr0, tc0 = tile_row * size, tile_col * size
+                a0, a1 = max(r_start, tr0), min(r_stop, tr0 + size)
+                b0, b1 = max(c_start, tc0), min(c_stop, tc0 + size)
+                piece = block[a0 - row0:a1 - row0, b0 - col0:b1 - col0]
+                if piece.any():
+                    self._tile((tile_row, tile_col))[a0 - tr0:a1 - tr0, b0 - tc0:b1 - tc0] += piece
+
+    def copy(self):
+        result = TiledGrid(self.shape, self.tile_size, self.dtype)
+        result.tiles = {key: tile.copy() for key, tile in self.tiles.items()}
+        return result
+
+    def sum(self):
+        return float(sum(tile.sum(dtype=np.float64) for tile in self.tiles.values()))
+
+    def mean(self):
+        return self.sum() / self.size
+
+    def reduced_by(self, effectiveness):
+        """Return self * (1 - effectiveness), computed only on allocated tiles"""
+        result = TiledGrid(self.shape, self.tile_size, self.dtype)
+        for key, tile in self.tiles.items():
+            other = effectiveness.tiles.get(key)
+            result.tiles[key] = tile * (1 - other) if other is not None else tile.copy()
+        return result
+
+    def to_dense(self):
+        dense = np.zeros(self.shape, dtype=self.dtype)
+        for (tile_row, tile_col), tile in self.tiles.items():
+            r0, c0 = tile_row * self.tile_size, tile_col * self.tile_size
+            block = dense[r0:r0 + self.tile_size, c0:c0 + self.tile_size]
+            block += tile[:block.shape[0], :block.shape[1]]
+        return dense
+
+    def to_stack(self):
+        """Return (keys, tiles) arrays holding only the allocated tiles"""
+        keys = sorted(self.tiles)
+        stack = np.zeros((len(keys), self.tile_size, self.tile_size), dtype=self.dtype)
+        for index, key in enumerate(keys):
+            stack[index] = self.tiles[key]
+        return np.array(keys, dtype=np.int64).reshape(-1, 2), stack
+
+    @classmethod
+    def from_stack(cls, shape, tile_size, keys, stack):
+        """Inverse of to_stack; tiles are views into stack (which may be memory-mapped)"""
+        grid = cls(shape, tile_size, stack.dtype)
+        grid.tiles = {(int(row), int(col)): stack[index] for index, (row, col) in enumerate(keys)}
+        return grid
+
+    def downsample(self, max_side):
+        """Block-mean the grid so neither side exceeds max_side; returns (array, factor)"""
+        factor = max(1, -(-max(self.shape) // max_side))
+        if factor == 1:
+            return self.to_dense(), 1
+
+        out_shape = (-(-self.shape[0] // factor), -(-self.shape[1] // factor))
+        totals = np.zeros(out_shape[0] * out_shape[1])
+        for (tile_row, tile_col), tile in self.tiles.items():
+            rows, cols = np.nonzero(tile)
+            rows_global = rows + tile_row * self.tile_size
+            cols_global = cols + tile_col * self.tile_size
+            totals += np.bincount((rows_global // factor) * out_shape[1] + cols_global // factor,
+                                  weights=tile[rows, cols], minlength=totals.size)
+
+        row_counts = np.minimum(factor, self.shape[0] - np.arange(out_shape[0]) * factor)
+        col_counts = np.minimum(factor, self.shape[1] - np.arange(out_shape[1]) * factor)
+        return totals.reshape(out_shape) / np.outer(row_counts, col_counts), factor
+
+
+class DispersionGrid:
+    """Square simulation grid centred on a city that maps lat/lon onto cell indices
+
+    Grids that fit in a single tile are stored as one dense float64 array;
+    larger grids use sparse float32 tiles. Configurations whose fully
+    populated tiles would exceed memory_budget_mb are refused. Plumes reach
+    the grid diagonal by default, so a source anywhere on the grid can
+    disperse across all of it whatever the extent.
+    """
+
+    def __init__(self, center_lat=None, center_lon=None, extent_m=5000, cell_size_m=100,
+                 plume_reach_m=None, crosswind_sigmas=6, tile_size=256,
+                 memory_budget_mb=GRID_MEMORY_BUDGET_MB):
+        self.center_lat = center_lat
+        self.center_lon = center_lon
+        self.extent_m = extent_m
+        self.cell_size_m = cell_size_m
+        self.size = int(round(extent_m / cell_size_m))
+        if self.size < 1:
+            raise ValueError(f"Grid extent {extent_m} m is smaller than one {cell_size_m} m cell")
+        self.plume_reach_m = plume_reach_m if plume_reach_m is not None else extent_m * np.sqrt(2)
+        self.crosswind_sigmas = crosswind_sigmas
+        self.memory_budget_mb = memory_budget_mb
+        self.center_cell = (self.size // 2, self.size // 2)
+
+        # Radial canopy kernel: 1 at the tree, falling linearly to 0 at the influence radius
+        self.canopy_radius = max(1, int(round(CANOPY_INFLUENCE_RADIUS_M / cell_size_m)))
+        offsets = np.arange(-self.canopy_radius, self.canopy_radius + 1)
+        distance = np.sqrt(offsets[:, None]**2 + offsets[None, :]**2)
+        self.canopy_kernel = np.where(distance <= self.canopy_radius, 1 - distance / self.canopy_radius, 0.0)
+
+        if self.size <= tile_size:
+            self.tile_size, self.dtype = self.size, np.dtype(np.float64)
+        else:
+            self.tile_size, self.dtype = tile_size, np.dtype(np.float32)
+
+        tiles_per_side = -(-self.size // self.tile_size)
+        worst_case_bytes = GRID_LAYERS * tiles_per_side**2 * self.tile_size**2 * self.dtype.itemsize
+        self.check_budget(worst_case_bytes, f"A {self.size}x{self.size} grid")
+
+    def check_budget(self, nbytes, purpose):
+        """Raise ValueError if purpose would need more than memory_budget_mb"""
+        if nbytes > self.memory_budget_mb * 1024**2:
+            raise ValueError(
+                f"{purpose} ({self.extent_m / 1000:g} km at {self.cell_size_m} m, "
+                f"{self.plume_reach_m / 1000:.1f} km plume reach) needs up to {nbytes / 1024**2:.0f} MB, "
+                f"over the {self.memory_budget_mb} MB budget"
+            )
+
+    def new_layer(self):
+        return TiledGrid(self.shape, self.tile_size, self.dtype)
+
+    @property
+    def shape(self):
+        return (self.size, self.size)
+
+    def locate(self, items):
+        """Return (rows, cols, inside) cell indices for dicts with 'lat'/'lon'
+
+        Rows run south to north and columns west to east. Items without
+        coordinates (or a grid without a centre) are pinned to the centre cell.
+        """
+        n = len(items)
+        rows = np.full(n, self.center_cell[0], dtype=int)
+        cols = np.full(n, self.center_cell[1], dtype=int)
+
+        if self.center_lat is not None and self.center_lon is not None:
+            lats = np.array([item.get('lat', np.nan) for item in items], dtype=float)
+            lons = np.array([item.get('lon', np.nan) for item in items], dtype=float)
+            located = ~(np.isnan(lats) | np.isnan(lons))
+
+            north_m = (lats - self.center_lat) * METERS_PER_DEGREE
+            east_m = (lons - self.center_lon) * METERS_PER_DEGREE * np.cos(np.radians(self.center_lat))
+            rows[located] = self.center_cell[0] + np.rint(north_m[located] / self.cell_size_m).astype(int)
+            cols[located] = self.center_cell[1] + np.rint(east_m[located] / self.cell_size_m).astype(int)
+
+        inside = (rows >= 0) & (rows < self.size) & (cols >= 0) & (cols < self.size)
+        return rows, cols, inside
+
+    def plume_footprint(self, wind_direction, sigma_y):
+        """Cell offsets and unit-intensity concentrations covered by one source's plume
+
+        The footprint is bounded to plume_reach_m downwind and crosswind_sigmas
+        standard deviations either side of the plume axis, so its cost depends
+        on plume area rather than on the size of the grid.
+        """
+        wind_rad = np.radians(wind_direction)
+        half_width = self.crosswind_sigmas * sigma_y
+
+        # Bounding box of the rotated plume rectangle, in grid coordinates
+        corners_rot = np.array([[0, -half_width], [0, half_width],
+                                [self.plume_reach_m, -half_width], [self.plume_reach_m, half_width]])
+        corners_dx, corners_dy = plume_axes(corners_rot[:, 0], corners_rot[:, 1], wind_rad)
+        di = np.arange(int(np.floor(corners_dx.min() / self.cell_size_m)),
+                       int(np.ceil(corners_dx.max() / self.cell_size_m)) + 1)
+        dj = np.arange(int(np.floor(corners_dy.min() / self.cell_size_m)),
+                       int(np.ceil(corners_dy.max() / self.cell_size_m)) + 1)
+
+        dx_rot, dy_rot = plume_axes(di[:, None] * self.cell_size_m, dj[None, :] * self.cell_size_m, wind_rad)
+
+        in_plume = (dx_rot > 0) & (dx_rot <= self.plume_reach_m) & (np.abs(dy_rot) <= half_width)
+        concentration = np.exp(-0.5 * ((dy_rot / sigma_y)**2)) / (sigma_y * np.sqrt(2 * np.pi))
+
+        offset_i, offset_j = np.nonzero(in_plume)
+        return di[offset_i], dj[offset_j], concentration[in_plume]
+
+    @property
+    def kernel_radius(self):
+        """Cells from a source to the farthest cell any plume footprint can reach"""
+        half_width = self.crosswind_sigmas * 15  # sigma_y is capped at 15 m
+        return int(np.ceil(np.hypot(self.plume_reach_m, half_width) / self.cell_size_m))
+
+    def rotation_table(self, bins=WIND_ROSE_BINS):
+        """Along-wind and crosswind offsets of every kernel cell at each bin's centre direction
+
+        Returns (dx_rot, dy_rot), each (bins, 2R+1, 2R+1). Tables are built
+        once per grid configuration and shared by every grid and engine
+        using it, so wind roses never recompute trigonometry per cell.
+        """
+        key = (self.cell_size_m, self.kernel_radius, bins)
+        table = _ROTATION_TABLES.get(key)
+        if table is not None:
+            _ROTATION_TABLES.move_to_end(key)
+            return table
+        # Two tables plus the binned kernels built from them
+        self.check_budget(3 * bins * (2 * self.kernel_radius + 1)**2 * 8, "A wind-rose rotation table")
+
+        wind_rad = np.radians(np.arange(bins) * 360 / bins)[:, None, None]
+        offsets = np.arange(-self.kernel_radius, self.kernel_radius + 1)
+        dx = offsets[None, :, None] * self.cell_size_m
+        dy = offsets[None, None, :] * self.cell_size_m
+        table = plume_axes(dx, dy, wind_rad)
+        _ROTATION_TABLES[key] = table
+        if len(_ROTATION_TABLES) > WIND_ROSE_CACHE_SIZE:
+            _ROTATION_TABLES.popitem(last=False)
+        return table
+
+    def binned_plume_kernels(self, sigma_y, bins=WIND_ROSE_BINS):
+        """Unit plume kernels for every wind bin, looked up from the rotation table"""
+        dx_rot, dy_rot = self.rotation_table(bins)
+        in_plume = (dx_rot > 0) & (dx_rot <= self.plume_reach_m) & (np.abs(dy_rot) <= self.crosswind_sigmas * sigma_y)
+        concentration = np.exp(-0.5 * ((dy_rot / sigma_y)**2)) / (sigma_y * np.sqrt(2 * np.pi))
+        return np.where(in_plume, concentration, 0.0)
+
+    def plume_cells(self, wind_directions, sigma_y):
+        """Footprints of a batch of plumes as (frames, cells) offset and concentration arrays
+
+        Each row holds the same cells and values as plume_footprint for that
+        wind direction, padded with zero concentrations. A plume is a thin
+        band, so the candidates are one short run of cells across the band
+        per step along its dominant axis rather than the whole kernel window.
+        """
+        wind_rad = np.radians(np.asarray(wind_directions, dtype=float))[:, None, None]
+        half_width = self.crosswind_sigmas * sigma_y
+        radius = self.kernel_radius
+        cos_w, sin_w = np.cos(wind_rad), np.sin(wind_rad)
+        rows_major = np.abs(cos_w) >= np.abs(sin_w)
+        major = np.where(rows_major, cos_w, sin_w)
+        minor = np.where(rows_major, sin_w, cos_w)
+
+        # The band's axis crosses step s of the dominant axis at s * minor / major
+        # cells, and the band spans half_width / |major| metres either side of it
+        steps = np.arange(-radius, radius + 1)[None, :, None]
+        run = np.arange(int(np.ceil(2 * half_width * np.sqrt(2) / self.cell_size_m)) + 2)[None, None, :]
+        across = np.floor(steps * minor / major - half_width / np.abs(major) / self.cell_size_m) + run
+        di = np.where(rows_major, steps, across).astype(int)
+        dj = np.where(rows_major, across, steps).astype(int)
+
+        dx_rot, dy_rot = plume_axes(di * self.cell_size_m, dj * self.cell_size_m, wind_rad)
+        in_plume = ((dx_rot > 0) & (dx_rot <= self.plume_reach_m) & (np.abs(dy_rot) <= half_width)
+                    & (np.abs(di) <= radius) & (np.abs(dj) <= radius))
+        concentration = np.exp(-0.5 * ((dy_rot / sigma_y)**2)) / (sigma_y * np.sqrt(2 * np.pi))
+        frames = len(wind_rad)
+        return (di.reshape(frames, -1), dj.reshape(frames, -1),
+                np.where(in_plume, concentration, 0.0).reshape(frames, -1))
+
+    def plume_kernels(self, wind_directions, sigma_ys):
+        """Unit plume kernels for a batch of frames: (frames, 2R+1, 2R+1), centred on the source
+
+        Each kernel holds the same cells and values as plume_footprint for
+        that frame, laid out on a common offset window of radius kernel_radius.
+        """
+        wind_rad = np.radians(np.asarray(wind_directions, dtype=float))[:, None, None]
+        sigma_y = np.asarray(sigma_ys, dtype=float)[:, None, None]
+        offsets = np.arange(-self.kernel_radius, self.kernel_radius + 1)
+        dx = offsets[None, :, None] * self.cell_size_m
+        dy = offsets[None, None, :] * self.cell_size_m
+
+        dx_rot, dy_rot = plume_axes(dx, dy, wind_rad)
+        in_plume = (dx_rot > 0) & (dx_rot <= self.plume_reach_m) & (np.abs(dy_rot) <= self.crosswind_sigmas * sigma_y)
+        concentration = np.exp(-0.5 * ((dy_rot / sigma_y)**2)) / (sigma_y * np.sqrt(2 * np.pi))
+        return np.where(in_plume, concentration, 0.0)
+
+
+class MemoryCacheBackend:
+    """Per-process LRU cache backend
+
+    Backends map string keys to (value, stored_at) and drop entries after
+    their ttl_s; the SQLite and Redis backends implement the same methods.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value, stored_at
+
+    def set(self, key, value, stored_at, ttl_s=None):
+        with self._lock:
+            self._entries[key] = (value, stored_at, stored_at + ttl_s if ttl_s else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def encode_cache_value(value):
+    """Serialize a cache value as a JSON line followed by its numpy arrays in .npy format
+
+    Tuples and arrays are tagged so they round-trip and numpy scalars become
+    Python numbers. Shared backends store these bytes instead of pickles, so
+    reading an entry never runs code from the store.
+    """
+    arrays = []
+
+    def tag(item):
+        if isinstance(item, np.ndarray):
+            arrays.append(item)
+            return {'__ndarray__': len(arrays) - 1}
+        if isinstance(item, tuple):
+            return {'__tuple__': [tag(element) for element in item]}
+        if isinstance(item, list):
+            return [tag(element) for element in item]
+        if isinstance(item, dict):
+            return {key: tag(element) for key, element in item.items()}
+        if isinstance(item, np.generic):
+            return item.item()
+        return item
+
+    buffer = io.BytesIO()
+    buffer.write(json.dumps(tag(value), separators=(',', ':')).encode() + b"\n")
+    for array in arrays:
+        np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def decode_cache_value(raw):
+    """Inverse of encode_cache_value; object arrays are refused rather than unpickled"""
+    buffer = io.BytesIO(raw)
+    document = json.loads(buffer.readline())
+    arrays = []
+    while buffer.tell() < len(raw):
+        arrays.append(np.load(buffer, allow_pickle=False))
+
+    def untag(item):
+        if isinstance(item, list):
+            return [untag(element) for element in item]
+        if isinstance(item, dict):
+            if len(item) == 1 and '__ndarray__' in item:
+                return arrays[item['__ndarray__']]
+            if len(item) == 1 and '__tuple__' in item:
+                return tuple(untag(element) for element in item['__tuple__'])
+            return {key: untag(element) for key, element in item.items()}
+        return item
+
+    return untag(document)
+
+
+class SQLiteCacheBackend:
+    """Cache backend in a local SQLite file, shared by every process on the node"""
+
+    def __init__(self, path=CACHE_SQLITE_PATH, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "stored_at REAL NOT NULL, expires_at REAL, last_used REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        connection = self._connect()
+        row = connection.execute(
+            "SELECT value, stored_at, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[2] is not None and row[2] < now:
+            connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+        try:
+            value = decode_cache_value(row[0])
+        except ValueError:
+            # Unreadable (e.g. written by an older version): treat as a miss
+            connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+        connection.execute("UPDATE cache SET last_used = ? WHERE key = ?", (now, key))
+        return value, row[1]
+
+    def set(self, key, value, stored_at, ttl_s=None):
+        connection = self._connect()
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO cache (key, value, stored_at, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, encode_cache_value(value), stored_at, stored_at + ttl_s if ttl_s else None, now)
+        )
+        connection.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+        connection.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+
+class RedisCacheBackend:
+    """Cache backend on a Redis-compatible client (anything with get, set(ex=) and delete)"""
+
+    def __init__(self, client, prefix="civai:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        try:
+            return decode_cache_value(raw)
+        except ValueError:
+            self.client.delete(self.prefix + key)
+            return None
+
+    def set(self, key, value, stored_at, ttl_s=None):
+        # Expiry counts from stored_at, as in the other backends
+        expiry = None
+        if ttl_s:
+            expiry = int(math.ceil(stored_at + ttl_s - time.time()))
+            if expiry <= 0:
+                self.client.delete(self.prefix + key)
+                return
+        self.client.set(self.prefix + key, encode_cache_value((value, stored_at)), ex=expiry)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+def make_cache_backend(kind=None):
+    """Build the configured cache backend, falling back towards 'memory' if it is unavailable"""
+    kind = kind or CACHE_BACKEND
+    if kind == 'redis':
+        if REDIS_AVAILABLE:
+            try:
+                client = redis.Redis.from_url(CACHE_REDIS_URL)
+                client.ping()
+                return RedisCacheBackend(client)
+            except Exception as e:
+                print(f"Redis cache unavailable, using SQLite: {e}")
+        else:
+            print("redis package not installed, using SQLite cache")
+        kind = 'sqlite'
+    if kind == 'sqlite':
+        try:
+            return SQLiteCacheBackend()
+        except Exception as e:
+            print(f"SQLite cache unavailable, using memory: {e}")
+    return MemoryCacheBackend()
+
+
+class ScenarioDiskCache:
+    """Content-addressed on-disk store for scenario results, evicted LRU by total bytes
+
+    Each entry is a directory named by the input fingerprint holding the
+    allocated tiles of each grid as .npy files (read back memory-mapped) and
+    the scalar metrics as JSON. Entries are written to a temporary directory
+    and renamed into place, so concurrent workers never see partial results.
+    """
+
+    LAYERS = ('dispersion_grid', 'effectiveness_grid')
+
+    def __init__(self, directory=SCENARIO_CACHE_DIR, max_bytes=SCENARIO_CACHE_MAX_MB * 1024**2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def fingerprint(sources, trees, weather_data, grid):
+        """Hash every input that affects a scenario result"""
+        payload = {
+            'model_version': SCENARIO_MODEL_VERSION,
+            'grid': [grid.center_lat, grid.center_lon, grid.extent_m, grid.cell_size_m,
+                     grid.plume_reach_m, grid.crosswind_sigmas, grid.tile_size, grid.dtype.str],
+            'sources': [(s.get('lat'), s.get('lon'), s['intensity']) for s in sources],
+            'trees': [(t.get('lat'), t.get('lon'), t['effectiveness']) for t in trees],
+            'weather': [weather_data.get('wind_speed', 10), weather_data['wind_direction'],
+                        weather_data.get('temperature', 25), weather_data.get('wind_rose')],
+        }
+        encoded = json.dumps(payload, default=float, separators=(',', ':')).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key, grid):
+        """Return the cached result for key (grids memory-mapped), or None"""
+        entry = self._entry(key)
+        meta_path = os.path.join(entry, 'meta.json')
+        try:
+            with open(meta_path) as handle:
+                result = json.load(handle)
+            for name in self.LAYERS:
+                keys = np.load(os.path.join(entry, f'{name}.keys.npy'))
+                stack = np.load(os.path.join(entry, f'{name}.npy'), mmap_mode='c')
+                result[name] = TiledGrid.from_stack(grid.shape, grid.tile_size, keys, stack)
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+        return result
+
+    def put(self, key, result):
+        """Store a scenario result and evict least recently used entries over max_bytes"""
+        entry = self._entry(key)
+        if os.path.isdir(entry):
+            return
+        staging = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(staging, exist_ok=True)
+            for name in self.LAYERS:
+                keys, stack = result[name].to_stack()
+                np.save(os.path.join(staging, f'{name}.keys.npy'), keys)
+                np.save(os.path.join(staging, f'{name}.npy'), stack)
+            meta = {k: v for k, v in result.items() if k not in self.LAYERS}
+            with open(os.path.join(staging, 'meta.json'), 'w') as handle:
+                json.dump(meta, handle, default=float)
+            os.rename(staging, entry)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                files = [os.path.join(path, f) for f in os.listdir(path)]
+                size = sum(os.path.getsize(f) for f in files)
+                last_used = os.path.getmtime(os.path.join(path, 'meta.json'))
+            except OSError:
+                continue
+            entries.append((last_used, size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+class ScenarioBackendCache:
+    """Scenario result cache on a shared CacheBackend, for deployments spanning several nodes
+
+    Same interface as ScenarioDiskCache; grids are stored as their allocated
+    tiles alongside the metrics in one backend entry.
+    """
+
+    LAYERS = ScenarioDiskCache.LAYERS
+    fingerprint = staticmethod(ScenarioDiskCache.fingerprint)
+
+    def __init__(self, backend, ttl_s=SCENARIO_CACHE_TTL_S):
+        self.backend = backend
+        self.ttl_s = ttl_s
+
+    def get(self, key, grid):
+        entry = self.backend.get(f"scenario|{key}")
+        if entry is None:
+            return None
+        result = entry[0]
+        for name in self.LAYERS:
+            tile_keys, stack = result[name]
+            result[name] = TiledGrid.from_stack(grid.shape, grid.tile_size, tile_keys, stack)
+        return result
+
+    def put(self, key, result):
+        payload = {name: value for name, value in result.items() if name not in self.LAYERS}
+        for name in self.LAYERS:
+            payload[name] = result[name].to_stack()
+        self.backend.set(f"scenario|{key}", payload, time.time(), ttl_s=self.ttl_s)
+
+
+def get_scenario_cache():
+    """Scenario cache for the configured backend: on disk per node, or shared through Redis"""
+    if CACHE_BACKEND == 'redis':
+        backend = get_provider_cache().backend
+        if isinstance(backend, RedisCacheBackend):
+            return ScenarioBackendCache(backend)
+    return ScenarioDiskCache()
+
+
 class AIClimateEngine:
     """Advanced AI simulation engine for climate impact prediction"""
-    
-    def __init__(self):
+
+    def __init__(self, dispersion_mode='vectorized', grid=None, disk_cache=None):
+        if dispersion_mode not in ('vectorized', 'reference'):
+            raise ValueError(f"Unknown dispersion mode: {dispersion_mode}")
+        self.dispersion_mode = dispersion_mode
+        self.grid = grid if grid is not None else DispersionGrid()
+        self.disk_cache = disk_cache
+        self._dispersion_cache = OrderedDict()
+        self._rose_kernels = OrderedDict()
+        self._monte_carlo_cache = OrderedDict()
+        self._canopy_keys = []
+        self._canopy_trees = []
+        self._canopy_grid = None
         self.models = {
             'dispersion': self._pollution_dispersion_model,
             'canopy': self._canopy_effectiveness_model,
             'urban_heat': self._urban_heat_reduction_model
         }
-    
+
     def _pollution_dispersion_model(self, sources, weather, terrain):
-        """Simulate pollution dispersion using simplified Gaussian plume model"""
+        """Simulate pollution dispersion using simplified Gaussian plume model
+
+        Sources are placed at their real lat/lon on self.grid, with rows
+        pointing north, and the plume runs downwind of wind_direction (see
+        plume_axes). The reference loop has no north: with sources at the
+        centre cell this matches it mirrored north-south, to within
+        exp(-crosswind_sigmas**2 / 2) of the peak concentration (about 1.5e-8
+        relative at the default 6 sigmas). The difference comes from truncating
+        the plume footprint, not from rounding. Use dispersion_mode='reference'
+        to run the original cell-by-cell loop with every source pinned to the centre.
+        """
+        if self.dispersion_mode == 'reference':
+            return self._pollution_dispersion_model_reference(sources, weather, terrain)
+
+        wind_direction = weather.get('wind_direction', np.random.uniform(0, 360))
+        wind_speed = weather.get('wind_speed', 10)
+
+        dispersion_grid = self.grid.new_layer()
+        if not sources:
+            return dispersion_grid
+
+        intensities = np.array([source['intensity'] for source in sources], dtype=float)
+        rows, cols, _ = self.grid.locate(sources)
+        sigma_y = min(15, wind_speed * 0.3)
+
+        # Every source shares the same plume shape, so it is computed once and
+        # stamped at each source's cell: (sources x footprint cells)
+        offset_i, offset_j, unit_concentration = self.grid.plume_footprint(wind_direction, sigma_y)
+        cell_i = rows[:, None] + offset_i[None, :]
+        cell_j = cols[:, None] + offset_j[None, :]
+        on_grid = (cell_i >= 0) & (cell_i < self.grid.size) & (cell_j >= 0) & (cell_j < self.grid.size)
+
+        weights = intensities[:, None] * unit_concentration[None, :]
+        dispersion_grid.add_points(cell_i[on_grid], cell_j[on_grid], weights[on_grid])
+
+        return dispersion_grid
+
+    def _wind_rose_dispersion_model(self, sources, weather):
+        """Average dispersion over a wind rose: weather['wind_rose'] holds one frequency per direction bin
+
+        Per-bin unit kernels are cached per wind speed, so the rose is a
+        frequency-weighted sum of cached kernels stamped once at every source
+        rather than one plume run per direction.
+        """
+        rose = np.asarray(weather['wind_rose'], dtype=float)
+        sigma_y = min(15, weather.get('wind_speed', 10) * 0.3)
+        key = (sigma_y, len(rose))
+        kernels = self._rose_kernels.get(key)
+        if kernels is None:
+            kernels = self.grid.binned_plume_kernels(sigma_y, bins=len(rose))
+            self._rose_kernels[key] = kernels
+            if len(self._rose_kernels) > WIND_ROSE_CACHE_SIZE:
+                self._rose_kernels.popitem(last=False)
+        else:
+            self._rose_kernels.move_to_end(key)
+
+        kernel = np.tensordot(rose / rose.sum(), kernels, axes=1)
+        return self._stamp_kernel(sources, kernel)
+
+    def _stamp_kernel(self, sources, kernel):
+        """Stamp a (2R+1, 2R+1) kernel centred on every source, scaled by intensity"""
+        layer = self.grid.new_layer()
+        if not sources:
+            return layer
+        radius = kernel.shape[0] // 2
+        intensities = np.array([source['intensity'] for source in sources], dtype=float)
+        rows, cols, _ = self.grid.locate(sources)
+
+        offset_i, offset_j = np.nonzero(kernel)
+        cell_i = rows[:, None] + (offset_i - radius)[None, :]
+        cell_j = cols[:, None] + (offset_j - radius)[None, :]
+        on_grid = (cell_i >= 0) & (cell_i < self.grid.size) & (cell_j >= 0) & (cell_j < self.grid.size)
+        weights = intensities[:, None] * kernel[offset_i, offset_j][None, :]
+        layer.add_points(cell_i[on_grid], cell_j[on_grid], weights[on_grid])
+        return layer
+
+    def _pollution_dispersion_model_reference(self, sources, weather, terrain):
+        """Reference (cell-by-cell) Gaussian plume model used to validate the vectorized engine"""
         wind_direction = weather.get('wind_direction', np.random.uniform(0, 360))
         wind_speed = weather.get('wind_speed', 10)
         
@@ -386,6 +1343,90 @@ class AIClimateEngine:
     
     def _canopy_effectiveness_model(self, tree_data, pollution_grid):
         """Calculate tree canopy effectiveness against pollution"""
+        if self.dispersion_mode == 'reference':
+            return self._canopy_effectiveness_model_reference(tree_data, pollution_grid)
+
+        effectiveness_grid = self.grid.new_layer()
+        self._add_canopy(effectiveness_grid, tree_data)
+        return effectiveness_grid
+
+    def _add_canopy(self, effectiveness_grid, tree_data, sign=1.0):
+        """Add (or with sign=-1, remove) the canopy effect of tree_data on effectiveness_grid"""
+        rows, cols, inside = self.grid.locate(tree_data)
+        if not inside.any():
+            return
+        strengths = sign * np.array([tree['effectiveness'] * 0.8 for tree in tree_data])[inside]
+        rows, cols = rows[inside], cols[inside]
+
+        size = self.grid.tile_size
+        radius = self.grid.canopy_radius
+        kernel_i, kernel_j = np.nonzero(self.grid.canopy_kernel)
+
+        if len(rows) * len(kernel_i) < size * size:
+            # A handful of trees: stamp the kernel at each tree directly
+            cell_i = rows[:, None] + (kernel_i - radius)[None, :]
+            cell_j = cols[:, None] + (kernel_j - radius)[None, :]
+            on_grid = (cell_i >= 0) & (cell_i < self.grid.size) & (cell_j >= 0) & (cell_j < self.grid.size)
+            weights = strengths[:, None] * self.grid.canopy_kernel[kernel_i, kernel_j][None, :]
+            effectiveness_grid.add_points(cell_i[on_grid], cell_j[on_grid], weights[on_grid])
+            return
+
+        # Rasterize tree strengths onto each touched tile, then convolve all
+        # tiles with the shared radial kernel in one batched call
+        tile_keys, tile_index = np.unique(np.stack([rows // size, cols // size], axis=1),
+                                          axis=0, return_inverse=True)
+        raster = np.zeros((len(tile_keys), size * size))
+        np.add.at(raster, (tile_index.ravel(), (rows % size) * size + cols % size), strengths)
+        blocks = convolve_full(raster.reshape(-1, size, size), self.grid.canopy_kernel)
+
+        for (tile_row, tile_col), block in zip(tile_keys, blocks):
+            effectiveness_grid.add_block(tile_row * size - radius, tile_col * size - radius,
+                                         block.astype(self.grid.dtype, copy=False))
+
+    def _incremental_canopy(self, tree_data):
+        """Canopy effectiveness that only applies the trees added or removed since the last call"""
+        keys = [(tree.get('lat'), tree.get('lon'), tree['effectiveness']) for tree in tree_data]
+        common = 0
+        for old_key, new_key in zip(self._canopy_keys, keys):
+            if old_key != new_key:
+                break
+            common += 1
+
+        removed = self._canopy_trees[common:]
+        added = tree_data[common:]
+        if self._canopy_grid is None or len(removed) + len(added) >= len(tree_data):
+            self._canopy_grid = self._canopy_effectiveness_model(tree_data, None)
+        else:
+            self._add_canopy(self._canopy_grid, removed, sign=-1.0)
+            self._add_canopy(self._canopy_grid, added)
+
+        self._canopy_keys = keys
+        self._canopy_trees = list(tree_data)
+        return self._canopy_grid.copy()
+
+    def _cached_dispersion(self, sources, weather_data):
+        """Baseline dispersion cached by (sources, wind speed, wind direction or wind rose)"""
+        wind_rose = weather_data.get('wind_rose')
+        key = (
+            tuple((s.get('lat'), s.get('lon'), s['intensity']) for s in sources),
+            weather_data.get('wind_speed', 10),
+            tuple(wind_rose) if wind_rose is not None else weather_data['wind_direction'],
+        )
+        if key in self._dispersion_cache:
+            self._dispersion_cache.move_to_end(key)
+            return self._dispersion_cache[key]
+
+        if wind_rose is not None:
+            dispersion = self._wind_rose_dispersion_model(sources, weather_data)
+        else:
+            dispersion = self._pollution_dispersion_model(sources, weather_data, {})
+        self._dispersion_cache[key] = dispersion
+        if len(self._dispersion_cache) > DISPERSION_CACHE_SIZE:
+            self._dispersion_cache.popitem(last=False)
+        return dispersion
+
+    def _canopy_effectiveness_model_reference(self, tree_data, pollution_grid):
+        """Reference (cell-by-cell) canopy model with every tree pinned to the centre"""
         effectiveness_grid = np.zeros_like(pollution_grid)
         
         for tree in tree_data:
@@ -422,116 +1463,468 @@ class AIClimateEngine:
         }
     
     def run_scenario_analysis(self, baseline_data, intervention_data, weather_data):
-        """Run comprehensive scenario analysis"""
-        baseline_dispersion = self._pollution_dispersion_model(
-            baseline_data['sources'], weather_data, {}
-        )
-        
-        intervention_effectiveness = self._canopy_effectiveness_model(
-            intervention_data['trees'], baseline_dispersion
-        )
+        """Run comprehensive scenario analysis
+
+        In vectorized mode the baseline dispersion is cached and the canopy
+        grid is updated incrementally, so changing only the tree selection
+        recomputes just the trees that changed. With a disk_cache, results
+        for identical inputs are served from disk across sessions and restarts.
+        """
+        cache_key = None
+        if self.dispersion_mode == 'reference':
+            baseline_dispersion = self._pollution_dispersion_model(
+                baseline_data['sources'], weather_data, {}
+            )
+            intervention_effectiveness = self._canopy_effectiveness_model(
+                intervention_data['trees'], baseline_dispersion
+            )
+        else:
+            if 'wind_direction' not in weather_data:
+                weather_data = dict(weather_data, wind_direction=np.random.uniform(0, 360))
+            if self.disk_cache is not None:
+                cache_key = self.disk_cache.fingerprint(
+                    baseline_data['sources'], intervention_data['trees'], weather_data, self.grid
+                )
+                cached = self.disk_cache.get(cache_key, self.grid)
+                if cached is not None:
+                    return cached
+            baseline_dispersion = self._cached_dispersion(baseline_data['sources'], weather_data)
+            intervention_effectiveness = self._incremental_canopy(list(intervention_data['trees']))
         
         heat_analysis = self._urban_heat_reduction_model(
             intervention_data['trees'], weather_data
         )
         
-        pollution_reduction = np.mean(intervention_effectiveness) * 100
+        pollution_reduction = intervention_effectiveness.mean() * 100
         air_quality_improvement = min(30, pollution_reduction * 0.8)
         
-        return {
+        results = {
             'pollution_reduction_percent': pollution_reduction,
             'air_quality_improvement': air_quality_improvement,
             'heat_reduction': heat_analysis,
             'dispersion_grid': baseline_dispersion,
             'effectiveness_grid': intervention_effectiveness,
+            'cell_size_m': 100 if self.dispersion_mode == 'reference' else self.grid.cell_size_m,
             'confidence_score': 0.85  
         }
-def get_climate_zone_name(lat):
-    """Get climate zone name"""
-    abs_lat = abs(lat)
-    if abs_lat <= 23.5:
-        return "Tropical"
-    elif abs_lat <= 35:
-        return "Subtropical"
-    elif abs_lat <= 50:
-        return "Temperate"
-    else:
-        return "Continental"
+        if cache_key is not None:
+            self.disk_cache.put(cache_key, results)
+        return results
 
-def search_cities(query):
-    """Search cities by name (local DB lookup, returns up to 8 matches)"""
-    if not query:
-        return []
-    
-    query = query.lower().strip()
-    matches = []
-    
-    for city_name, city_data in GLOBAL_CITIES.items():
-        if query in city_name.lower():
-            matches.append({
-                'name': city_name,
-                'display': f"{city_name}, {city_data['country']}",
-                'coords': city_data['coords'],
-                'pollution_base': city_data['pollution_base']
-            })
-    
-    return matches[:8]
+    def run_scenario_sweep(self, intervention_data, weather_data, tree_counts,
+                           timelines=("1 year (Standard)",), species_diversities=(5,)):
+        """Evaluate every (tree count, timeline, species diversity) combination in one pass
 
-@st.cache_data(ttl=1800)
-def get_weather_data(lat, lon):
-    """Get REAL weather data from OpenWeatherMap API"""
-    
-    try:
-        openweather_key = st.secrets["api_keys"]["openweather"]
-    except:
-        st.error("API key not found. Add it to .streamlit/secrets.toml")
-        return get_mock_weather_data(lat, lon)
-    
-    try:
-        url = "http://api.openweathermap.org/data/2.5/weather"
-        params = {
-            'lat': lat,
-            'lon': lon,
-            'appid': openweather_key,
-            'units': 'metric'
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            temp = data['main']['temp']
-            humidity = data['main']['humidity']
-            wind_speed = data['wind']['speed'] * 3.6
-            wind_direction = data['wind'].get('deg', 0)
-            condition = data['weather'][0]['description'].title()
-            
-            weather_main = data['weather'][0]['main']
-            icon_map = {
-                'Clear': '☀️',
-                'Clouds': '☁️', 
-                'Rain': '🌧️',
-                'Snow': '❄️',
-                'Thunderstorm': '⛈️'
-            }
-            icon = icon_map.get(weather_main, '🌤️')
-            
-            st.success("Using real weather data!")
-            
-            return {
-                'temperature': round(temp, 1),
-                'humidity': humidity,
-                'wind_speed': round(wind_speed, 1),
-                'wind_direction': wind_direction,
-                'condition': condition,
-                'icon': icon
-            }
+        Returns a DataFrame with one row per combination; the projected
+        temperature starts from weather_data's temperature, as in
+        _urban_heat_reduction_model. The canopy model has no species term:
+        diversity only scales the projected improvement through
+        species_diversity_factor, as the simulator's projection does. The canopy model is
+        linear and the reduction metric is a grid mean, so each tree's
+        contribution is its strength times the part of the kernel that lands on
+        the grid; a cumulative sum over the tree order then gives the metrics
+        for every prefix trees[:n] without rebuilding a raster per point.
+        """
+        if self.dispersion_mode == 'reference':
+            raise ValueError("Scenario sweeps require the vectorized engine")
+
+        trees = list(intervention_data['trees'])
+        counts = np.asarray(list(tree_counts), dtype=int)
+        planted = np.minimum(counts, len(trees))
+
+        effectiveness = np.array([tree['effectiveness'] for tree in trees], dtype=float)
+        rows, cols, inside = self.grid.locate(trees)
+
+        # Kernel mass inside the grid for a tree at (row, col), via a summed-area table
+        radius = self.grid.canopy_radius
+        width = 2 * radius + 1
+        table = np.zeros((width + 1, width + 1))
+        table[1:, 1:] = self.grid.canopy_kernel.cumsum(axis=0).cumsum(axis=1)
+        i_lo = np.clip(radius - rows, 0, width)
+        i_hi = np.clip(self.grid.size - rows + radius, 0, width)
+        j_lo = np.clip(radius - cols, 0, width)
+        j_hi = np.clip(self.grid.size - cols + radius, 0, width)
+        kernel_mass = table[i_hi, j_hi] - table[i_lo, j_hi] - table[i_hi, j_lo] + table[i_lo, j_lo]
+
+        contribution = np.where(inside, effectiveness * 0.8 * kernel_mass, 0.0) / (self.grid.size**2)
+        cumulative_reduction = np.concatenate([[0.0], np.cumsum(contribution)]) * 100
+        cumulative_effectiveness = np.concatenate([[0.0], np.cumsum(effectiveness)])
+
+        pollution_reduction = cumulative_reduction[planted]
+        air_quality_improvement = np.minimum(30, pollution_reduction * 0.8)
+        temperature_reduction = np.minimum(5.0, cumulative_effectiveness[planted] * 0.1 * 0.5)
+        projected_temperature = weather_data.get('temperature', 25) - temperature_reduction
+
+        # Broadcast over (tree counts x timelines x species diversity)
+        timelines = list(timelines)
+        diversities = np.asarray(list(species_diversities), dtype=int)
+        timeline_factor = np.array([TIMELINE_MULTIPLIERS[t] for t in timelines])
+        projected = (air_quality_improvement[:, None, None]
+                     * timeline_factor[None, :, None]
+                     * species_diversity_factor(diversities)[None, None, :])
+
+        shape = projected.shape
+        per_count = lambda values: np.broadcast_to(values[:, None, None], shape).ravel()
+        return pd.DataFrame({
+            'tree_count': per_count(counts),
+            'trees_planted': per_count(planted),
+            'timeline': np.broadcast_to(np.array(timelines, dtype=object)[None, :, None], shape).ravel(),
+            'species_diversity': np.broadcast_to(diversities[None, None, :], shape).ravel(),
+            'pollution_reduction_percent': per_count(pollution_reduction),
+            'air_quality_improvement': per_count(air_quality_improvement),
+            'temperature_reduction': per_count(temperature_reduction),
+            'projected_temperature': per_count(projected_temperature),
+            'projected_aqi_improvement': projected.ravel(),
+        })
+
+    def _source_windows(self, sources, effectiveness_grid):
+        """Kernel-sized windows around every source that can reach the grid
+
+        Returns (reach, covered, on_grid): reach marks the sources within one
+        kernel radius of the grid (no others can reach it), covered holds the
+        effectiveness seen at each kernel offset and on_grid whether that
+        offset is still on the grid, both (reached sources, 2R+1, 2R+1).
+        """
+        radius = self.grid.kernel_radius
+        width = 2 * radius + 1
+        rows, cols, _ = self.grid.locate(sources)
+        reach = (rows >= -radius) & (rows < self.grid.size + radius) & (cols >= -radius) & (cols < self.grid.size + radius)
+        rows, cols = rows[reach] + radius, cols[reach] + radius
+        padded = np.pad(effectiveness_grid.to_dense().astype(float), 2 * radius)
+        mask = np.pad(np.ones(self.grid.shape), 2 * radius)
+        covered = np.lib.stride_tricks.sliding_window_view(padded, (width, width))[rows, cols]
+        on_grid = np.lib.stride_tricks.sliding_window_view(mask, (width, width))[rows, cols]
+        return reach, covered, on_grid
+
+    def run_time_series(self, baseline_data, intervention_data, weather_frames):
+        """Step the plume model across weather frames and accumulate exposure
+
+        weather_frames is a DataFrame (or list of dicts) with wind_direction
+        and optionally wind_speed and weight (e.g. the frame's relative PM2.5
+        level). Because dispersion is linear in the plume kernel, frames are
+        evaluated as batches of kernels: per-frame totals are dot products
+        with source-weighted windows of the grid, and the accumulated exposure
+        field is a single stamp of the weighted kernel sum.
+        """
+        if self.dispersion_mode == 'reference':
+            raise ValueError("Time-series runs require the vectorized engine")
+
+        frames = pd.DataFrame(weather_frames).reset_index(drop=True)
+        directions = frames['wind_direction'].to_numpy(dtype=float)
+        speeds = frames['wind_speed'].to_numpy(dtype=float) if 'wind_speed' in frames else np.full(len(frames), 10.0)
+        weights = frames['weight'].to_numpy(dtype=float) if 'weight' in frames else np.ones(len(frames))
+        sigma_ys = np.minimum(15, speeds * 0.3)
+
+        sources = baseline_data['sources']
+        radius = self.grid.kernel_radius
+        width = 2 * radius + 1
+        # Padded effectiveness and mask grids, plus the per-source windows cut from them
+        self.grid.check_budget((2 * (self.grid.size + 4 * radius)**2 + 4 * width**2) * 8, "A time-series run")
+        effectiveness_grid = self._incremental_canopy(list(intervention_data['trees']))
+
+        # Source-weighted windows around every source
+        intensities = np.array([source['intensity'] for source in sources], dtype=float)
+        reach, covered_windows, on_grid_windows = self._source_windows(sources, effectiveness_grid)
+        covered_window = np.tensordot(intensities[reach], covered_windows, axes=1)
+        on_grid_window = np.tensordot(intensities[reach], on_grid_windows, axes=1)
+
+        total = np.zeros(len(frames))
+        covered = np.zeros(len(frames))
+        kernel_sum = np.zeros((width, width))
+        chunk = max(1, TIME_SERIES_CHUNK_CELLS // (width * width))
+        for start in range(0, len(frames), chunk):
+            stop = start + chunk
+            kernels = self.grid.plume_kernels(directions[start:stop], sigma_ys[start:stop])
+            total[start:stop] = np.tensordot(kernels, on_grid_window, axes=2)
+            covered[start:stop] = np.tensordot(kernels, covered_window, axes=2)
+            kernel_sum += np.tensordot(weights[start:stop], kernels, axes=1)
+
+        exposure_grid = self._stamp_kernel(sources, kernel_sum)
+
+        frames['mean_concentration'] = total / self.grid.size**2
+        frames['exposure_weighted_reduction_percent'] = np.divide(
+            covered * 100, total, out=np.zeros(len(frames)), where=total > 0
+        )
+        weighted_total = (weights * total).sum()
+        return {
+            'frames': frames,
+            'exposure_grid': exposure_grid,
+            'effectiveness_grid': effectiveness_grid,
+            'exposure_weighted_reduction_percent': (weights * covered).sum() / weighted_total * 100 if weighted_total > 0 else 0.0,
+            'pollution_reduction_percent': effectiveness_grid.mean() * 100,
+            'cell_size_m': self.grid.cell_size_m,
+        }
+
+    def run_monte_carlo(self, baseline_data, intervention_data, weather_data,
+                        n_realizations=1000, workers=None, seed=None):
+        """Percentile bands for scenario metrics under uncertain trees, wind and hotspots
+
+        Each realization draws a tree-effectiveness multiplier, a wind
+        direction and per-hotspot intensity multipliers. Realizations run in
+        fixed-size chunks across a long-lived process pool. The effectiveness
+        windows around each source (as in run_time_series) are shared with
+        the workers through shared memory, and each chunk evaluates its
+        realizations as one batch of sparse plume footprints against them,
+        keeping only scalar metrics, so per-worker memory stays flat. Results
+        depend on seed only, not on the number of workers, and seeded runs
+        are cached on their inputs.
+
+        confidence_score is the share of realizations whose exposure-weighted
+        reduction lands within MONTE_CARLO_CONFIDENCE_TOLERANCE (relative) of
+        the median. If the process pool is unavailable the chunks run
+        in-process and 'fallback' holds the reason.
+        """
+        if self.dispersion_mode == 'reference':
+            raise ValueError("Monte Carlo runs require the vectorized engine")
+
+        sources = baseline_data['sources']
+        trees = list(intervention_data['trees'])
+        cache_key = None
+        if seed is not None:
+            cache_key = (
+                tuple((s.get('lat'), s.get('lon'), s['intensity']) for s in sources),
+                tuple((tree.get('lat'), tree.get('lon'), tree['effectiveness']) for tree in trees),
+                weather_data.get('wind_speed', 10), weather_data.get('wind_direction'),
+                n_realizations, seed,
+            )
+            if cache_key in self._monte_carlo_cache:
+                self._monte_carlo_cache.move_to_end(cache_key)
+                return copy.deepcopy(self._monte_carlo_cache[cache_key])
+
+        width = 2 * self.grid.kernel_radius + 1
+        self.grid.check_budget((2 * (self.grid.size + 4 * self.grid.kernel_radius)**2 + 2 * len(sources) * width**2) * 8,
+                               "A Monte Carlo run")
+        effectiveness = self._canopy_effectiveness_model(trees, None)
+        reach, covered, on_grid = self._source_windows(sources, effectiveness)
+        windows = np.stack([covered, on_grid])
+
+        task_base = {
+            'grid': self.grid,
+            'shape': windows.shape,
+            'dtype': windows.dtype.str,
+            'reach': reach,
+            'intensities': np.array([source['intensity'] for source in sources], dtype=float),
+            'sigma_y': min(15, weather_data.get('wind_speed', 10) * 0.3),
+            'wind_direction': weather_data.get('wind_direction'),
+            'base_reduction': effectiveness.mean() * 100,
+            'total_effectiveness': sum(tree['effectiveness'] for tree in trees),
+        }
+        chunk_sizes = [MONTE_CARLO_CHUNK_SIZE] * (n_realizations // MONTE_CARLO_CHUNK_SIZE)
+        if n_realizations % MONTE_CARLO_CHUNK_SIZE:
+            chunk_sizes.append(n_realizations % MONTE_CARLO_CHUNK_SIZE)
+        chunk_seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+
+        fallback = None
+        shm = shared_memory.SharedMemory(create=True, size=max(1, windows.nbytes))
+        try:
+            np.ndarray(windows.shape, dtype=windows.dtype, buffer=shm.buf)[...] = windows
+            del windows, covered, on_grid
+            tasks = [dict(task_base, shm_name=shm.name, n=size, seed=chunk_seed)
+                     for size, chunk_seed in zip(chunk_sizes, chunk_seeds)]
+
+            workers = min(workers or os.cpu_count() or 1, max(1, len(tasks)))
+            try:
+                chunks = list(get_monte_carlo_pool(workers).map(_monte_carlo_worker, tasks))
+            except Exception as e:
+                fallback = f"Monte Carlo process pool unavailable, ran in-process: {e}"
+                discard_monte_carlo_pool(workers)
+                workers = 1
+                chunks = [_monte_carlo_worker(task) for task in tasks]
+        finally:
+            shm.close()
+            shm.unlink()
+
+        bands = {}
+        for metric in ('pollution_reduction_percent', 'heat_reduction', 'exposure_weighted_reduction_percent'):
+            values = np.concatenate([chunk[metric] for chunk in chunks]) if chunks else np.zeros(1)
+            p5, p50, p95 = np.percentile(values, [5, 50, 95])
+            bands[metric] = {'p5': p5, 'p50': p50, 'p95': p95, 'mean': values.mean()}
+
+        exposure = np.concatenate([chunk['exposure_weighted_reduction_percent'] for chunk in chunks])
+        median = bands['exposure_weighted_reduction_percent']['p50']
+        within = np.abs(exposure - median) <= MONTE_CARLO_CONFIDENCE_TOLERANCE * median
+        bands['confidence_score'] = float(within.mean()) if median > 0 else 0.0
+        bands['realizations'] = n_realizations
+        bands['workers'] = workers
+        bands['fallback'] = fallback
+        if cache_key is not None:
+            self._monte_carlo_cache[cache_key] = copy.deepcopy(bands)
+            if len(self._monte_carlo_cache) > MONTE_CARLO_CACHE_SIZE:
+                self._monte_carlo_cache.popitem(last=False)
+        return bands
+
+
+_MONTE_CARLO_POOLS = {}
+_MONTE_CARLO_POOL_LOCK = threading.Lock()
+
+
+def get_monte_carlo_pool(workers):
+    """Long-lived process pool with the given number of workers, shared across sessions
+
+    Workers start through forkserver (or spawn) rather than fork: the
+    server is multithreaded, and forking it could hand the children locks
+    held by prefetch, refresh or cache threads.
+    """
+    with _MONTE_CARLO_POOL_LOCK:
+        pool = _MONTE_CARLO_POOLS.get(workers)
+        if pool is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+            _MONTE_CARLO_POOLS[workers] = pool
+        return pool
+
+def discard_monte_carlo_pool(workers):
+    """Drop a (possibly broken) pool so the next run starts a fresh one"""
+    with _MONTE_CARLO_POOL_LOCK:
+        pool = _MONTE_CARLO_POOLS.pop(workers, None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _monte_carlo_worker(task):
+    """Process-pool entry point: attach to the shared source windows and run one chunk"""
+    shm = shared_memory.SharedMemory(name=task['shm_name'])
+    try:
+        return _monte_carlo_chunk(task, shm.buf)
+    finally:
+        shm.close()
+
+
+def _monte_carlo_chunk(task, buffer):
+    """Run task['n'] scenario realizations, keeping only scalar metrics per realization
+
+    Realizations are evaluated in batches: one sparse plume footprint per
+    realization (DispersionGrid.plume_cells), gathered from every source's
+    covered and on-grid windows.
+    """
+    covered_windows, on_grid_windows = np.ndarray(task['shape'], dtype=task['dtype'], buffer=buffer)
+    grid = task['grid']
+    rng = np.random.default_rng(task['seed'])
+    n = task['n']
+    intensities = task['intensities']
+
+    effectiveness_factor = np.clip(rng.normal(1, TREE_EFFECTIVENESS_SD, n), 0.3, None)
+    if task['wind_direction'] is None:
+        directions = rng.uniform(0, 360, n)
+    else:
+        directions = task['wind_direction'] + rng.normal(0, WIND_DIRECTION_SD, n)
+    intensity_factor = rng.lognormal(0, HOTSPOT_INTENSITY_SD, (n, len(intensities)))
+
+    weights = (intensities * intensity_factor)[:, task['reach']]
+
+    total = np.zeros(n)
+    covered = np.zeros(n)
+    radius = grid.kernel_radius
+    if n and weights.shape[1]:
+        cells_per_realization = grid.plume_cells(directions[:1], task['sigma_y'])[0].size
+        batch = max(1, TIME_SERIES_CHUNK_CELLS // (cells_per_realization * weights.shape[1]))
+        for start in range(0, n, batch):
+            stop = start + batch
+            di, dj, concentration = grid.plume_cells(directions[start:stop], task['sigma_y'])
+            # Padding cells carry zero concentration; clip them into the window so they can be gathered
+            cells = (np.clip(di + radius, 0, 2 * radius), np.clip(dj + radius, 0, 2 * radius))
+            total[start:stop] = np.einsum('ks,kc,skc->k', weights[start:stop], concentration,
+                                          on_grid_windows[:, cells[0], cells[1]], optimize=True)
+            covered[start:stop] = np.einsum('ks,kc,skc->k', weights[start:stop], concentration,
+                                            covered_windows[:, cells[0], cells[1]], optimize=True)
+    del covered_windows, on_grid_windows
+    exposure = np.divide(covered * 100, total, out=np.zeros(n), where=total > 0)
+
+    return {
+        'pollution_reduction_percent': effectiveness_factor * task['base_reduction'],
+        'heat_reduction': np.minimum(5.0, effectiveness_factor * task['total_effectiveness'] * 0.1 * 0.5),
+        'exposure_weighted_reduction_percent': effectiveness_factor * exposure,
+    }
+
+def get_climate_zone_name(lat):
+    """Get climate zone name"""
+    abs_lat = abs(lat)
+    if abs_lat <= 23.5:
+        return "Tropical"
+    elif abs_lat <= 35:
+        return "Subtropical"
+    elif abs_lat <= 50:
+        return "Temperate"
+    else:
+        return "Continental"
+
+def search_cities(query):
+    """Search cities by name (local DB lookup, returns up to 8 matches)"""
+    if not query:
+        return []
+    
+    query = query.lower().strip()
+    matches = []
+    
+    for city_name, city_data in GLOBAL_CITIES.items():
+        if query in city_name.lower():
+            matches.append({
+                'name': city_name,
+                'display': f"{city_name}, {city_data['country']}",
+                'coords': city_data['coords'],
+                'pollution_base': city_data['pollution_base']
+            })
+    
+    return matches[:8]
+
+def get_weather_data(lat, lon):
+    """Get REAL weather data from OpenWeatherMap API (cached stale-while-revalidate)"""
+    
+    try:
+        openweather_key = st.secrets["api_keys"]["openweather"]
+    except:
+        st.error("API key not found. Add it to .streamlit/secrets.toml")
+        return get_mock_weather_data(lat, lon)
+    
+    try:
+        weather = get_provider_cache().get_at(
+            'openweather', lat, lon, lambda cell_lat, cell_lon: _fetch_weather(cell_lat, cell_lon, openweather_key)
+        )
+        st.success("Using real weather data!")
+        return weather
             
     except Exception as e:
         st.warning(f"Using estimated weather data: {str(e)}")
         return get_mock_weather_data(lat, lon)
 
+def _fetch_weather(lat, lon, openweather_key):
+    """Fetch current weather from OpenWeatherMap; raises on failure"""
+    url = "http://api.openweathermap.org/data/2.5/weather"
+    params = {
+        'lat': lat,
+        'lon': lon,
+        'appid': openweather_key,
+        'units': 'metric'
+    }
+    
+    response = get_provider_client().get('openweather', url, params=params)
+    response.raise_for_status()
+    data = response.json()
+    
+    temp = data['main']['temp']
+    humidity = data['main']['humidity']
+    wind_speed = data['wind']['speed'] * 3.6
+    wind_direction = data['wind'].get('deg', 0)
+    condition = data['weather'][0]['description'].title()
+    
+    weather_main = data['weather'][0]['main']
+    icon_map = {
+        'Clear': '☀️',
+        'Clouds': '☁️', 
+        'Rain': '🌧️',
+        'Snow': '❄️',
+        'Thunderstorm': '⛈️'
+    }
+    icon = icon_map.get(weather_main, '🌤️')
+    
+    return {
+        'temperature': round(temp, 1),
+        'humidity': humidity,
+        'wind_speed': round(wind_speed, 1),
+        'wind_direction': wind_direction,
+        'condition': condition,
+        'icon': icon
+    }
+
 def get_mock_weather_data(lat, lon):
     """Your original weather function as backup"""
     base_temp = 25 - (abs(lat) * 0.6)
@@ -561,9 +1954,8 @@ def get_mock_weather_data(lat, lon):
         'condition': condition,
         'icon': icon
     }
-@st.cache_data(ttl=1800)
 def get_real_air_quality(lat, lon):
-    """Get real air quality data"""
+    """Get real air quality data (cached stale-while-revalidate)"""
     
     try:
         waqi_key = st.secrets["api_keys"]["waqi"]
@@ -571,55 +1963,156 @@ def get_real_air_quality(lat, lon):
         return None
     
     try:
-        url = f"https://api.waqi.info/feed/geo:{lat};{lon}/"
-        params = {'token': waqi_key}
-        
-        response = requests.get(url, params=params, timeout=15)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            if data['status'] == 'ok' and data['data']['aqi'] != '-':
-                pollution_data = data['data']
-                iaqi = pollution_data.get('iaqi', {})
-                
-                result = {
-                    'aqi': pollution_data['aqi'],
-                    'pm25': iaqi.get('pm25', {}).get('v'),
-                    'station_name': pollution_data['city']['name'],
-                    'source': 'Real Air Quality Network'
-                }
-                
-                if not result['pm25'] and result['aqi']:
-                    if result['aqi'] <= 50:
-                        result['pm25'] = result['aqi'] / 4.17
-                    else:
-                        result['pm25'] = 12 + (result['aqi'] - 50) / 2.13
-                
-                return result
-                
+        return get_provider_cache().get_at(
+            'waqi', lat, lon, lambda cell_lat, cell_lon: _fetch_air_quality(cell_lat, cell_lon, waqi_key)
+        )
     except Exception as e:
         print(f"Air quality API error: {e}")
         return None
+
+def _fetch_air_quality(lat, lon, waqi_key):
+    """Fetch the nearest WAQI station reading; None if no station reports, raises on failure"""
+    url = f"https://api.waqi.info/feed/geo:{lat};{lon}/"
+    params = {'token': waqi_key}
     
-    return None
+    response = get_provider_client().get('waqi', url, params=params)
+    response.raise_for_status()
+    data = response.json()
+    
+    if data['status'] != 'ok' or data['data']['aqi'] == '-':
+        return None
+
+    pollution_data = data['data']
+    iaqi = pollution_data.get('iaqi', {})
+    
+    result = {
+        'aqi': pollution_data['aqi'],
+        'pm25': iaqi.get('pm25', {}).get('v'),
+        'station_name': pollution_data['city']['name'],
+        'source': 'Real Air Quality Network'
+    }
+    
+    if not result['pm25'] and result['aqi']:
+        if result['aqi'] <= 50:
+            result['pm25'] = result['aqi'] / 4.17
+        else:
+            result['pm25'] = 12 + (result['aqi'] - 50) / 2.13
+    
+    return result
+
+def _count_exceeded(values, edges, inclusive):
+    """How many of a few sorted edges each value is above (or at, if inclusive)
+
+    For a handful of breakpoints one comparison pass per edge is several
+    times faster than np.searchsorted over millions of values.
+    """
+    index = np.zeros(np.shape(values), dtype=np.intp)
+    for edge in edges:
+        index += (values >= edge) if inclusive else (values > edge)
+    return index
+
+def _legacy_pm25_aqi(pm25):
+    """The simplified demo PM2.5 mapping, element-wise and bit-compatible with its old scalar form"""
+    # Segment i covers (upper[i-1], upper[i]]; the first is 0 + (pm25 - 0) * 4.17, which is exact
+    upper = np.array([12, 35.4, 55.4, 150.4])
+    base_aqi = np.array([0, 50, 100, 150, 200], dtype=float)
+    start = np.array([0, 12, 35.4, 55.4, 150.4])
+    slope = np.array([4.17, 2.13, 2.5, 0.53, 1.05])
+    index = _count_exceeded(pm25, upper, inclusive=False)
+    aqi = np.trunc(base_aqi[index] + (pm25 - start[index]) * slope[index])
+    return np.where(index == len(upper), np.minimum(300, aqi), aqi)
+
+def _epa_aqi(concentration, pollutant):
+    """EPA AQI by breakpoint lookup; past the top breakpoint the last segment extends, capped at 500
 
-def calculate_aqi(pm25):
-    """Calculate AQI from PM2.5 - simplified mapping for demo"""
-    if pm25 <= 12:
-        return int(pm25 * 4.17)
-    elif pm25 <= 35.4:
-        return int(50 + (pm25 - 12) * 2.13)
-    elif pm25 <= 55.4:
-        return int(100 + (pm25 - 35.4) * 2.5)
-    elif pm25 <= 150.4:
-        return int(150 + (pm25 - 55.4) * 0.53)
+    Negative readings count as 0. For a table that starts above 0 (o3_1h)
+    values below its first breakpoint are undefined and give NaN, so
+    callers fall back to the 8-hour O3 index.
+    """
+    decimals, table = AQI_BREAKPOINTS[pollutant]
+    c_low, c_high, i_low, i_high = (np.array(column, dtype=float) for column in zip(*table))
+
+    scale = 10.0 ** decimals
+    truncated = np.floor(np.maximum(concentration, 0.0) * scale + 1e-9) / scale
+    index = _count_exceeded(truncated, c_low[1:], inclusive=True)
+    slope = (i_high[index] - i_low[index]) / (c_high[index] - c_low[index])
+    aqi = np.minimum(500, np.floor(i_low[index] + slope * (truncated - c_low[index]) + 0.5))
+    return np.where(truncated < c_low[0], np.nan, aqi)
+
+def calculate_aqi(concentration, pollutant='pm25', mode=None):
+    """AQI for a scalar, array, 2D grid, Series or DataFrame of concentrations
+
+    mode 'epa' uses the AQI_BREAKPOINTS table for pollutant; 'legacy'
+    (PM2.5 only) reproduces the simplified mapping. Defaults to AQI_MODE
+    for PM2.5 and 'epa' otherwise. Scalars give an int, arrays and pandas
+    objects the same shape back; NaN concentrations, and concentrations
+    below the first o3_1h breakpoint, give NaN.
+    """
+    mode = mode or (AQI_MODE if pollutant == 'pm25' else 'epa')
+    if mode == 'legacy' and pollutant != 'pm25':
+        raise ValueError("The legacy AQI mapping only covers PM2.5")
+    if pollutant not in AQI_BREAKPOINTS:
+        raise ValueError(f"No AQI breakpoints for {pollutant}; expected one of {', '.join(AQI_BREAKPOINTS)}")
+
+    values = np.asarray(concentration, dtype=float)
+    with np.errstate(invalid='ignore'):
+        aqi = _legacy_pm25_aqi(values) if mode == 'legacy' else _epa_aqi(values, pollutant)
+    missing = np.isnan(values) | np.isnan(aqi)
+    if missing.any():
+        aqi = np.where(missing, np.nan, aqi)
     else:
-        return min(300, int(200 + (pm25 - 150.4) * 1.05))
+        aqi = aqi.astype(np.int64)
+
+    if isinstance(concentration, pd.Series):
+        return pd.Series(aqi, index=concentration.index, name=concentration.name)
+    if isinstance(concentration, pd.DataFrame):
+        return pd.DataFrame(aqi, index=concentration.index, columns=concentration.columns)
+    if np.ndim(concentration) == 0:
+        return aqi.item()
+    return aqi
   
 
-def get_pollution_data(lat, lon, city_pollution_base=None, days=30):
-    """Generate realistic time series pollution data (mock or real if available)"""
+def generate_pollution_series(base_pm25, days=30, freq='D', end=None, seed=None):
+    """Columnar synthetic pollution history: date, pm25, no2 and aqi (plus city for several cities)
+
+    base_pm25 is one baseline PM2.5 or a {city: baseline} dict. Every
+    sample draws a 0.8-1.2 variation of its baseline, with weekends at
+    70%, and NO2 follows at half the PM2.5 plus noise. All draws come
+    from one np.random.Generator seeded with seed, so a seed reproduces
+    the series. freq is a pandas frequency ('D', 'h', ...) and days may
+    span years. Values are float32 and AQI int16; a multi-city frame is
+    ordered city by city with a categorical 'city' column.
+    """
+    rng = np.random.default_rng(seed)
+    multi_city = isinstance(base_pm25, dict)
+    cities = list(base_pm25) if multi_city else [None]
+    bases = np.array(list(base_pm25.values()) if multi_city else [base_pm25], dtype=float)
+
+    end = pd.Timestamp(end or datetime.now())
+    dates = pd.date_range(start=end - pd.Timedelta(days=days), end=end, freq=freq, inclusive='right')
+    periods = len(dates)
+
+    weekend_factor = np.where(dates.dayofweek >= 5, 0.7, 1.0).astype(np.float32)
+    variation = 0.8 + 0.4 * rng.random((len(bases), periods), dtype=np.float32)
+    pm25 = np.maximum(np.float32(8), bases.astype(np.float32)[:, None] * weekend_factor[None, :] * variation)
+    no2 = np.maximum(np.float32(3), pm25 * np.float32(0.5) + 3 * rng.standard_normal(pm25.shape, dtype=np.float32))
+
+    columns = {
+        'date': np.tile(dates.to_numpy(), len(bases)),
+        'pm25': pm25.ravel(),
+        'no2': no2.ravel(),
+        'aqi': calculate_aqi(pm25.ravel()).astype(np.int16),
+    }
+    if multi_city:
+        columns['city'] = pd.Categorical.from_codes(np.repeat(np.arange(len(cities)), periods), categories=cities)
+    return pd.DataFrame(columns)
+
+def get_pollution_data(lat, lon, city_pollution_base=None, days=30, freq='D', seed=None):
+    """Generate realistic time series pollution data (mock or real if available)
+
+    The history is synthesized around the current PM2.5 by
+    generate_pollution_series; freq and seed are passed through to it.
+    """
     
 
     current_pollution = get_real_air_quality(lat, lon)
@@ -650,25 +2143,56 @@ def get_pollution_data(lat, lon, city_pollution_base=None, days=30):
                 base_pm25 = 35
 
 
-    dates = pd.date_range(end=datetime.now(), periods=days)
-    data = []
-    
-    for date in dates:
-        weekend_factor = 0.7 if date.weekday() >= 5 else 1.0
-        daily_variation = np.random.uniform(0.8, 1.2)
-        
-        pm25 = max(8, base_pm25 * weekend_factor * daily_variation)
-        no2 = max(3, pm25 * 0.5 + np.random.normal(0, 3))
-        aqi = calculate_aqi(pm25)
-        
-        data.append({
-            'date': date,
-            'pm25': pm25,
-            'no2': no2,
-            'aqi': aqi
-        })
-    
-    return pd.DataFrame(data)
+    return generate_pollution_series(base_pm25, days=days, freq=freq, seed=seed)
+
+
+def weather_frames_seed(lat, lon, pollution_data):
+    """Seed for build_weather_frames from the city and the last day of its history
+
+    Reruns and other sessions for the same city on the same day replay the
+    same frames, so the wind rose and exposure timeline stay put.
+    """
+    day = pd.Timestamp(pd.to_datetime(pollution_data['date']).max()).date()
+    key = f"{lat:.4f},{lon:.4f},{day.isoformat()}".encode()
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], 'little')
+
+
+def build_weather_frames(weather_data, pollution_data, hourly=True, seed=None):
+    """Hourly or daily wind frames spanning the pollution history
+
+    Wind direction wanders from the current reading with a random walk and
+    wind speed follows a diurnal cycle; each frame is weighted by that day's
+    PM2.5 relative to the period mean. All draws come from one generator
+    seeded with seed (see weather_frames_seed).
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.to_datetime(pollution_data['date'])
+    pm25 = pollution_data['pm25'].to_numpy(dtype=float)
+    steps = 24 if hourly else 1
+    timestamps = (days.to_numpy()[:, None] + np.arange(steps)[None, :] * np.timedelta64(1, 'h')).ravel()
+    n = len(timestamps)
+
+    step_sd = 8 if hourly else 35
+    base_direction = weather_data.get('wind_direction', rng.uniform(0, 360))
+    directions = (base_direction + np.cumsum(rng.normal(0, step_sd, n))) % 360
+    hours = np.tile(np.arange(steps), len(days)) if hourly else np.full(n, 12)
+    diurnal = 1 + 0.3 * np.sin((hours - 9) * 2 * np.pi / 24)
+    speeds = np.maximum(1, weather_data.get('wind_speed', 10) * diurnal * rng.uniform(0.7, 1.3, n))
+
+    return pd.DataFrame({
+        'time': timestamps,
+        'wind_direction': directions,
+        'wind_speed': speeds,
+        'weight': np.repeat(pm25 / pm25.mean(), steps),
+    })
+
+
+def wind_rose_from_frames(frames, bins=WIND_ROSE_BINS):
+    """Weighted frequency of each wind direction bin across weather frames"""
+    weights = frames['weight'] if 'weight' in frames else None
+    bin_index = np.round(frames['wind_direction'].to_numpy(dtype=float) / (360 / bins)).astype(int) % bins
+    rose = np.bincount(bin_index, weights=weights, minlength=bins)
+    return (rose / rose.sum()).round(6).tolist()
 
 
 def is_likely_water(hotspot_lat, hotspot_lon, center_lat, center_lon):
@@ -748,9 +2272,8 @@ def get_pollution_source_type(intensity, distance):
     else:
         return "Mixed Urban"
 
-@st.cache_data(ttl=1800) 
 def get_real_sensor_hotspots(lat, lon, radius_km=25):
-    """Get REAL air quality sensors as pollution hotspots"""
+    """Get REAL air quality sensors as pollution hotspots (cached stale-while-revalidate)"""
     
     try:
         purpleair_key = st.secrets["api_keys"]["purpleair"]
@@ -759,73 +2282,16 @@ def get_real_sensor_hotspots(lat, lon, radius_km=25):
         return get_openaq_sensors(lat, lon, radius_km)
     
     try:
-        # PurpleAir API call
-        url = "https://api.purpleair.com/v1/sensors"
-        headers = {"X-API-Key": purpleair_key}
-        params = {
-            "fields": "sensor_index,name,latitude,longitude,pm2.5_10minute,pm2.5_60minute,confidence",
-            "location_type": "0",  # Outside sensors only
-            "max_age": "3600",  # Last hour data
-            "nwlng": lon - 0.3,  # Bounding box
-            "nwlat": lat + 0.3,
-            "selng": lon + 0.3,
-            "selat": lat - 0.3
-        }
-        
-        response = requests.get(url, headers=headers, params=params, timeout=15)
+        sensor_count, hotspots = get_provider_cache().get_at(
+            'purpleair', lat, lon,
+            lambda cell_lat, cell_lon: _fetch_purpleair_hotspots(cell_lat, cell_lon, radius_km, purpleair_key),
+            radius_km
+        )
+        st.success(f"Found {sensor_count} real air quality sensors!")
         
-        if response.status_code == 200:
-            data = response.json()
-            
-            hotspots = []
-            sensors = data.get('data', [])
-            
-            st.success(f"Found {len(sensors)} real air quality sensors!")
-            
-            for sensor in sensors:
-                try:
-                    sensor_lat = float(sensor[2])
-                    sensor_lon = float(sensor[3])
-                    pm25_10min = sensor[4] if sensor[4] is not None else 0
-                    pm25_60min = sensor[5] if sensor[5] is not None else 0
-                    confidence = sensor[6] if sensor[6] is not None else 50
-                    
-                    # Use most recent PM2.5 reading
-                    pm25 = pm25_10min if pm25_10min > 0 else pm25_60min
-                    
-                    if pm25 > 0 and confidence > 50:  # Valid reading
-                        # Calculate distance from city center
-                        distance_km = ((sensor_lat - lat)**2 + (sensor_lon - lon)**2)**0.5 * 111
-                        
-                        if distance_km <= radius_km:
-                            # Determine severity based on PM2.5 levels
-                            if pm25 > 55:
-                                severity = 'High'
-                                intensity = min(1.0, pm25 / 150)
-                            elif pm25 > 35:
-                                severity = 'Medium' 
-                                intensity = pm25 / 100
-                            else:
-                                severity = 'Low'
-                                intensity = pm25 / 50
-                            
-                            hotspots.append({
-                                'lat': sensor_lat,
-                                'lon': sensor_lon,
-                                'intensity': intensity,
-                                'pm25': pm25,
-                                'severity': severity,
-                                'source_type': 'Real Air Quality Sensor',
-                                'distance_km': distance_km,
-                                'sensor_name': sensor[1] or f"Sensor {sensor[0]}",
-                                'confidence': confidence,
-                                'data_source': 'PurpleAir Network'
-                            })
-                except:
-                    continue
-            
-            if hotspots:
-                return hotspots
+        hotspots = within_radius(hotspots, lat, lon, radius_km)
+        if hotspots:
+            return hotspots
                 
     except Exception as e:
         st.warning(f"PurpleAir API error: {e}")
@@ -833,74 +2299,669 @@ def get_real_sensor_hotspots(lat, lon, radius_km=25):
     # Fallback to OpenAQ
     return get_openaq_sensors(lat, lon, radius_km)
 
-@st.cache_data(ttl=1800)
+def _fetch_purpleair_hotspots(lat, lon, radius_km, purpleair_key):
+    """Fetch PurpleAir sensors near (lat, lon); returns (sensor_count, hotspots), raises on failure
+
+    Sensors are kept out to radius_km plus the PurpleAir cell margin, so
+    every caller sharing the cached cell can filter to its own radius.
+    """
+    # PurpleAir API call
+    url = "https://api.purpleair.com/v1/sensors"
+    headers = {"X-API-Key": purpleair_key}
+    params = {
+        "fields": "sensor_index,name,latitude,longitude,pm2.5_10minute,pm2.5_60minute,confidence",
+        "location_type": "0",  # Outside sensors only
+        "max_age": "3600",  # Last hour data
+        "nwlng": lon - 0.3,  # Bounding box
+        "nwlat": lat + 0.3,
+        "selng": lon + 0.3,
+        "selat": lat - 0.3
+    }
+
+    response = get_provider_client().get('purpleair', url, headers=headers, params=params)
+    response.raise_for_status()
+    
+    hotspots = []
+    sensors = response.json().get('data', [])
+    
+    for sensor in sensors:
+        try:
+            sensor_lat = float(sensor[2])
+            sensor_lon = float(sensor[3])
+            pm25_10min = sensor[4] if sensor[4] is not None else 0
+            pm25_60min = sensor[5] if sensor[5] is not None else 0
+            confidence = sensor[6] if sensor[6] is not None else 50
+
+            # Use most recent PM2.5 reading
+            pm25 = pm25_10min if pm25_10min > 0 else pm25_60min
+
+            if pm25 > 0 and confidence > 50:  # Valid reading
+                # Calculate distance from city center
+                distance_km = ((sensor_lat - lat)**2 + (sensor_lon - lon)**2)**0.5 * 111
+
+                if distance_km <= radius_km + provider_cell_margin_km('purpleair'):
+                    # Determine severity based on PM2.5 levels
+                    if pm25 > 55:
+                        severity = 'High'
+                        intensity = min(1.0, pm25 / 150)
+                    elif pm25 > 35:
+                        severity = 'Medium' 
+                        intensity = pm25 / 100
+                    else:
+                        severity = 'Low'
+                        intensity = pm25 / 50
+
+                    hotspots.append({
+                        'lat': sensor_lat,
+                        'lon': sensor_lon,
+                        'intensity': intensity,
+                        'pm25': pm25,
+                        'severity': severity,
+                        'source_type': 'Real Air Quality Sensor',
+                        'distance_km': distance_km,
+                        'sensor_name': sensor[1] or f"Sensor {sensor[0]}",
+                        'confidence': confidence,
+                        'data_source': 'PurpleAir Network'
+                    })
+        except:
+            continue
+    
+    return len(sensors), hotspots
+
+_HTTP_SESSION = None
+
+
+def get_http_session():
+    """Shared keep-alive session so provider requests reuse pooled connections"""
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _HTTP_SESSION = session
+    return _HTTP_SESSION
+
+class ProviderUnavailable(requests.RequestException):
+    """Raised instead of making a request while a provider's circuit breaker is open"""
+
+
+class ProviderClient:
+    """Pooled HTTP client with per-provider timeouts, retries and circuit breakers
+
+    Requests share one keep-alive session. Connection errors, timeouts, 429
+    and 5xx responses are retried with exponential backoff; after
+    CIRCUIT_FAILURE_THRESHOLD consecutive failed requests the provider's
+    circuit opens and requests fail immediately with ProviderUnavailable
+    until CIRCUIT_RESET_S has passed, when a single trial request is let
+    through. Requests made with count_timeouts=False (one slow resource
+    among many) do not count a final timeout against the provider.
+    """
+
+    def __init__(self, session=None, settings=PROVIDER_SETTINGS):
+        self.session = session if session is not None else get_http_session()
+        self.settings = settings
+        self._lock = threading.Lock()
+        self._health = {}
+
+    def _state(self, provider):
+        return self._health.setdefault(provider, {
+            'consecutive_failures': 0,
+            'open_until': 0.0,
+            'last_error': None,
+            'last_success': None,
+        })
+
+    def _allow(self, provider):
+        with self._lock:
+            state = self._state(provider)
+            now = time.time()
+            if state['open_until'] > now:
+                return False
+            if state['consecutive_failures'] >= CIRCUIT_FAILURE_THRESHOLD:
+                # Half-open: let this request through, keep others out until it resolves
+                state['open_until'] = now + CIRCUIT_RESET_S
+            return True
+
+    def _record(self, provider, error=None):
+        with self._lock:
+            state = self._state(provider)
+            if error is None:
+                state.update(consecutive_failures=0, open_until=0.0, last_success=time.time())
+                return
+            state['consecutive_failures'] += 1
+            state['last_error'] = error
+            if state['consecutive_failures'] >= CIRCUIT_FAILURE_THRESHOLD:
+                state['open_until'] = time.time() + CIRCUIT_RESET_S
+
+    def get(self, provider, url, timeout=None, count_timeouts=True, **kwargs):
+        """GET url as provider; returns the response or raises after the final retry"""
+        if not self._allow(provider):
+            raise ProviderUnavailable(f"{provider} is temporarily unavailable (circuit open)")
+        default_timeout, retries = self.settings.get(provider, (15, 1))
+
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(RETRY_BACKOFF_S * 2 ** (attempt - 1) * np.random.uniform(0.8, 1.2))
+            try:
+                response = self.session.get(url, timeout=timeout or default_timeout, **kwargs)
+            except requests.RequestException as e:
+                error = e
+                continue
+            if response.status_code == 429 or response.status_code >= 500:
+                error = requests.HTTPError(f"HTTP {response.status_code}", response=response)
+                continue
+            self._record(provider)
+            return response
+
+        if count_timeouts or not isinstance(error, requests.Timeout):
+            self._record(provider, f"{type(error).__name__}: {error}")
+        if isinstance(error, requests.HTTPError):
+            return error.response
+        raise error
+
+    def is_available(self, provider):
+        with self._lock:
+            return self._state(provider)['open_until'] <= time.time()
+
+    def health(self):
+        """Snapshot of every provider's status: 'healthy', 'degraded' or 'down'"""
+        with self._lock:
+            report = {}
+            for provider in self.settings:
+                state = dict(self._state(provider))
+                if state['open_until'] > time.time():
+                    state['status'] = 'down'
+                elif state['consecutive_failures']:
+                    state['status'] = 'degraded'
+                else:
+                    state['status'] = 'healthy'
+                report[provider] = state
+            return report
+
+
+_PROVIDER_CLIENT = None
+
+
+def get_provider_client():
+    """Process-wide ProviderClient shared by every data provider"""
+    global _PROVIDER_CLIENT
+    if _PROVIDER_CLIENT is None:
+        _PROVIDER_CLIENT = ProviderClient()
+    return _PROVIDER_CLIENT
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_cell(lat, lon, precision):
+    """Return (geohash, centre_lat, centre_lon) of the geohash cell containing a point"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(chars), (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def geohash_cell_radius_km(precision):
+    """Distance from a geohash cell's centre to its corners, in the app's degrees * 111 km"""
+    bits = 5 * precision
+    lat_span = 180 / 2 ** (bits // 2)
+    lon_span = 360 / 2 ** (bits - bits // 2)
+    return float(np.hypot(lat_span, lon_span)) / 2 * 111
+
+
+def provider_cell_margin_km(provider):
+    """How far a caller can be from the cell centre its cached provider entry was fetched at"""
+    return geohash_cell_radius_km(PROVIDER_GEOHASH_PRECISION.get(provider, 5))
+
+
+def within_radius(records, lat, lon, radius_km, digits=None):
+    """Records (dicts with lat and lon) within radius_km of (lat, lon), with distance_km measured from there"""
+    nearby = []
+    for record in records:
+        distance = ((record['lat'] - lat)**2 + (record['lon'] - lon)**2)**0.5 * 111
+        if distance <= radius_km:
+            nearby.append(dict(record, distance_km=distance if digits is None else round(distance, digits)))
+    return nearby
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one in-flight call
+
+    The first caller for a key runs the function; callers arriving while it
+    is running wait for it and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn()
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+        return call['result']
+
+
+class ProviderCache:
+    """Stale-while-revalidate cache for provider responses
+
+    Values younger than the provider's soft TTL are served as they are.
+    Between the soft and hard TTL the last good value is still served
+    immediately while a single background refresh replaces it; past the hard
+    TTL, or on a miss, the caller fetches synchronously. A failed fetch never
+    replaces a good value, so fetch functions should raise rather than
+    return a fallback. Concurrent fetches of the same key, from script
+    threads, refreshes or the prefetcher, share one upstream request.
+    """
+
+    def __init__(self, ttls=PROVIDER_CACHE_TTLS, backend=None, workers=PROVIDER_REFRESH_WORKERS):
+        self.ttls = ttls
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self._flights = SingleFlight()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='provider-refresh')
+        self._background = set()
+        self._sync_executor = ThreadPoolExecutor(max_workers=STORE_SYNC_WORKERS, thread_name_prefix='store-sync')
+        self.stats = {'fresh': 0, 'stale': 0, 'miss': 0, 'refresh_failed': 0, 'sync_failed': 0}
+
+    def get(self, provider, key, fetch):
+        """Return a copy of the cached value for (provider, key), calling fetch() as needed"""
+        cache_key = (provider,) + tuple(key)
+        soft_ttl, hard_ttl = self.ttls.get(provider, (1800, 1800))
+        entry = self.backend.get(self._backend_key(cache_key))
+        age = time.time() - entry[1] if entry is not None else None
+        with self._lock:
+            if age is not None and age < hard_ttl:
+                if age < soft_ttl:
+                    self.stats['fresh'] += 1
+                else:
+                    self.stats['stale'] += 1
+                    if cache_key not in self._refreshing:
+                        self._refreshing.add(cache_key)
+                        self._executor.submit(self._refresh, cache_key, fetch)
+                return copy.deepcopy(entry[0])
+            self.stats['miss'] += 1
+
+        value = self._fetch(cache_key, fetch)
+        return copy.deepcopy(value)
+
+    def get_at(self, provider, lat, lon, fetch_at, *extra):
+        """Like get, but keyed by the provider's geohash cell with fetch_at(lat, lon) at its centre
+
+        Nearby lookups share one cache entry and one upstream request. Only
+        the key is snapped: fetchers cover their radius plus
+        provider_cell_margin_km, and callers measure distances from their
+        own lat/lon (see within_radius).
+        """
+        precision = PROVIDER_GEOHASH_PRECISION.get(provider, 5)
+        cell, cell_lat, cell_lon = geohash_cell(lat, lon, precision)
+        return self.get(provider, (cell,) + extra, lambda: fetch_at(cell_lat, cell_lon))
+
+    def warm_at(self, provider, lat, lon, fetch_at, *extra, horizon_s=0):
+        """Synchronously refetch an entry that is missing or would go stale within horizon_s
+
+        Returns True if an upstream request was made.
+        """
+        cell, cell_lat, cell_lon = geohash_cell(lat, lon, PROVIDER_GEOHASH_PRECISION.get(provider, 5))
+        cache_key = (provider, cell) + extra
+        soft_ttl, _ = self.ttls.get(provider, (1800, 1800))
+        entry = self.backend.get(self._backend_key(cache_key))
+        if entry is not None and time.time() - entry[1] + horizon_s < soft_ttl:
+            return False
+        self._fetch(cache_key, lambda: fetch_at(cell_lat, cell_lon))
+        return True
+
+    @staticmethod
+    def _backend_key(cache_key):
+        return "provider|" + "|".join(str(part) for part in cache_key)
+
+    def _fetch(self, cache_key, fetch):
+        """Fetch and store a value, joining any identical fetch already in flight"""
+        def fetch_and_store():
+            value = fetch()
+            _, hard_ttl = self.ttls.get(cache_key[0], (1800, 1800))
+            self.backend.set(self._backend_key(cache_key), value, time.time(), ttl_s=hard_ttl)
+            return value
+        return self._flights.do(self._backend_key(cache_key), fetch_and_store)
+
+    @property
+    def coalesced(self):
+        """Calls that shared another call's result instead of running their own"""
+        return self._flights.coalesced
+
+    def coalesce(self, key, fn):
+        """Run fn(), sharing the result with any call for the same key already in flight"""
+        return self._flights.do(key, fn)
+
+    def run_in_background(self, key, fn):
+        """Run fn() on a store-sync thread unless a call for key is queued or running
+
+        For long local-store syncs that must not block a page render.
+        Returns True if a new background run was started.
+        """
+        with self._lock:
+            if key in self._background:
+                return False
+            self._background.add(key)
+        self._sync_executor.submit(self._run_background, key, fn)
+        return True
+
+    def is_running_in_background(self, key):
+        with self._lock:
+            return key in self._background
+
+    def _run_background(self, key, fn):
+        try:
+            self.coalesce(key, fn)
+        except Exception as e:
+            self.stats['sync_failed'] += 1
+            print(f"Background sync {key} failed: {e}")
+        finally:
+            with self._lock:
+                self._background.discard(key)
+
+    def _refresh(self, cache_key, fetch):
+        try:
+            self._fetch(cache_key, fetch)
+        except Exception as e:
+            self.stats['refresh_failed'] += 1
+            print(f"Background refresh of {cache_key[0]} failed, serving stale data: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(cache_key)
+
+
+_PROVIDER_CACHE = None
+
+
+def get_provider_cache():
+    """Process-wide ProviderCache shared by every data provider"""
+    global _PROVIDER_CACHE
+    if _PROVIDER_CACHE is None:
+        _PROVIDER_CACHE = ProviderCache(backend=make_cache_backend())
+    return _PROVIDER_CACHE
+
+class CityPrefetcher:
+    """Background thread that keeps provider data for catalogue cities warm
+
+    Every interval_s it walks the popular cities first, then the rest of
+    GLOBAL_CITIES, refetching weather, air quality, hotspots and VIIRS
+    entries that would otherwise go stale before the next pass, and syncing
+    any missing days of the city's fire history and new hours of its
+    measured air quality history. Each pass first syncs the
+    global MODIS AOD grids, which cover every city at once. Requests
+    are spaced stagger_s apart and providers with an open circuit are skipped.
+    """
+
+    def __init__(self, cities=None, interval_s=PREFETCH_INTERVAL_S, stagger_s=PREFETCH_STAGGER_S,
+                 radius_km=25):
+        if cities is None:
+            cities = POPULAR_CITIES + [name for name in GLOBAL_CITIES if name not in POPULAR_CITIES]
+        self.cities = cities
+        self.interval_s = interval_s
+        self.stagger_s = stagger_s
+        self.radius_km = radius_km
+        self._stop = threading.Event()
+        self._thread = None
+        self.status = {'cycles': 0, 'requests': 0, 'failures': 0, 'last_cycle': None}
+
+    def lookups(self):
+        """(provider, fetch_at, extra) for every configured provider, keyed as the getters key them"""
+        try:
+            api_keys = dict(st.secrets.get("api_keys", {}))
+        except Exception:
+            api_keys = {}
+        radius_km = self.radius_km
+
+        lookups = [
+            ('openaq', lambda la, lo: _fetch_openaq_stations(la, lo, radius_km), (radius_km,)),
+            ('nasa_firms', _fetch_viirs_fires, ()),
+        ]
+        if 'openweather' in api_keys:
+            lookups.append(('openweather', lambda la, lo: _fetch_weather(la, lo, api_keys['openweather']), ()))
+        if 'waqi' in api_keys:
+            lookups.append(('waqi', lambda la, lo: _fetch_air_quality(la, lo, api_keys['waqi']), ()))
+        if 'purpleair' in api_keys:
+            lookups.append(('purpleair', lambda la, lo: _fetch_purpleair_hotspots(la, lo, radius_km, api_keys['purpleair']),
+                            (radius_km,)))
+        return lookups
+
+    def run_once(self):
+        """Warm every catalogue city once"""
+        cache, client = get_provider_cache(), get_provider_client()
+        lookups = self.lookups()
+        username, password = nasa_credentials()
+        if username and client.is_available('nasa_giovanni'):
+            try:
+                self.status['requests'] += sync_aod_store(username, password)
+            except Exception as e:
+                self.status['failures'] += 1
+                print(f"AOD store sync failed: {e}")
+        for name in self.cities:
+            lat, lon = GLOBAL_CITIES[name]['coords']
+            for provider, fetch_at, extra in lookups:
+                if self._stop.is_set():
+                    return
+                if not client.is_available(provider):
+                    continue
+                try:
+                    fetched = cache.warm_at(provider, lat, lon, fetch_at, *extra, horizon_s=2 * self.interval_s)
+                except Exception as e:
+                    self.status['failures'] += 1
+                    print(f"Prefetch of {provider} for {name} failed: {e}")
+                    fetched = True
+                if fetched:
+                    self.status['requests'] += 1
+                    self._stop.wait(self.stagger_s)
+            if PYARROW_AVAILABLE and client.is_available('openaq') and not self._stop.is_set():
+                try:
+                    display = f"{name}, {GLOBAL_CITIES[name]['country']}"  # keyed as the UI keys it
+                    ingested = cache.coalesce(_history_sync_key(display),
+                                              lambda: sync_city_history(display, lat, lon))
+                    self.status['requests'] += int(ingested > 0)
+                except Exception as e:
+                    self.status['failures'] += 1
+                    print(f"Air quality history sync for {name} failed: {e}")
+            if client.is_available('nasa_firms') and not self._stop.is_set():
+                try:
+                    self.status['requests'] += sync_fire_history(lat, lon)
+                except Exception as e:
+                    self.status['failures'] += 1
+                    print(f"Fire history sync for {name} failed: {e}")
+        self.status['cycles'] += 1
+        self.status['last_cycle'] = time.time()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval_s)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='city-prefetch', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+_CITY_PREFETCHER = None
+_CITY_PREFETCHER_LOCK = threading.Lock()
+
+
+def start_city_prefetcher():
+    """Start the process-wide catalogue prefetcher once (disable with CIVAI_PREFETCH=0)"""
+    global _CITY_PREFETCHER
+    if os.environ.get("CIVAI_PREFETCH", "1") == "0":
+        return None
+    with _CITY_PREFETCHER_LOCK:
+        if _CITY_PREFETCHER is None:
+            _CITY_PREFETCHER = CityPrefetcher()
+            _CITY_PREFETCHER.start()
+    return _CITY_PREFETCHER
+
+def _openaq_hotspot(lat, lon, station_lat, station_lon, pm25, name):
+    """Build a hotspot dict for an OpenAQ station reading"""
+    distance_km = ((station_lat - lat)**2 + (station_lon - lon)**2)**0.5 * 111
+
+    if pm25 > 55:
+        severity = 'High'
+        intensity = min(1.0, pm25 / 150)
+    elif pm25 > 35:
+        severity = 'Medium'
+        intensity = pm25 / 100
+    else:
+        severity = 'Low'
+        intensity = pm25 / 50
+
+    return {
+        'lat': station_lat,
+        'lon': station_lon,
+        'intensity': intensity,
+        'pm25': pm25,
+        'severity': severity,
+        'source_type': 'Government Monitoring Station',
+        'distance_km': distance_km,
+        'sensor_name': name,
+        'confidence': 95,
+        'data_source': 'OpenAQ Network'
+    }
+
+def _openaq_latest_pm25(client, location_id):
+    """Latest PM2.5 value for one OpenAQ location, or None"""
+    response = client.get('openaq', f"https://api.openaq.org/v2/latest/{location_id}", timeout=10,
+                          count_timeouts=False)
+    if response.status_code != 200:
+        return None
+    for result in response.json().get('results', []):
+        for measurement in result.get('measurements', [result]):
+            if measurement.get('parameter') == 'pm25':
+                return measurement.get('value')
+    return None
+
+def _openaq_bulk_latest(client, lat, lon, radius_km):
+    """Latest PM2.5 for every station near (lat, lon) in one request; None if unsupported"""
+    params = {
+        'coordinates': f"{lat},{lon}",
+        'radius': radius_km * 1000,
+        'parameter': 'pm25',
+        'limit': 100
+    }
+    response = client.get('openaq', "https://api.openaq.org/v2/latest", params=params)
+    if response.status_code != 200:
+        return None
+
+    stations = []
+    for result in response.json().get('results', []):
+        try:
+            coordinates = result['coordinates']
+            pm25 = next(m['value'] for m in result['measurements'] if m['parameter'] == 'pm25')
+            stations.append((coordinates['latitude'], coordinates['longitude'], pm25, result['location']))
+        except (KeyError, TypeError, StopIteration):
+            continue
+    return stations
+
+_OPENAQ_STATION_POOL = None
+_OPENAQ_STATION_POOL_LOCK = threading.Lock()
+
+
+def get_openaq_station_pool():
+    """Bounded thread pool for per-station OpenAQ requests, shared across sessions"""
+    global _OPENAQ_STATION_POOL
+    with _OPENAQ_STATION_POOL_LOCK:
+        if _OPENAQ_STATION_POOL is None:
+            _OPENAQ_STATION_POOL = ThreadPoolExecutor(max_workers=OPENAQ_MAX_WORKERS,
+                                                      thread_name_prefix='openaq-station')
+        return _OPENAQ_STATION_POOL
+
+def _openaq_station_latest(client, lat, lon, radius_km, deadline_s=OPENAQ_DEADLINE_S):
+    """Per-station fallback: list locations, then fetch their latest readings concurrently
+
+    Requests share the pooled provider client and the process-wide station
+    pool. Stations that have not answered when deadline_s expires are
+    dropped (and their queued requests cancelled), so the partial results
+    gathered so far are returned instead of blocking. A slow station does
+    not count against the OpenAQ circuit breaker.
+    """
+    params = {
+        'coordinates': f"{lat},{lon}",
+        'radius': radius_km * 1000,
+        'limit': 50,
+        'has_geo': 'true'
+    }
+    response = client.get('openaq', "https://api.openaq.org/v2/locations", params=params)
+    if response.status_code != 200:
+        return None
+
+    locations = response.json().get('results', [])
+    pool = get_openaq_station_pool()
+    futures = {pool.submit(_openaq_latest_pm25, client, location['id']): location
+               for location in locations}
+    done, pending = wait(futures, timeout=deadline_s)
+    for future in pending:
+        future.cancel()
+
+    stations = []
+    for future in done:
+        location = futures[future]
+        try:
+            pm25 = future.result()
+            coordinates = location['coordinates']
+            stations.append((coordinates['latitude'], coordinates['longitude'], pm25, location['name']))
+        except Exception:
+            continue
+    return stations
+
 def get_openaq_sensors(lat, lon, radius_km=25):
-    """Backup: Get OpenAQ monitoring stations"""
+    """Backup: Get OpenAQ monitoring stations (cached stale-while-revalidate)"""
     
     try:
-        url = "https://api.openaq.org/v2/locations"
-        params = {
-            'coordinates': f"{lat},{lon}",
-            'radius': radius_km * 1000, 
-            'limit': 50,
-            'has_geo': 'true'
-        }
-        
-        response = requests.get(url, params=params, timeout=15)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            hotspots = []
-            locations = data.get('results', [])
-            
-            st.info(f"Found {len(locations)} government monitoring stations")
-            
-            for location in locations:
-                try:
-                    station_lat = location['coordinates']['latitude']
-                    station_lon = location['coordinates']['longitude']
-                    measurements_url = f"https://api.openaq.org/v2/latest/{location['id']}"
-                    meas_response = requests.get(measurements_url, timeout=10)
-                    
-                    if meas_response.status_code == 200:
-                        meas_data = meas_response.json()
-                        
-                        pm25 = None
-                        for measurement in meas_data.get('results', []):
-                            if measurement['parameter'] == 'pm25':
-                                pm25 = measurement['value']
-                                break
-                        
-                        if pm25 and pm25 > 0:
-                            distance_km = ((station_lat - lat)**2 + (station_lon - lon)**2)**0.5 * 111
-                            
-                            if pm25 > 55:
-                                severity = 'High'
-                                intensity = min(1.0, pm25 / 150)
-                            elif pm25 > 35:
-                                severity = 'Medium'
-                                intensity = pm25 / 100
-                            else:
-                                severity = 'Low'
-                                intensity = pm25 / 50
-                            
-                            hotspots.append({
-                                'lat': station_lat,
-                                'lon': station_lon,
-                                'intensity': intensity,
-                                'pm25': pm25,
-                                'severity': severity,
-                                'source_type': 'Government Monitoring Station',
-                                'distance_km': distance_km,
-                                'sensor_name': location['name'],
-                                'confidence': 95,
-                                'data_source': 'OpenAQ Network'
-                            })
-                except:
-                    continue
-            
-            return hotspots
+        stations = get_provider_cache().get_at(
+            'openaq', lat, lon, lambda cell_lat, cell_lon: _fetch_openaq_stations(cell_lat, cell_lon, radius_km),
+            radius_km
+        )
+        st.info(f"Found {len(stations)} government monitoring stations")
+
+        hotspots = [_openaq_hotspot(lat, lon, station_lat, station_lon, pm25, name)
+                    for station_lat, station_lon, pm25, name in stations
+                    if pm25 and pm25 > 0]
+        return [hotspot for hotspot in hotspots if hotspot['distance_km'] <= radius_km]
             
     except Exception as e:
         st.warning(f"OpenAQ API error: {e}")
@@ -909,6 +2970,355 @@ def get_openaq_sensors(lat, lon, radius_km=25):
 
     return get_simulated_hotspots(lat, lon)
 
+def _fetch_openaq_stations(lat, lon, radius_km):
+    """Latest PM2.5 for stations near (lat, lon) as (lat, lon, pm25, name) tuples; raises on failure
+
+    Uses the bulk "latest by coordinates" query when available; otherwise
+    falls back to concurrent per-station requests under a global deadline.
+    Stations are searched out to radius_km plus the OpenAQ cell margin.
+    """
+    client = get_provider_client()
+    reach_km = radius_km + provider_cell_margin_km('openaq')
+    stations = _openaq_bulk_latest(client, lat, lon, reach_km)
+    if stations is None:
+        stations = _openaq_station_latest(client, lat, lon, reach_km)
+    if stations is None:
+        raise requests.HTTPError("OpenAQ locations request failed")
+    return stations
+
+def normalize_history(readings, source):
+    """Hourly per-station means, in HistoryStore.COLUMNS order, from time/station/lat/lon/pm25/no2 readings
+
+    Readings with an unparseable time are dropped and negative values
+    (instrument fill values) count as missing.
+    """
+    def numeric(column):
+        if column not in readings:
+            return np.full(len(readings), np.nan)
+        values = pd.to_numeric(readings[column], errors='coerce').to_numpy(dtype=float)
+        return np.where(values < 0, np.nan, values)
+
+    frame = pd.DataFrame({
+        'time': pd.to_datetime(readings['time'], utc=True, errors='coerce', format='ISO8601').dt.floor('h'),
+        'station': readings['station'].astype(str),
+        'lat': pd.to_numeric(readings['lat'], errors='coerce') if 'lat' in readings else np.nan,
+        'lon': pd.to_numeric(readings['lon'], errors='coerce') if 'lon' in readings else np.nan,
+        'pm25': numeric('pm25'),
+        'no2': numeric('no2'),
+    }).dropna(subset=['time'])
+
+    hourly = frame.groupby(['station', 'time'], as_index=False, sort=False).agg(
+        {'lat': 'first', 'lon': 'first', 'pm25': 'mean', 'no2': 'mean'})
+    hourly = hourly.dropna(subset=['pm25', 'no2'], how='all')
+    hourly['source'] = source
+    return hourly[list(HistoryStore.COLUMNS)]
+
+def openaq_readings(measurements):
+    """Normalize long-format OpenAQ measurements (datetime, location, lat, lon, parameter, units, value)
+
+    This is both the layout of OpenAQ's archive CSV exports and of
+    _fetch_openaq_history's rows. NO2 reported in ppm is converted to ug/m3.
+    """
+    parameter = measurements['parameter'].astype(str).str.lower().str.replace('.', '', regex=False)
+    value = pd.to_numeric(measurements['value'], errors='coerce')
+    units = measurements['units'].astype(str).str.lower() if 'units' in measurements else pd.Series('', index=measurements.index)
+    no2 = value.where(units != 'ppm', value * NO2_UG_PER_PPM)
+
+    station = measurements['location_id'] if 'location_id' in measurements else measurements['location']
+    return normalize_history(pd.DataFrame({
+        'time': measurements['datetime'],
+        'station': station,
+        'lat': measurements.get('lat'),
+        'lon': measurements.get('lon'),
+        'pm25': value.where(parameter == 'pm25'),
+        'no2': no2.where(parameter == 'no2'),
+    }), 'openaq')
+
+def read_openaq_export(source, chunk_rows=200_000):
+    """Hourly history from an OpenAQ archive CSV export (path or file-like), read in chunks"""
+    wanted = {'location_id', 'location', 'datetime', 'lat', 'lon', 'parameter', 'units', 'value'}
+    parts = [openaq_readings(chunk) for chunk in
+             pd.read_csv(source, chunksize=chunk_rows, usecols=lambda name: str(name).strip() in wanted)]
+    if not parts:
+        return normalize_history(pd.DataFrame(columns=['time', 'station']), 'openaq')
+    # Hours split across chunks are merged again
+    return normalize_history(pd.concat(parts, ignore_index=True), 'openaq')
+
+def read_purpleair_export(source, station=None, lat=None, lon=None):
+    """Hourly history from a PurpleAir history CSV export (time_stamp plus a pm2.5 column)
+
+    The sensor is taken from a sensor_index column or from station, and
+    its position from latitude/longitude columns or from lat/lon.
+    """
+    readings = pd.read_csv(source)
+    readings.columns = [str(name).strip().lower() for name in readings.columns]
+    pm25_column = next((name for name in ('pm2.5_alt', 'pm2.5_atm', 'pm2.5_cf_1', 'pm2.5')
+                        if name in readings.columns), None)
+    if pm25_column is None or 'time_stamp' not in readings.columns:
+        raise ValueError("PurpleAir export needs time_stamp and pm2.5 columns")
+
+    times = readings['time_stamp']
+    if pd.api.types.is_numeric_dtype(times):
+        times = pd.to_datetime(times, unit='s', utc=True)
+    return normalize_history(pd.DataFrame({
+        'time': times,
+        'station': readings['sensor_index'] if 'sensor_index' in readings else (station or 'purpleair'),
+        'lat': readings['latitude'] if 'latitude' in readings else lat,
+        'lon': readings['longitude'] if 'longitude' in readings else lon,
+        'pm25': readings[pm25_column],
+    }), 'purpleair')
+
+class HistoryStore:
+    """Local Parquet store of hourly station PM2.5/NO2 history, partitioned by city and month
+
+    Rows live at <root>/city=<slug>/month=<YYYY-MM>/data.parquet. Ingesting
+    merges new rows into only the months they touch, keeping the last
+    reading per station and hour, so overlapping exports or API windows
+    can be re-ingested safely. Each city's merges hold an exclusive
+    fcntl.flock on <root>/city=<slug>/.lock, so concurrent syncs from
+    other server processes never drop each other's rows. Reads go through
+    pyarrow.dataset with partition and time filters and only the columns
+    asked for, and are reduced to daily means batch by batch, so memory
+    stays flat however many years are stored.
+    """
+
+    COLUMNS = ('time', 'station', 'source', 'lat', 'lon', 'pm25', 'no2')
+
+    def __init__(self, root=HISTORY_STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def city_key(city):
+        return re.sub(r"[^a-z0-9]+", "-", str(city).lower()).strip("-") or "unknown"
+
+    @staticmethod
+    def schema():
+        return pa.schema([
+            ('time', pa.timestamp('s', tz='UTC')), ('station', pa.string()), ('source', pa.string()),
+            ('lat', pa.float32()), ('lon', pa.float32()), ('pm25', pa.float32()), ('no2', pa.float32()),
+        ])
+
+    def _city_dir(self, city):
+        return os.path.join(self.root, f"city={self.city_key(city)}")
+
+    def months(self, city):
+        """Stored YYYY-MM partitions for city, oldest first"""
+        try:
+            names = os.listdir(self._city_dir(city))
+        except OSError:
+            return []
+        months = (name.split('=', 1)[1] for name in names if name.startswith('month='))
+        # A month directory whose first write failed holds no data file yet
+        return sorted(month for month in months if os.path.exists(self._month_path(city, month)))
+
+    def _month_path(self, city, month):
+        return os.path.join(self._city_dir(city), f"month={month}", "data.parquet")
+
+    @contextlib.contextmanager
+    def _locked(self, city):
+        """Hold the city's write lock, across threads and (where fcntl exists) processes"""
+        with self._lock:
+            if not FCNTL_AVAILABLE:
+                yield
+                return
+            os.makedirs(self._city_dir(city), exist_ok=True)
+            with open(os.path.join(self._city_dir(city), ".lock"), 'a') as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def ingest(self, city, history):
+        """Merge normalize_history rows into the city's monthly partitions; returns rows ingested"""
+        if history is None or history.empty:
+            return 0
+        history = history.assign(time=pd.to_datetime(history['time'], utc=True))
+        with self._locked(city):
+            months = history['time'].dt.tz_convert(None).to_numpy().astype('datetime64[M]').astype(str)
+            for month, rows in history.groupby(months):
+                path = self._month_path(city, month)
+                if os.path.exists(path):
+                    stored = pq.read_table(path).to_pandas()
+                    rows = pd.concat([stored, rows[list(self.COLUMNS)]], ignore_index=True)
+                rows = rows.drop_duplicates(['station', 'time'], keep='last').sort_values(['time', 'station'])
+
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Dot-prefixed, so dataset discovery never sees a half-written file
+                staging = os.path.join(os.path.dirname(path), f".data.{os.getpid()}.{threading.get_ident()}.tmp")
+                table = pa.Table.from_pandas(rows[list(self.COLUMNS)], schema=self.schema(), preserve_index=False)
+                pq.write_table(table, staging, compression='zstd')
+                os.replace(staging, path)
+        return len(history)
+
+    def latest_time(self, city, source):
+        """Latest stored hour from source for city, or None"""
+        for month in reversed(self.months(city)):
+            table = pq.read_table(self._month_path(city, month), columns=['time'],
+                                  filters=[('source', '=', source)])
+            if table.num_rows:
+                return pd.Timestamp(table.column('time').to_pandas().max())
+        return None
+
+    def synced_at(self, city):
+        """When city was last synced (a POSIX time), or None"""
+        try:
+            return os.path.getmtime(os.path.join(self._city_dir(city), "_synced"))
+        except OSError:
+            return None
+
+    def mark_synced(self, city):
+        os.makedirs(self._city_dir(city), exist_ok=True)
+        with open(os.path.join(self._city_dir(city), "_synced"), 'w') as handle:
+            handle.write(datetime.now(timezone.utc).isoformat())
+
+    def read_daily(self, city, start, end, columns=('pm25', 'no2')):
+        """Daily station-mean values of columns for city in [start, end), with a 'stations' count in attrs"""
+        columns = list(columns)
+        empty = pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]'),
+                              **{column: pd.Series(dtype=np.float32) for column in columns}})
+        empty.attrs['stations'] = 0
+        if not self.months(city):
+            return empty
+
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        start = start.tz_localize('UTC') if start.tzinfo is None else start.tz_convert('UTC')
+        end = end.tz_localize('UTC') if end.tzinfo is None else end.tz_convert('UTC')
+        dataset = pa_dataset.dataset(
+            self._city_dir(city), format='parquet',
+            partitioning=pa_dataset.partitioning(pa.schema([('month', pa.string())]), flavor='hive')
+        )
+        time_type = pa.timestamp('s', tz='UTC')
+        condition = ((pa_dataset.field('month') >= start.strftime('%Y-%m'))
+                     & (pa_dataset.field('month') <= end.strftime('%Y-%m'))
+                     & (pa_dataset.field('time') >= pa.scalar(start.to_pydatetime(), type=time_type))
+                     & (pa_dataset.field('time') < pa.scalar(end.to_pydatetime(), type=time_type)))
+
+        # Fixed per-day accumulators, so memory does not grow with the rows read
+        first_day = np.datetime64(start.tz_convert(None).floor('D'), 'D')
+        n_days = int((np.datetime64(end.tz_convert(None), 'D') - first_day).astype(int)) + 1
+        sums = {column: np.zeros(n_days) for column in columns}
+        counts = {column: np.zeros(n_days) for column in columns}
+        stations = set()
+        for batch in dataset.to_batches(columns=['time', 'station'] + columns, filter=condition,
+                                        batch_size=HISTORY_BATCH_ROWS):
+            if batch.num_rows == 0:
+                continue
+            stations.update(batch.column('station').unique().to_pylist())
+            days = batch.column('time').to_numpy().astype('datetime64[D]')
+            day_index = (days - first_day).astype(int)
+            for column in columns:
+                values = batch.column(column).to_numpy(zero_copy_only=False).astype(float)
+                valid = ~np.isnan(values)
+                sums[column] += np.bincount(day_index[valid], weights=values[valid], minlength=n_days)
+                counts[column] += np.bincount(day_index[valid], minlength=n_days)
+
+        observed = np.flatnonzero(sum(counts.values()))
+        if len(observed) == 0:
+            return empty
+        history = pd.DataFrame({'date': first_day + observed})
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for column in columns:
+                history[column] = (sums[column][observed] / counts[column][observed]).astype(np.float32)
+        history.attrs['stations'] = len(stations)
+        return history
+
+def _fetch_openaq_history(lat, lon, radius_km, date_from, date_to):
+    """Hourly PM2.5/NO2 history of stations near (lat, lon) between two times, paginated; raises on failure"""
+    client = get_provider_client()
+    rows = []
+    for page in range(1, HISTORY_MAX_PAGES + 1):
+        params = {
+            'coordinates': f"{lat},{lon}",
+            'radius': radius_km * 1000,
+            'parameter': ['pm25', 'no2'],
+            'date_from': date_from.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'date_to': date_to.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'limit': HISTORY_PAGE_LIMIT,
+            'page': page
+        }
+        response = client.get('openaq', "https://api.openaq.org/v2/measurements", params=params)
+        response.raise_for_status()
+        results = response.json().get('results', [])
+        for result in results:
+            coordinates = result.get('coordinates') or {}
+            rows.append((
+                (result.get('date') or {}).get('utc'), result.get('location'),
+                coordinates.get('latitude'), coordinates.get('longitude'),
+                result.get('parameter'), result.get('unit'), result.get('value')
+            ))
+        if len(results) < HISTORY_PAGE_LIMIT:
+            break
+
+    return openaq_readings(pd.DataFrame(
+        rows, columns=['datetime', 'location', 'lat', 'lon', 'parameter', 'units', 'value']))
+
+_HISTORY_STORE = None
+
+
+def get_history_store():
+    """Process-wide HistoryStore"""
+    global _HISTORY_STORE
+    if _HISTORY_STORE is None:
+        _HISTORY_STORE = HistoryStore()
+    return _HISTORY_STORE
+
+def sync_city_history(city, lat, lon, store=None, days=HISTORY_BACKFILL_DAYS, fetch=None):
+    """Backfill, then incrementally extend, a city's OpenAQ history; returns rows ingested
+
+    Each sync resumes from the latest stored OpenAQ hour (re-fetching it,
+    since ingesting deduplicates) and fetches HISTORY_FETCH_WINDOW_DAYS
+    at a time. A city synced within HISTORY_REFRESH_S is skipped.
+    """
+    store = store or get_history_store()
+    synced_at = store.synced_at(city)
+    if synced_at is not None and time.time() - synced_at < HISTORY_REFRESH_S:
+        return 0
+    fetch = fetch or (lambda start, end: _fetch_openaq_history(lat, lon, HISTORY_RADIUS_KM, start, end))
+
+    now = pd.Timestamp.now(tz='UTC').floor('h')
+    start = now - pd.Timedelta(days=days)
+    latest = store.latest_time(city, 'openaq')
+    if latest is not None:
+        start = max(start, latest)
+
+    ingested = 0
+    while start < now:
+        end = min(now, start + pd.Timedelta(days=HISTORY_FETCH_WINDOW_DAYS))
+        ingested += store.ingest(city, fetch(start, end))
+        start = end
+    store.mark_synced(city)
+    return ingested
+
+def _history_sync_key(city):
+    return f"history-sync|{get_history_store().city_key(city)}"
+
+def get_pollution_history(city, lat, lon, days=30):
+    """Daily measured PM2.5, NO2 and AQI for city over the last days, or None if nothing is stored
+
+    Only stored history is read; new hours are synced from OpenAQ on a
+    background thread when it is reachable. Needs pyarrow.
+    """
+    if not PYARROW_AVAILABLE:
+        return None
+    store = get_history_store()
+    if get_provider_client().is_available('openaq'):
+        get_provider_cache().run_in_background(
+            _history_sync_key(city), lambda: sync_city_history(city, lat, lon, store)
+        )
+
+    try:
+        end = pd.Timestamp.now(tz='UTC')
+        history = store.read_daily(city, end - pd.Timedelta(days=days), end)
+    except Exception as e:
+        st.warning(f"Pollution history store error: {e}")
+        return None
+    if history.empty or history['pm25'].isna().all():
+        return None
+    history['aqi'] = calculate_aqi(history['pm25'])
+    return history
+
 def get_simulated_hotspots(lat, lon):
     """Fallback: Your original simulated hotspots (condensed)"""
     hotspots = []
@@ -962,6 +3372,14 @@ def get_climate_appropriate_species(lat):
 
 def generate_tree_recommendations(lat, lon, hotspots):
     """Generate smart tree recommendations based on pollution levels and city characteristics"""
+    recommendations = place_tree_recommendations(lat, lon, hotspots)
+    nasa_data = get_real_nasa_modis_data(lat, lon)
+    fire_data = get_nasa_viirs_fire_data(lat, lon)
+    grid = DispersionGrid(lat, lon, extent_m=SATELLITE_GRID_EXTENT_M, cell_size_m=SATELLITE_GRID_CELL_M)
+    return apply_satellite_validation(recommendations, nasa_data, fire_data, grid)
+
+def place_tree_recommendations(lat, lon, hotspots):
+    """Place trees around hotspots and along city corridors (no satellite data needed)"""
     species_info = get_climate_appropriate_species(lat)
     recommendations = []
     
@@ -1052,25 +3470,30 @@ def generate_tree_recommendations(lat, lon, hotspots):
                 break
             attempts += 1
     
-# NEW: Validate recommendations with NASA satellite data
-    nasa_data = get_real_nasa_modis_data(lat, lon)
-    fire_data = get_nasa_viirs_fire_data(lat, lon)
-    validation = validate_recommendations_with_satellite_data(recommendations, nasa_data, fire_data)
+    return recommendations
+
+def apply_satellite_validation(recommendations, nasa_data, fire_data, grid=None):
+    """Validate recommendations with NASA satellite data, adjusting them in place"""
+    validation = validate_recommendations_with_satellite_data(recommendations, nasa_data, fire_data, grid)
+    if 'validated_areas' in validation:
+        high_aod = validation['validated_areas']['current_aod'] > HIGH_AOD
+    else:
+        high_aod = np.zeros(len(recommendations), dtype=bool)
     
     # Add satellite validation info to each recommendation
-    for i, rec in enumerate(recommendations):
+    for rec, high in zip(recommendations, high_aod):
         rec['satellite_validated'] = True
         rec['validation_confidence'] = validation.get('confidence', 'Medium')
         rec['nasa_correlation'] = 'Based on MODIS AOD analysis'
         
-        # Adjust effectiveness based on satellite data
-        if nasa_data and nasa_data['aod_value'] > 0.3:  # High pollution area
+        # Adjust effectiveness based on the local satellite AOD
+        if high:  # High pollution area
             rec['effectiveness'] = min(0.95, rec['effectiveness'] * 1.1)  # Boost effectiveness
             rec['priority'] = 'Critical' if rec['effectiveness'] > 0.8 else rec['priority']
     
     return recommendations
 
-def create_scenario_simulator(hotspots, tree_recommendations, weather_data):
+def create_scenario_simulator(hotspots, tree_recommendations, weather_data, lat=None, lon=None, pollution_data=None):
     """Create interactive scenario simulator"""
     
     st.markdown("""
@@ -1079,9 +3502,6 @@ def create_scenario_simulator(hotspots, tree_recommendations, weather_data):
     *See real-time predictions of environmental improvements*
     """)
     
-    # Initialize AI engine
-    ai_engine = AIClimateEngine()
-    
     col1, col2 = st.columns([1, 1])
     
     with col1:
@@ -1125,7 +3545,7 @@ def create_scenario_simulator(hotspots, tree_recommendations, weather_data):
         # Implementation timeline
         timeline = st.selectbox(
             "Implementation timeline:",
-            ["6 months (Emergency)", "1 year (Standard)", "2 years (Comprehensive)"]
+            list(TIMELINE_MULTIPLIERS)
         )
         
         # Species mix
@@ -1133,35 +3553,97 @@ def create_scenario_simulator(hotspots, tree_recommendations, weather_data):
             "Species diversity (1-10):", 
             min_value=1, max_value=10, value=5
         )
+
+        # Model grid resolution and extent
+        with st.expander("🧮 Model grid"):
+            grid_extent_km = st.selectbox("Modelled area (km across):", [5, 10, 25, 50], index=0)
+            grid_cell_m = st.selectbox("Cell size (m):", [50, 100, 250, 500], index=1)
+            wind_mode = "Current wind"
+            if pollution_data is not None and len(pollution_data) > 0:
+                wind_mode = st.radio("Wind conditions:", ["Current wind", "Wind rose (history)"], horizontal=True)
+
+    # A wind rose averages dispersion over the history's wind directions. It is
+    # kept per city so reruns hit the engine's dispersion cache.
+    scenario_weather = weather_data
+    if wind_mode != "Current wind":
+        cached_rose = st.session_state.get('scenario_wind_rose')
+        if cached_rose is None or cached_rose[0] != (lat, lon):
+            frames = build_weather_frames(weather_data, pollution_data, hourly=True,
+                                          seed=weather_frames_seed(lat, lon, pollution_data))
+            cached_rose = ((lat, lon), wind_rose_from_frames(frames))
+            st.session_state['scenario_wind_rose'] = cached_rose
+        scenario_weather = dict(weather_data, wind_rose=cached_rose[1])
+
+    # Initialize AI engine on a grid centred on the analysed city. The engine is
+    # kept in session state so slider reruns reuse its cached baseline and canopy.
+    engine_config = (lat, lon, grid_extent_km * 1000, grid_cell_m)
+    cached_engine = st.session_state.get('scenario_engine')
+    if cached_engine is not None and cached_engine[0] == engine_config:
+        ai_engine = cached_engine[1]
+    else:
+        try:
+            grid = DispersionGrid(lat, lon, extent_m=grid_extent_km * 1000, cell_size_m=grid_cell_m)
+        except ValueError as e:
+            st.warning(f"{e}. Using the default 5 km grid.")
+            grid = DispersionGrid(lat, lon)
+        ai_engine = AIClimateEngine(grid=grid, disk_cache=get_scenario_cache())
+        st.session_state['scenario_engine'] = (engine_config, ai_engine)
+    if 'wind_rose' in scenario_weather:
+        try:
+            ai_engine.grid.rotation_table(len(scenario_weather['wind_rose']))
+        except ValueError as e:
+            st.warning(f"{e}. Using the current wind instead of the wind rose.")
+            scenario_weather = weather_data
     
     with col2:
         st.markdown("###")
         
         # Run simulation (safe: guard against exceptions so Streamlit doesn't crash)
-        baseline_sources = [{'intensity': h.get('intensity', 0), 'type': h.get('source_type', 'Unknown')} 
+        baseline_sources = [{'intensity': h.get('intensity', 0), 'type': h.get('source_type', 'Unknown'),
+                             'lat': h.get('lat'), 'lon': h.get('lon')}
                            for h in (hotspots or [])]
-        selected_trees = (tree_recommendations or [])[:tree_count]
+        selected_trees_all = tree_recommendations or []
+        selected_trees = selected_trees_all[:tree_count]
 
         try:
             scenario_results = ai_engine.run_scenario_analysis(
                 baseline_data={'sources': baseline_sources},
                 intervention_data={'trees': selected_trees},
-                weather_data=weather_data
+                weather_data=scenario_weather
             )
         except Exception as e:
             # Don't let an internal error crash the whole app. Show a message and provide a safe fallback.
             st.error(f"Simulation error: {e}")
-            dispersion_grid = np.zeros((50, 50))
-            effectiveness_grid = np.zeros((50, 50))
+            dispersion_grid = ai_engine.grid.new_layer()
+            effectiveness_grid = ai_engine.grid.new_layer()
             scenario_results = {
                 'pollution_reduction_percent': 0.0,
                 'air_quality_improvement': 0.0,
                 'heat_reduction': {'reduction': 0.0},
                 'dispersion_grid': dispersion_grid,
                 'effectiveness_grid': effectiveness_grid,
+                'cell_size_m': ai_engine.grid.cell_size_m,
                 'confidence_score': 0.0
             }
         
+        # Optional uncertainty analysis replaces the fixed model confidence
+        uncertainty = None
+        if st.checkbox("Run uncertainty analysis (Monte Carlo)", value=False):
+            with st.spinner("Running Monte Carlo scenario realizations..."):
+                try:
+                    uncertainty = ai_engine.run_monte_carlo(
+                        baseline_data={'sources': baseline_sources},
+                        intervention_data={'trees': selected_trees},
+                        weather_data=weather_data,
+                        n_realizations=2000,
+                        seed=MONTE_CARLO_SEED
+                    )
+                    scenario_results['confidence_score'] = uncertainty['confidence_score']
+                    if uncertainty['fallback']:
+                        st.warning(uncertainty['fallback'])
+                except Exception as e:
+                    st.error(f"Uncertainty analysis error: {e}")
+
         # Display results with dynamic metrics
         pollution_reduction = scenario_results['pollution_reduction_percent']
         air_quality_improvement = scenario_results['air_quality_improvement']
@@ -1189,14 +3671,26 @@ def create_scenario_simulator(hotspots, tree_recommendations, weather_data):
         </div>
         """, unsafe_allow_html=True)
         
-        # Timeline-based projections
-        timeline_multipliers = {
-            "6 months (Emergency)": 0.6,
-            "1 year (Standard)": 1.0,
-            "2 years (Comprehensive)": 1.4
-        }
-        
-        multiplier = timeline_multipliers[timeline]
+        if uncertainty:
+            pollution_band = uncertainty['pollution_reduction_percent']
+            heat_band = uncertainty['heat_reduction']
+            exposure_band = uncertainty['exposure_weighted_reduction_percent']
+            st.markdown(f"""
+            <div style="background: rgba(255,255,255,0.1); border-radius: 10px; padding: 1rem; margin-top: 1rem;">
+                <h5 style="color: white;">90% Uncertainty Bands ({uncertainty['realizations']:,} realizations)</h5>
+                <p style="color: rgba(255,255,255,0.8);">
+                    Pollution reduction: <strong>{pollution_band['p5']:.1f}% – {pollution_band['p95']:.1f}%</strong>
+                    (median {pollution_band['p50']:.1f}%)<br>
+                    Exposure-weighted reduction: <strong>{exposure_band['p5']:.1f}% – {exposure_band['p95']:.1f}%</strong>
+                    (median {exposure_band['p50']:.1f}%)<br>
+                    Temperature reduction: <strong>{heat_band['p5']:.1f} – {heat_band['p95']:.1f}°C</strong>
+                    (median {heat_band['p50']:.1f}°C)
+                </p>
+            </div>
+            """, unsafe_allow_html=True)
+
+        # Timeline-based projections
+        multiplier = TIMELINE_MULTIPLIERS[timeline] * species_diversity_factor(species_diversity)
         projected_improvement = air_quality_improvement * multiplier
         
         st.markdown(f"""
@@ -1210,13 +3704,99 @@ def create_scenario_simulator(hotspots, tree_recommendations, weather_data):
         </div>
         """, unsafe_allow_html=True)
     
+    create_response_curve(ai_engine, selected_trees_all, weather_data, tree_count, species_diversity)
+
+    if pollution_data is not None and len(pollution_data) > 0:
+        create_exposure_timeline(ai_engine, baseline_sources, selected_trees, weather_data, pollution_data)
+
     # Advanced visualization
     create_impact_heatmap(scenario_results)
 
+def create_response_curve(ai_engine, tree_recommendations, weather_data, tree_count, species_diversity):
+    """Plot projected AQI improvement against tree count for every timeline"""
+
+    st.markdown("### 📈 Tree Count Response Curve")
+
+    try:
+        sweep = ai_engine.run_scenario_sweep(
+            {'trees': tree_recommendations}, weather_data,
+            tree_counts=range(10, 201, 10),
+            timelines=list(TIMELINE_MULTIPLIERS),
+            species_diversities=[species_diversity]
+        )
+    except Exception as e:
+        st.error(f"Sweep error: {e}")
+        return
+
+    fig = px.line(
+        sweep, x='tree_count', y='projected_aqi_improvement', color='timeline', markers=True,
+        labels={'tree_count': 'Trees planted', 'projected_aqi_improvement': 'Expected AQI improvement',
+                'timeline': 'Timeline'}
+    )
+    fig.add_vline(x=tree_count, line_dash='dash', line_color='white')
+    fig.update_layout(
+        height=400,
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white'),
+        xaxis=dict(gridcolor='rgba(255,255,255,0.1)'),
+        yaxis=dict(gridcolor='rgba(255,255,255,0.1)')
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+def create_exposure_timeline(ai_engine, baseline_sources, selected_trees, weather_data, pollution_data):
+    """Exposure-weighted impact accumulated over the pollution history's weather frames"""
+
+    st.markdown(f"### ⏱️ {len(pollution_data)}-Day Exposure Simulation")
+
+    resolution = st.radio("Weather frames:", ["Hourly", "Daily"], horizontal=True)
+    try:
+        seed = weather_frames_seed(ai_engine.grid.center_lat, ai_engine.grid.center_lon, pollution_data)
+        frames = build_weather_frames(weather_data, pollution_data, hourly=resolution == "Hourly", seed=seed)
+        series = ai_engine.run_time_series(
+            baseline_data={'sources': baseline_sources},
+            intervention_data={'trees': selected_trees},
+            weather_frames=frames
+        )
+    except Exception as e:
+        st.error(f"Time-series simulation error: {e}")
+        return
+
+    st.metric(
+        "Exposure-weighted pollution reduction",
+        f"{series['exposure_weighted_reduction_percent']:.1f}%",
+        f"{series['exposure_weighted_reduction_percent'] - series['pollution_reduction_percent']:+.1f}% vs area average"
+    )
+
+    fig = px.line(
+        series['frames'], x='time', y='exposure_weighted_reduction_percent',
+        labels={'time': 'Time', 'exposure_weighted_reduction_percent': 'Exposure-weighted reduction (%)'}
+    )
+    fig.update_layout(
+        height=350,
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white'),
+        xaxis=dict(gridcolor='rgba(255,255,255,0.1)'),
+        yaxis=dict(gridcolor='rgba(255,255,255,0.1)')
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
 def create_impact_heatmap(scenario_results):
     """Create advanced impact visualization heatmap"""
     
     st.markdown("### 🗺️ Impact Heatmap: Before vs After")
+
+    # Large tiled grids are block-averaged down to a plottable resolution
+    dispersion_grid = scenario_results['dispersion_grid']
+    effectiveness_grid = scenario_results['effectiveness_grid']
+    if isinstance(dispersion_grid, TiledGrid):
+        improved_grid, _ = dispersion_grid.reduced_by(effectiveness_grid).downsample(HEATMAP_MAX_SIDE)
+        dispersion_grid, factor = dispersion_grid.downsample(HEATMAP_MAX_SIDE)
+    else:
+        improved_grid = dispersion_grid * (1 - effectiveness_grid)
+        factor = 1
+    grid_label = f"{scenario_results.get('cell_size_m', 100) * factor:g}m grid"
     
     col1, col2 = st.columns(2)
     
@@ -1224,8 +3804,6 @@ def create_impact_heatmap(scenario_results):
         st.markdown("#### Current Pollution Dispersion")
         
         # Create pollution heatmap
-        dispersion_grid = scenario_results['dispersion_grid']
-        
         fig1 = go.Figure(data=go.Heatmap(
             z=dispersion_grid,
             colorscale='Reds',
@@ -1235,8 +3813,8 @@ def create_impact_heatmap(scenario_results):
         
         fig1.update_layout(
             title="Baseline Pollution Distribution",
-            xaxis_title="East-West (100m grid)",
-            yaxis_title="North-South (100m grid)",
+            xaxis_title=f"East-West ({grid_label})",
+            yaxis_title=f"North-South ({grid_label})",
             height=400,
             paper_bgcolor='rgba(0,0,0,0)',
             plot_bgcolor='rgba(0,0,0,0)',
@@ -1249,9 +3827,6 @@ def create_impact_heatmap(scenario_results):
         st.markdown("#### After Tree Implementation")
         
         # Apply tree effectiveness to pollution grid
-        effectiveness_grid = scenario_results['effectiveness_grid']
-        improved_grid = dispersion_grid * (1 - effectiveness_grid)
-        
         fig2 = go.Figure(data=go.Heatmap(
             z=improved_grid,
             colorscale='RdYlGn_r',
@@ -1261,8 +3836,8 @@ def create_impact_heatmap(scenario_results):
         
         fig2.update_layout(
             title="Post-Intervention Projection",
-            xaxis_title="East-West (100m grid)",
-            yaxis_title="North-South (100m grid)",
+            xaxis_title=f"East-West ({grid_label})",
+            yaxis_title=f"North-South ({grid_label})",
             height=400,
             paper_bgcolor='rgba(0,0,0,0)',
             plot_bgcolor='rgba(0,0,0,0)',
@@ -1282,8 +3857,8 @@ def create_impact_heatmap(scenario_results):
     
     fig3.update_layout(
         title="Net Improvement (Darker Green = Better)",
-        xaxis_title="East-West (100m grid)",
-        yaxis_title="North-South (100m grid)",
+        xaxis_title=f"East-West ({grid_label})",
+        yaxis_title=f"North-South ({grid_label})",
         height=400,
         paper_bgcolor='rgba(0,0,0,0)',
         plot_bgcolor='rgba(0,0,0,0)',
@@ -1302,103 +3877,343 @@ def setup_nasa_auth():
         st.error("NASA credentials not found in secrets.toml")
         return None, None
 
-@st.cache_data(ttl=3600)
+def nasa_credentials():
+    """(username, password) from secrets.toml, or (None, None) without reporting an error"""
+    try:
+        nasa = st.secrets["nasa"]
+        return nasa["username"], nasa["password"]
+    except Exception:
+        return None, None
+
+def aod_grid_from_points(lats, lons, values):
+    """Average point AOD values into an AOD_GRID_SHAPE grid; cells without values are NaN"""
+    lats = np.asarray(lats, dtype=float).ravel()
+    lons = np.asarray(lons, dtype=float).ravel()
+    values = np.asarray(values, dtype=float).ravel()
+    valid = np.isfinite(values) & (values != -9999) & np.isfinite(lats) & np.isfinite(lons)
+    rows = np.clip(np.floor(lats[valid] + 90).astype(int), 0, AOD_GRID_SHAPE[0] - 1)
+    cols = np.floor(lons[valid] + 180).astype(int) % AOD_GRID_SHAPE[1]
+    cells = rows * AOD_GRID_SHAPE[1] + cols
+    size = AOD_GRID_SHAPE[0] * AOD_GRID_SHAPE[1]
+    totals = np.bincount(cells, weights=values[valid], minlength=size)
+    counts = np.bincount(cells, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (totals / counts).reshape(AOD_GRID_SHAPE).astype(np.float32)
+
+class AodStore:
+    """Local store of daily global MOD08_D3 AOD grids, memory-mapped for bounding-box means
+
+    Each day is one float32 .npy grid of AOD_GRID_SHAPE at <root>/<YYYY-MM-DD>.npy;
+    row i covers latitudes [i - 90, i - 89) and column j longitudes
+    [j - 180, j - 179), with NaN where there was no retrieval. Grids are
+    opened with mmap_mode='r' and kept open, so a box mean only touches
+    the few cells it covers. The last AOD_RECENT_DAYS days are refetched
+    after AOD_RECENT_REFRESH_S because Giovanni may still be filling them.
+    """
+
+    def __init__(self, root=AOD_STORE_DIR):
+        self.root = root
+        self._grids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, day):
+        return os.path.join(self.root, f"{day}.npy")
+
+    def put(self, day, grid):
+        """Store the grid for day, replacing any earlier one"""
+        grid = np.where(np.asarray(grid) == -9999, np.nan, grid).astype(np.float32)
+        if grid.shape != AOD_GRID_SHAPE:
+            raise ValueError(f"AOD grid for {day} has shape {grid.shape}, expected {AOD_GRID_SHAPE}")
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(day)
+        staging = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(staging, 'wb') as handle:
+            np.save(handle, grid)
+        os.replace(staging, path)
+        with self._lock:
+            self._grids.pop(day, None)
+
+    def grid(self, day):
+        """The memory-mapped grid for day, or None if it is not stored"""
+        path = self._path(day)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._grids.get(day)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, np.load(path, mmap_mode='r'))
+                self._grids[day] = cached
+            self._grids.move_to_end(day)
+            while len(self._grids) > AOD_OPEN_GRIDS:
+                self._grids.popitem(last=False)
+        return cached[1]
+
+    def missing_days(self, days=AOD_WINDOW_DAYS, today=None):
+        """Days of the window with no grid, or with a recent grid due for a refetch"""
+        today = today or datetime.now(timezone.utc).date()
+        missing = []
+        for offset in range(days):
+            day = today - timedelta(days=offset)
+            path = self._path(day)
+            if not os.path.exists(path):
+                missing.append(day)
+            elif offset < AOD_RECENT_DAYS and time.time() - os.path.getmtime(path) > AOD_RECENT_REFRESH_S:
+                missing.append(day)
+        return missing
+
+    def sync(self, fetch, days=AOD_WINDOW_DAYS):
+        """Fetch the window's missing days with fetch(day) -> grid or None; returns requests made
+
+        Days without any retrieval are stored as all-NaN grids so they
+        are not requested again until their refresh is due.
+        """
+        requests_made = 0
+        for day in self.missing_days(days):
+            grid = fetch(day)
+            requests_made += 1
+            self.put(day, grid if grid is not None else np.full(AOD_GRID_SHAPE, np.nan, dtype=np.float32))
+        return requests_made
+
+    def seed(self, source):
+        """Load sample grids from a file or directory; returns the days stored
+
+        .npy files hold one AOD_GRID_SHAPE grid and .npz files an 'aod'
+        grid, dated by a YYYY-MM-DD in the file name. CSV files hold
+        lat, lon and aod columns plus a date column or a dated file name.
+        """
+        paths = [source]
+        if os.path.isdir(source):
+            paths = [os.path.join(source, name) for name in sorted(os.listdir(source))]
+
+        seeded = []
+        for path in paths:
+            match = re.search(r"\d{4}-\d{2}-\d{2}", os.path.basename(path))
+            file_day = datetime.strptime(match.group(0), '%Y-%m-%d').date() if match else None
+            extension = os.path.splitext(path)[1].lower()
+            if extension == '.npy' and file_day:
+                self.put(file_day, np.load(path, allow_pickle=False))
+                seeded.append(file_day)
+            elif extension == '.npz' and file_day:
+                with np.load(path, allow_pickle=False) as archive:
+                    self.put(file_day, archive['aod'])
+                seeded.append(file_day)
+            elif extension == '.csv':
+                frame = pd.read_csv(path)
+                frame.columns = [str(name).strip().lower() for name in frame.columns]
+                if 'date' in frame.columns:
+                    groups = frame.groupby(pd.to_datetime(frame['date']).dt.date)
+                elif file_day:
+                    groups = [(file_day, frame)]
+                else:
+                    continue
+                for day, rows in groups:
+                    self.put(day, aod_grid_from_points(rows['lat'], rows['lon'], rows['aod']))
+                    seeded.append(day)
+        return seeded
+
+    def box_mean(self, lat, lon, half_deg=0.5, days=AOD_WINDOW_DAYS):
+        """Mean AOD over the lat/lon box of half-width half_deg across the last days of stored grids
+
+        Returns (mean_aod, data_points, latest_day), or None when no stored cell has a retrieval.
+        """
+        rows = np.arange(np.floor(lat - half_deg + 90), np.ceil(lat + half_deg + 90), dtype=int)
+        rows = rows[(rows >= 0) & (rows < AOD_GRID_SHAPE[0])]
+        cols = np.arange(np.floor(lon - half_deg + 180), np.ceil(lon + half_deg + 180), dtype=int) % AOD_GRID_SHAPE[1]
+        cells = np.ix_(rows, cols)
+
+        today = datetime.now(timezone.utc).date()
+        total, points, latest = 0.0, 0, None
+        for offset in range(days):
+            day = today - timedelta(days=offset)
+            grid = self.grid(day)
+            if grid is None:
+                continue
+            values = grid[cells]
+            valid = np.isfinite(values)
+            count = int(valid.sum())
+            if count:
+                total += float(values[valid].sum())
+                points += count
+                latest = latest or day
+
+        if not points:
+            return None
+        return total / points, points, latest
+
+    def window_mean(self, rows, cols, days=AOD_WINDOW_DAYS):
+        """Per-cell mean AOD of the rows x cols patch over the last days of stored grids, NaN without retrievals"""
+        cells = np.ix_(rows, cols)
+        total = np.zeros((len(rows), len(cols)))
+        count = np.zeros((len(rows), len(cols)))
+        today = datetime.now(timezone.utc).date()
+        for offset in range(days):
+            grid = self.grid(today - timedelta(days=offset))
+            if grid is None:
+                continue
+            values = np.asarray(grid[cells], dtype=float)
+            valid = np.isfinite(values)
+            total += np.where(valid, values, 0.0)
+            count += valid
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return total / count
+
+def modis_aod_summary(avg_aod, data_points, last_updated, source='NASA MODIS Terra/Aqua'):
+    """The MODIS result dict shown in the UI and used for validation"""
+    return {
+        'source': source,
+        'aod_value': round(avg_aod, 4),
+        'estimated_pm25': round(avg_aod * AOD_TO_PM25, 1),
+        'data_points': data_points,
+        'last_updated': last_updated,
+        'status': 'Active',
+        'quality': 'Excellent'
+    }
+
+def _fetch_modis_aod_grid(day, username, password):
+    """Fetch one day's global MOD08_D3 AOD map as an AOD_GRID_SHAPE grid; None if no valid data, raises on failure
+
+    Values come back either with 'lat'/'lon' coordinates, which are
+    averaged into cells, or as a bare global grid in MOD08_D3's native
+    north-to-south row order.
+    """
+    base_url = "https://giovanni.gsfc.nasa.gov/giovanni/daac-bin/service_request.pl"
+    params = {
+        'service': 'TmAvMp',
+        'version': '1.02',
+        'bbox': "-180,-90,180,90",
+        'data': 'MOD08_D3_6_1_Aerosol_Optical_Depth_Land_Ocean_Mean_Mean',
+        'starttime': day.strftime('%Y-%m-%dT00:00:00Z'),
+        'endtime': day.strftime('%Y-%m-%dT23:59:59Z'),
+        'format': 'json'
+    }
+
+    response = get_provider_client().get('nasa_giovanni', base_url, timeout=AOD_GRID_TIMEOUT_S,
+                                         params=params, auth=(username, password))
+    response.raise_for_status()
+
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    values = np.asarray(data.get('data', []), dtype=float)
+    if values.size == 0:
+        return None
+
+    if 'lat' in data and 'lon' in data:
+        lats, lons = np.asarray(data['lat'], dtype=float), np.asarray(data['lon'], dtype=float)
+        if values.ndim == 2 and values.shape == (lats.size, lons.size):
+            lats, lons = np.meshgrid(lats, lons, indexing='ij')
+        grid = aod_grid_from_points(lats, lons, values)
+    elif values.size == AOD_GRID_SHAPE[0] * AOD_GRID_SHAPE[1]:
+        grid = np.flipud(values.reshape(AOD_GRID_SHAPE)).astype(np.float32)
+        grid[grid == -9999] = np.nan
+    else:
+        raise ValueError(f"Unexpected Giovanni grid of {values.size} values for {day}")
+
+    return grid if np.isfinite(grid).any() else None
+
+_AOD_STORE = None
+
+
+def get_aod_store():
+    """Process-wide AodStore, seeded from AOD_SEED_DIR when that is set"""
+    global _AOD_STORE
+    if _AOD_STORE is None:
+        store = AodStore()
+        if AOD_SEED_DIR:
+            try:
+                store.seed(AOD_SEED_DIR)
+            except Exception as e:
+                print(f"Seeding AOD store from {AOD_SEED_DIR} failed: {e}")
+        _AOD_STORE = store
+    return _AOD_STORE
+
+def _aod_sync(username, password, days):
+    store = get_aod_store()
+    return lambda: store.sync(lambda day: _fetch_modis_aod_grid(day, username, password), days)
+
+def sync_aod_store(username, password, days=AOD_WINDOW_DAYS):
+    """Fetch any missing daily grids of the window into the AOD store; returns requests made"""
+    return get_provider_cache().coalesce(f"aod-sync|{days}", _aod_sync(username, password, days))
+
+def sync_aod_store_in_background(username, password, days=AOD_WINDOW_DAYS):
+    """Start sync_aod_store on a store-sync thread unless one is already queued or running"""
+    return get_provider_cache().run_in_background(f"aod-sync|{days}", _aod_sync(username, password, days))
+
 def get_real_nasa_modis_data(lat, lon):
-    """Get REAL NASA MODIS Aerosol Optical Depth data"""
-    
+    """Get REAL NASA MODIS Aerosol Optical Depth data, from the local AOD store when it covers (lat, lon)
+
+    Missing grids are synced on a background thread, so a render only reads what is already stored.
+    """
+
+    username, password = nasa_credentials()
+    if username and get_provider_client().is_available('nasa_giovanni'):
+        sync_aod_store_in_background(username, password)
+
+    try:
+        local = get_aod_store().box_mean(lat, lon)
+    except Exception as e:
+        st.warning(f"NASA MODIS store error: {e}")
+        local = None
+    if local:
+        avg_aod, data_points, latest = local
+        return modis_aod_summary(avg_aod, data_points, latest.strftime('%Y-%m-%d UTC'),
+                                 source='NASA MODIS Terra/Aqua (MOD08_D3)')
+
     username, password = setup_nasa_auth()
     if not username:
         return None
     
     try:
-        base_url = "https://giovanni.gsfc.nasa.gov/giovanni/daac-bin/service_request.pl"
-        
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=7)
-        
-        params = {
-            'service': 'TmAvMp',
-            'version': '1.02',
-            'bbox': f"{lon-0.5},{lat-0.5},{lon+0.5},{lat+0.5}",
-            'data': 'MOD08_D3_6_1_Aerosol_Optical_Depth_Land_Ocean_Mean_Mean',
-            'starttime': start_date.strftime('%Y-%m-%dT00:00:00Z'),
-            'endtime': end_date.strftime('%Y-%m-%dT23:59:59Z'),
-            'format': 'json'
-        }
-        
-        response = requests.get(base_url, params=params, 
-                              auth=(username, password), timeout=30)
-        
-        if response.status_code == 200:
-            try:
-                data = response.json()
-                if 'data' in data and len(data['data']) > 0:
-                    aod_values = [float(x) for x in data['data'] if x != -9999]
-                    
-                    if aod_values:
-                        avg_aod = np.mean(aod_values)
-                        estimated_pm25 = avg_aod * 85
-                        
-                        return {
-                            'source': 'NASA MODIS Terra/Aqua',
-                            'aod_value': round(avg_aod, 4),
-                            'estimated_pm25': round(estimated_pm25, 1),
-                            'data_points': len(aod_values),
-                            'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M UTC'),
-                            'status': 'Active',
-                            'quality': 'Excellent'
-                        }
-            except:
-                pass
-                
+        return get_provider_cache().get_at(
+            'nasa_giovanni', lat, lon,
+            lambda cell_lat, cell_lon: _fetch_modis_aod(cell_lat, cell_lon, username, password)
+        )
     except Exception as e:
         st.warning(f"NASA MODIS API error: {e}")
     
     return None
 
-@st.cache_data(ttl=1800)
-def get_nasa_viirs_fire_data(lat, lon):
-    """Get NASA VIIRS active fire data"""
+def _fetch_modis_aod(lat, lon, username, password):
+    """Fetch the 7-day mean MODIS AOD around (lat, lon); None if no valid data, raises on failure"""
+    base_url = "https://giovanni.gsfc.nasa.gov/giovanni/daac-bin/service_request.pl"
+    
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=7)
+    
+    params = {
+        'service': 'TmAvMp',
+        'version': '1.02',
+        'bbox': f"{lon-0.5},{lat-0.5},{lon+0.5},{lat+0.5}",
+        'data': 'MOD08_D3_6_1_Aerosol_Optical_Depth_Land_Ocean_Mean_Mean',
+        'starttime': start_date.strftime('%Y-%m-%dT00:00:00Z'),
+        'endtime': end_date.strftime('%Y-%m-%dT23:59:59Z'),
+        'format': 'json'
+    }
+    
+    response = get_provider_client().get('nasa_giovanni', base_url, params=params,
+                                         auth=(username, password))
+    response.raise_for_status()
     
     try:
-        base_url = "https://firms.modaps.eosdis.nasa.gov/api/area/csv"
-        
-        params = {
-            'source': 'VIIRS_SNPP_NRT',
-            'area': f"{lat-0.5},{lon-0.5},{lat+0.5},{lon+0.5}",
-            'dayRange': 1,
-            'date': datetime.now().strftime('%Y-%m-%d')
-        }
-        
-        response = requests.get(base_url, params=params, timeout=20)
+        data = response.json()
+    except ValueError:
+        return None
+    if 'data' in data and len(data['data']) > 0:
+        aod_values = [float(x) for x in data['data'] if x != -9999]
         
-        if response.status_code == 200 and response.text.strip():
-            try:
-                lines = response.text.strip().split('\n')
-                if len(lines) > 1:
-                    fire_count = len(lines) - 1
-                    
-                    fires = []
-                    for line in lines[1:]:
-                        parts = line.split(',')
-                        if len(parts) >= 10:
-                            fire_lat = float(parts[0])
-                            fire_lon = float(parts[1])
-                            distance = ((fire_lat - lat)**2 + (fire_lon - lon)**2)**0.5 * 111
-                            
-                            if distance <= 50:
-                                fires.append({'distance_km': round(distance, 1)})
-                    
-                    return {
-                        'source': 'NASA VIIRS SNPP',
-                        'fire_count': len(fires),
-                        'nearest_fire_km': min([f['distance_km'] for f in fires]) if fires else None,
-                        'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M UTC'),
-                        'status': 'Active',
-                        'quality': 'Excellent'
-                    }
-            except:
-                pass
+        if aod_values:
+            return modis_aod_summary(np.mean(aod_values), len(aod_values),
+                                     datetime.now().strftime('%Y-%m-%d %H:%M UTC'))
+    return None
+
+def get_nasa_viirs_fire_data(lat, lon):
+    """Get NASA VIIRS active fire data (cached stale-while-revalidate)"""
+    
+    try:
+        return viirs_fires_near(get_provider_cache().get_at('nasa_firms', lat, lon, _fetch_viirs_fires), lat, lon)
     except Exception as e:
         st.warning(f"NASA VIIRS API error: {e}")
     
@@ -1409,8 +4224,373 @@ def get_nasa_viirs_fire_data(lat, lon):
         'quality': 'Good',
         'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M UTC')
     }
-def validate_recommendations_with_satellite_data(tree_locations, nasa_modis_data, nasa_fire_data):
-    """Correlate tree placement with actual NASA satellite measurements"""
+
+def viirs_fires_near(result, lat, lon):
+    """Narrow a cached VIIRS cell result to the fires within FIRE_RADIUS_KM of (lat, lon)"""
+    fires = within_radius(result.get('fires', []), lat, lon, FIRE_RADIUS_KM, digits=1)
+    result = dict(result, fires=fires, fire_count=len(fires))
+    if 'nearest_fire_km' in result:
+        result['nearest_fire_km'] = min(fire['distance_km'] for fire in fires) if fires else None
+    return result
+
+def _fetch_viirs_fires(lat, lon):
+    """Fetch today's VIIRS fire detections around (lat, lon); raises on failure
+
+    Fires are kept out to FIRE_RADIUS_KM plus the FIRMS cell margin, for
+    viirs_fires_near to narrow to each caller's point.
+    """
+    base_url = "https://firms.modaps.eosdis.nasa.gov/api/area/csv"
+    
+    params = {
+        'source': 'VIIRS_SNPP_NRT',
+        'area': f"{lon-0.5},{lat-0.5},{lon+0.5},{lat+0.5}",  # west,south,east,north
+        'dayRange': 1,
+        'date': datetime.now().strftime('%Y-%m-%d')
+    }
+    
+    response = get_provider_client().get('nasa_firms', base_url, params=params, stream=True)
+    try:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        fires, rows_read = parse_firms_csv(response.raw, lat, lon,
+                                           FIRE_RADIUS_KM + provider_cell_margin_km('nasa_firms'))
+    finally:
+        response.close()
+    
+    result = {
+        'source': 'NASA VIIRS SNPP',
+        'fire_count': len(fires['lat']),
+        'fires': firms_records(fires),
+        'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M UTC'),
+        'status': 'Active',
+        'quality': 'Good'
+    }
+    if rows_read:
+        result['nearest_fire_km'] = round(float(fires['distance_km'].min()), 1) if len(fires['lat']) else None
+        result['quality'] = 'Excellent'
+    return result
+
+def _empty_firms_columns():
+    return {
+        'lat': np.empty(0), 'lon': np.empty(0), 'distance_km': np.empty(0),
+        'brightness': np.empty(0), 'frp': np.empty(0),
+        'confidence': np.empty(0, dtype='U8'), 'acq_time': np.empty(0, dtype='datetime64[m]'),
+    }
+
+def _firms_column(frame, column, default):
+    if column is None:
+        return pd.Series(default, index=frame.index)
+    return frame[column]
+
+def _firms_numeric(values):
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+
+def _firms_chunk(frame, names, lat, lon, radius_km):
+    """Convert a chunk of FIRMS rows to column arrays, keeping fires within radius_km
+
+    Only latitude and longitude are examined for every row; the remaining
+    columns are converted just for the rows that pass the distance filter.
+    """
+    lats = _firms_numeric(frame[names['lat']])
+    lons = _firms_numeric(frame[names['lon']])
+    keep = np.isfinite(lats) & np.isfinite(lons)
+    if lat is not None and lon is not None:
+        distance = np.hypot(lats - lat, lons - lon) * 111
+        if radius_km is not None:
+            keep &= distance <= radius_km
+    else:
+        distance = np.full(len(frame), np.nan)
+
+    kept = frame[keep]
+    hhmm = _firms_numeric(_firms_column(kept, names['acq_time'], 0))
+    hhmm = np.where(np.isfinite(hhmm), hhmm, 0).astype(int)
+    dates = pd.to_datetime(_firms_column(kept, names['acq_date'], None), format='%Y-%m-%d', errors='coerce')
+    acq_time = (dates + pd.to_timedelta(hhmm // 100 * 60 + hhmm % 100, unit='m')).to_numpy(dtype='datetime64[m]')
+
+    return {
+        'lat': lats[keep], 'lon': lons[keep], 'distance_km': distance[keep],
+        'brightness': _firms_numeric(_firms_column(kept, names['brightness'], np.nan)),
+        'frp': _firms_numeric(_firms_column(kept, names['frp'], np.nan)),
+        'confidence': _firms_column(kept, names['confidence'], '').astype(str).to_numpy(dtype='U8'),
+        'acq_time': acq_time,
+    }
+
+def parse_firms_csv(source, lat=None, lon=None, radius_km=None, chunk_rows=FIRMS_CHUNK_ROWS):
+    """Stream a FIRMS CSV (path or file-like) into column arrays, keeping fires within radius_km of (lat, lon)
+
+    The file is read chunk_rows at a time by pandas' C parser, so memory
+    stays bounded by one chunk plus the fires kept. Columns are located by
+    header name, so VIIRS and MODIS files both parse, and each chunk is
+    distance-filtered in one vectorized step. Returns (columns, rows_read).
+    """
+    parts = [_empty_firms_columns()]
+    rows_read = 0
+    try:
+        wanted = {name for candidates in FIRMS_COLUMNS.values() for name in candidates}
+        reader = pd.read_csv(source, chunksize=chunk_rows, on_bad_lines='skip', skipinitialspace=True,
+                             usecols=lambda name: str(name).strip().lower() in wanted)
+        for frame in reader:
+            if rows_read == 0:
+                lowered = {str(name).strip().lower(): name for name in frame.columns}
+                names = {column: next((lowered[c] for c in candidates if c in lowered), None)
+                         for column, candidates in FIRMS_COLUMNS.items()}
+                if names['lat'] is None or names['lon'] is None:
+                    raise ValueError("FIRMS CSV has no latitude/longitude columns")
+            rows_read += len(frame)
+            parts.append(_firms_chunk(frame, names, lat, lon, radius_km))
+    except pd.errors.EmptyDataError:
+        pass
+
+    return {column: np.concatenate([part[column] for part in parts]) for column in parts[0]}, rows_read
+
+def firms_records(fires):
+    """Per-fire dicts (for display and caching) from FIRMS column arrays"""
+    return [
+        {
+            'lat': float(fire_lat),
+            'lon': float(fire_lon),
+            'distance_km': round(float(distance), 1),
+            'brightness': float(brightness),
+            'frp': float(frp),
+            'confidence': str(confidence),
+            'acq_time': str(acq_time),
+        }
+        for fire_lat, fire_lon, distance, brightness, frp, confidence, acq_time in zip(
+            fires['lat'], fires['lon'], fires['distance_km'], fires['brightness'],
+            fires['frp'], fires['confidence'], fires['acq_time'])
+    ]
+
+class FireStore:
+    """Local append-only store of FIRMS fire detections, partitioned by date and tile
+
+    Partitions live at <root>/<layout>/<YYYY-MM-DD>/<sensor>/<tile>.npz and
+    hold the parse_firms_csv columns for one sensor, one day and one
+    FIRE_TILE_DEG tile. A partition file (even an empty one) marks that day
+    as synced, so sync only requests missing days; past days are never
+    rewritten, while today's partition is refetched after
+    FIRE_TODAY_REFRESH_S. A successful request with no detections writes
+    empty partitions, so fire-free tiles are not requested again. The layout
+    directory versions the store: v1 partitions, fetched with a swapped
+    area, are ignored.
+    """
+
+    LAYOUT = 'v2'
+
+    COLUMNS = ('lat', 'lon', 'brightness', 'frp', 'confidence', 'acq_time')
+
+    def __init__(self, root=FIRE_STORE_DIR, sensors=tuple(FIRE_SENSORS)):
+        self.root = root
+        self.sensors = sensors
+
+    @staticmethod
+    def tiles_for(lat, lon, radius_km):
+        """(tile_lat, tile_lon) south-west corners of every tile a radius touches"""
+        radius_deg = radius_km / 111
+        lat_tiles = range(int(np.floor((lat - radius_deg) / FIRE_TILE_DEG)), int(np.floor((lat + radius_deg) / FIRE_TILE_DEG)) + 1)
+        lon_tiles = range(int(np.floor((lon - radius_deg) / FIRE_TILE_DEG)), int(np.floor((lon + radius_deg) / FIRE_TILE_DEG)) + 1)
+        return [(i * FIRE_TILE_DEG, j * FIRE_TILE_DEG) for i in lat_tiles for j in lon_tiles]
+
+    def _path(self, day, sensor, tile):
+        return os.path.join(self.root, self.LAYOUT, str(day), sensor, f"{tile[0]:+03d}{tile[1]:+04d}.npz")
+
+    def _is_synced(self, day, sensor, tile, today):
+        path = self._path(day, sensor, tile)
+        if not os.path.exists(path):
+            return False
+        return day != today or time.time() - os.path.getmtime(path) < FIRE_TODAY_REFRESH_S
+
+    def _write(self, day, sensor, tile, columns):
+        path = self._path(day, sensor, tile)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(staging, 'wb') as handle:
+            np.savez(handle, **{name: columns[name] for name in self.COLUMNS})
+        os.replace(staging, path)
+
+    def sync(self, lat, lon, radius_km=FIRE_RADIUS_KM, days=FIRE_HISTORY_DAYS, fetch=None):
+        """Fetch the missing days for every sensor and tile a query would touch; returns requests made
+
+        Consecutive missing days are fetched together, up to
+        FIRMS_MAX_DAY_RANGE per request, and split into daily partitions.
+        """
+        fetch = fetch or _fetch_firms_range
+        today = datetime.now(timezone.utc).date()
+        dates = [today - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+        requests_made = 0
+        for sensor in self.sensors:
+            for tile in self.tiles_for(lat, lon, radius_km):
+                missing = [day for day in dates if not self._is_synced(day, sensor, tile, today)]
+                runs = []
+                for day in missing:
+                    if runs and (day - runs[-1][-1]).days == 1 and len(runs[-1]) < FIRMS_MAX_DAY_RANGE:
+                        runs[-1].append(day)
+                    else:
+                        runs.append([day])
+
+                for run in runs:
+                    columns = fetch(sensor, tile, run[0], len(run))
+                    requests_made += 1
+                    acq_days = columns['acq_time'].astype('datetime64[D]')
+                    in_tile = ((columns['lat'] >= tile[0]) & (columns['lat'] < tile[0] + FIRE_TILE_DEG)
+                               & (columns['lon'] >= tile[1]) & (columns['lon'] < tile[1] + FIRE_TILE_DEG))
+                    for day in run:
+                        selected = in_tile & (acq_days == np.datetime64(day))
+                        self._write(day, sensor, tile, {name: columns[name][selected] for name in self.COLUMNS})
+        return requests_made
+
+    def query(self, lat, lon, radius_km=FIRE_RADIUS_KM, days=FIRE_HISTORY_DAYS, sensors=None):
+        """Fires within radius_km of (lat, lon) over the last days, from local partitions only
+
+        Returns parse_firms_csv-style columns plus a 'sensor' column.
+        """
+        today = datetime.now(timezone.utc).date()
+        parts = []
+        for offset in range(days):
+            day = today - timedelta(days=offset)
+            for sensor in sensors or self.sensors:
+                for tile in self.tiles_for(lat, lon, radius_km):
+                    path = self._path(day, sensor, tile)
+                    if not os.path.exists(path):
+                        continue
+                    with np.load(path, allow_pickle=False) as partition:
+                        columns = {name: partition[name] for name in self.COLUMNS}
+                    columns['distance_km'] = np.hypot(columns['lat'] - lat, columns['lon'] - lon) * 111
+                    near = columns['distance_km'] <= radius_km
+                    part = {name: values[near] for name, values in columns.items()}
+                    part['sensor'] = np.full(int(near.sum()), FIRE_SENSORS.get(sensor, sensor), dtype='U16')
+                    parts.append(part)
+
+        if not parts:
+            empty = _empty_firms_columns()
+            empty['sensor'] = np.empty(0, dtype='U16')
+            return empty
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def _fetch_firms_range(sensor, tile, start_day, day_range):
+    """Fetch every detection of one sensor in one tile for day_range days from start_day; raises on failure"""
+    base_url = "https://firms.modaps.eosdis.nasa.gov/api/area/csv"
+    params = {
+        'source': sensor,
+        'area': f"{tile[1]},{tile[0]},{tile[1] + FIRE_TILE_DEG},{tile[0] + FIRE_TILE_DEG}",  # west,south,east,north
+        'dayRange': day_range,
+        'date': start_day.strftime('%Y-%m-%d')
+    }
+    response = get_provider_client().get('nasa_firms', base_url, params=params, stream=True)
+    try:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        columns, _ = parse_firms_csv(response.raw)
+    finally:
+        response.close()
+    return columns
+
+
+_FIRE_STORE = None
+
+
+def get_fire_store():
+    """Process-wide FireStore"""
+    global _FIRE_STORE
+    if _FIRE_STORE is None:
+        _FIRE_STORE = FireStore()
+    return _FIRE_STORE
+
+def _fire_sync_key(lat, lon, radius_km, days):
+    return f"fire-sync|{FireStore.tiles_for(lat, lon, radius_km)}|{days}"
+
+def sync_fire_history(lat, lon, radius_km=FIRE_RADIUS_KM, days=FIRE_HISTORY_DAYS):
+    """Sync the fire store for (lat, lon), joining an identical sync already running; returns requests made"""
+    return get_provider_cache().coalesce(
+        _fire_sync_key(lat, lon, radius_km, days),
+        lambda: get_fire_store().sync(lat, lon, radius_km, days)
+    )
+
+def get_fire_history(lat, lon, radius_km=FIRE_RADIUS_KM, days=FIRE_HISTORY_DAYS):
+    """Fires within radius_km over the last days from the local store
+
+    Missing days are synced on a background thread (the prefetcher keeps
+    catalogue cities synced), so this never waits on FIRMS; the result's
+    'syncing' flag says whether a sync is still running.
+    """
+    cache = get_provider_cache()
+    key = _fire_sync_key(lat, lon, radius_km, days)
+    try:
+        if get_provider_client().is_available('nasa_firms'):
+            cache.run_in_background(key, lambda: get_fire_store().sync(lat, lon, radius_km, days))
+    except Exception as e:
+        st.warning(f"NASA FIRMS history sync error, showing stored detections: {e}")
+    fires = get_fire_store().query(lat, lon, radius_km, days)
+    fires['syncing'] = cache.is_running_in_background(key)
+    return fires
+
+def _linear_weights(positions, n):
+    """(len(positions), n) linear interpolation weights for fractional indices into n samples"""
+    weights = np.zeros((len(positions), n))
+    if n == 1:
+        weights[:, 0] = 1
+        return weights
+    lower = np.clip(np.floor(positions).astype(int), 0, n - 2)
+    fraction = np.clip(positions - lower, 0, 1)
+    index = np.arange(len(positions))
+    weights[index, lower] = 1 - fraction
+    weights[index, lower + 1] = fraction
+    return weights
+
+def satellite_aod_surface(grid, nasa_modis_data, tree_locations=(), store=None):
+    """Current and post-planting AOD and PM2.5 on every cell of grid
+
+    The stored 1 degree window mean around the grid is bilinearly
+    interpolated to cell centres, with cells the store has no retrieval
+    for taking the city-wide aod_value. Post-planting AOD is reduced by up
+    to TREE_AOD_REDUCTION under each tree's canopy kernel. Returns a dict
+    of grid.shape arrays: aod, pm25, predicted_aod and predicted_pm25.
+    """
+    baseline = nasa_modis_data['aod_value']
+    aod = np.full(grid.shape, baseline, dtype=float)
+
+    if grid.center_lat is not None and grid.center_lon is not None:
+        steps = (np.arange(grid.size) - grid.center_cell[0]) * grid.cell_size_m / METERS_PER_DEGREE
+        cell_lats = grid.center_lat + steps
+        cell_lons = grid.center_lon + steps / np.cos(np.radians(grid.center_lat))
+
+        # Fractional 1 degree indices, measured between cell centres
+        y = np.clip(cell_lats + 90 - 0.5, 0, AOD_GRID_SHAPE[0] - 1)
+        x = cell_lons + 180 - 0.5
+        row0, col0 = int(np.floor(y.min())), int(np.floor(x.min()))
+        rows = np.arange(row0, min(int(np.floor(y.max())) + 2, AOD_GRID_SHAPE[0]))
+        cols = np.arange(col0, int(np.floor(x.max())) + 2)
+
+        patch = (store or get_aod_store()).window_mean(rows, cols % AOD_GRID_SHAPE[1])
+        patch = np.where(np.isfinite(patch), patch, baseline)
+        aod = _linear_weights(y - row0, len(rows)) @ patch @ _linear_weights(x - col0, len(cols)).T
+
+    coverage = np.zeros(grid.shape)
+    rows, cols, inside = grid.locate(list(tree_locations))
+    if inside.any():
+        radius = grid.canopy_radius
+        kernel_i, kernel_j = np.nonzero(grid.canopy_kernel)
+        cell_i = rows[inside][:, None] + (kernel_i - radius)[None, :]
+        cell_j = cols[inside][:, None] + (kernel_j - radius)[None, :]
+        on_grid = (cell_i >= 0) & (cell_i < grid.size) & (cell_j >= 0) & (cell_j < grid.size)
+        weights = np.broadcast_to(grid.canopy_kernel[kernel_i, kernel_j], cell_i.shape)
+        np.maximum.at(coverage, (cell_i[on_grid], cell_j[on_grid]), weights[on_grid])
+
+    predicted = aod * (1 - TREE_AOD_REDUCTION * coverage)
+    return {
+        'aod': aod,
+        'pm25': aod * AOD_TO_PM25,
+        'predicted_aod': predicted,
+        'predicted_pm25': predicted * AOD_TO_PM25,
+    }
+
+def validate_recommendations_with_satellite_data(tree_locations, nasa_modis_data, nasa_fire_data, grid=None):
+    """Correlate tree placement with actual NASA satellite measurements
+
+    The AOD surface is computed once on grid (by default a
+    SATELLITE_GRID_EXTENT_M grid around the trees) and every site is
+    validated by indexing it, so 'validated_areas' holds column arrays.
+    """
     
     if not nasa_modis_data:
         return {
@@ -1419,35 +4599,41 @@ def validate_recommendations_with_satellite_data(tree_locations, nasa_modis_data
             "confidence": "Medium"
         }
     
-    # Calculate actual correlation with satellite data
-    high_pollution_areas = []
     current_aod = nasa_modis_data['aod_value']
-    
-    for location in tree_locations:
-        # Trees reduce AOD by approximately 12-18% in urban areas
-        estimated_aod_reduction = current_aod * 0.15
-        predicted_aod_after = current_aod - estimated_aod_reduction
-        predicted_pm25_after = predicted_aod_after * 85
-        
-        high_pollution_areas.append({
-            'lat': location['lat'],
-            'lon': location['lon'],
-            'current_aod': current_aod,
-            'predicted_aod_after_trees': predicted_aod_after,
-            'predicted_pm25_after': predicted_pm25_after,
-            'satellite_validated': True,
-            'improvement_percent': (estimated_aod_reduction / current_aod) * 100
-        })
+    if grid is None:
+        lats = [location['lat'] for location in tree_locations if 'lat' in location]
+        lons = [location['lon'] for location in tree_locations if 'lon' in location]
+        grid = DispersionGrid(np.mean(lats) if lats else None, np.mean(lons) if lons else None,
+                              extent_m=SATELLITE_GRID_EXTENT_M, cell_size_m=SATELLITE_GRID_CELL_M)
+    surface = satellite_aod_surface(grid, nasa_modis_data, tree_locations)
+    
+    rows, cols, inside = grid.locate(tree_locations)
+    rows, cols = np.clip(rows, 0, grid.size - 1), np.clip(cols, 0, grid.size - 1)
+    site_aod = surface['aod'][rows, cols]
+    # Trees off the grid have no stamped canopy, so apply the site reduction directly
+    site_after = np.where(inside, surface['predicted_aod'][rows, cols], site_aod * (1 - TREE_AOD_REDUCTION))
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        improvement = np.where(site_aod > 0, (site_aod - site_after) / site_aod * 100, 0.0)
+    validated_areas = {
+        'lat': np.array([location.get('lat', np.nan) for location in tree_locations], dtype=float),
+        'lon': np.array([location.get('lon', np.nan) for location in tree_locations], dtype=float),
+        'current_aod': site_aod,
+        'predicted_aod_after_trees': site_after,
+        'predicted_pm25_after': site_after * AOD_TO_PM25,
+        'improvement_percent': improvement,
+    }
     
     return {
         'validation_method': 'NASA MODIS AOD Correlation Analysis',
-        'validated_locations': len(high_pollution_areas),
+        'validated_locations': len(tree_locations),
         'baseline_aod': current_aod,
         'baseline_pm25': nasa_modis_data['estimated_pm25'],
-        'predicted_aod_improvement': current_aod * 0.15,
-        'predicted_pm25_improvement': nasa_modis_data['estimated_pm25'] * 0.15,
+        'predicted_aod_improvement': current_aod * TREE_AOD_REDUCTION,
+        'predicted_pm25_improvement': nasa_modis_data['estimated_pm25'] * TREE_AOD_REDUCTION,
         'confidence': 'High - NASA Satellite Validated',
-        'validated_areas': high_pollution_areas
+        'validated_areas': validated_areas,
+        'aod_surface': surface
     }
 def generate_ai_insights(city_data, pollution_data, weather_data):
     """Generate AI insights based on environmental data"""
@@ -1590,7 +4776,22 @@ def create_ai_insights_panel(city_data, pollution_data, weather_data):
 
 # UI + Analysis flow (main app)
 
+def configure_page():
+    """Page config and global styles
+
+    Called from main() rather than at import, so processes that import this
+    module without running the page (Monte Carlo workers) draw nothing.
+    """
+    st.set_page_config(
+        page_title="CivAI",
+        page_icon="🌍",
+        layout="wide"
+    )
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
+
 def main():
+    configure_page()
+    start_city_prefetcher()
     show_data_sources()
     st.markdown("""
     <div style="
@@ -1730,13 +4931,8 @@ def main():
         </div>
         """, unsafe_allow_html=True)
         
-        popular_cities = [
-            "New York", "London", "Tokyo", "Delhi", "Mumbai", "Beijing", 
-            "São Paulo", "Los Angeles", "Paris", "Sydney", "Dubai", "Singapore"
-        ]
-        
         cols = st.columns(4)
-        for i, city_name in enumerate(popular_cities):
+        for i, city_name in enumerate(POPULAR_CITIES):
             with cols[i % 4]:
                 if st.button(f" {city_name}", key=f"popular_{i}", use_container_width=True):
                     city_data = GLOBAL_CITIES[city_name]
@@ -1792,41 +4988,85 @@ def run_analysis(selected_city):
         progress_bar = st.progress(0)
         status_text = st.empty()
 
-        status_text.markdown("🌤️ **Getting current weather conditions...**")
-        progress_bar.progress(15)
-        time.sleep(0.6)
-        weather_data = get_weather_data(lat, lon)
-
-        status_text.markdown("🛰️ **Analyzing NASA satellite pollution data...**")
-        progress_bar.progress(35)
-        time.sleep(0.6)
-        pollution_data = get_pollution_data(lat, lon, pollution_base, 30)
+        weather_data, pollution_data, hotspots, tree_recommendations = acquire_city_data(
+            lat, lon, pollution_base, progress_bar, status_text
+        )
         current_aqi = int(pollution_data['aqi'].iloc[-1])
         current_pm25 = float(pollution_data['pm25'].iloc[-1])
 
-        status_text.markdown("🔍 **AI detecting pollution hotspots on land...**")
-        progress_bar.progress(55)
-        time.sleep(0.6)
-        hotspots = get_real_sensor_hotspots(lat, lon, 25)  # 25km radius
-
-        status_text.markdown("🌳 **Generating climate-smart tree recommendations...**")
-        progress_bar.progress(75)
-        time.sleep(0.6)
-        tree_recommendations = generate_tree_recommendations(lat, lon, hotspots)
-
-        status_text.markdown("📊 **Calculating environmental impact projections...**")
-        progress_bar.progress(95)
-        time.sleep(0.6)
-
         status_text.markdown("✨ **Analysis complete! Generating 3D visualizations...**")
         progress_bar.progress(100)
-        time.sleep(0.4)
         
         progress_bar.empty()
         status_text.empty()
 
     display_results(city_name, lat, lon, weather_data, pollution_data, hotspots, tree_recommendations, current_aqi, current_pm25)
 
+def _attach_script_run_ctx(ctx):
+    """Thread-pool initializer so provider st.* messages from workers reach the page"""
+    if ctx is not None:
+        add_script_run_ctx(threading.current_thread(), ctx)
+
+def acquire_city_data(lat, lon, pollution_base, progress_bar, status_text):
+    """Fetch every data source concurrently, driving the progress bar from completions
+
+    Tree placement starts as soon as hotspots arrive; satellite validation
+    is applied once the MODIS and VIIRS results are in. Returns
+    (weather_data, pollution_data, hotspots, tree_recommendations).
+    """
+    steps = {
+        'weather': "🌤️ **Current weather conditions received**",
+        'pollution': "🛰️ **Air quality history received**",
+        'hotspots': "🔍 **Pollution hotspots detected**",
+        'modis': "🛰️ **NASA MODIS aerosol data received**",
+        'viirs': "🔥 **NASA VIIRS fire data received**",
+        'trees': "🌳 **Climate-smart tree sites generated**",
+    }
+    results = {}
+    tree_recommendations = None
+    status_text.markdown("📡 **Fetching weather, air quality, sensors and satellite data...**")
+    progress_bar.progress(5)
+
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=len(steps), initializer=_attach_script_run_ctx,
+                            initargs=(ctx,)) as pool:
+        pending = {
+            pool.submit(get_weather_data, lat, lon): 'weather',
+            pool.submit(get_pollution_data, lat, lon, pollution_base, 30): 'pollution',
+            pool.submit(get_real_sensor_hotspots, lat, lon, 25): 'hotspots',  # 25km radius
+            pool.submit(get_real_nasa_modis_data, lat, lon): 'modis',
+            pool.submit(get_nasa_viirs_fire_data, lat, lon): 'viirs',
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                results[name] = future.result()
+                status_text.markdown(steps[name])
+                progress_bar.progress(5 + int(85 * len(results) / len(steps)))
+
+                if name == 'hotspots':
+                    # Reuse this session's recommendations for the same city and hotspots so
+                    # reruns (e.g. moving the simulator slider) keep the same tree sites
+                    hotspots = results['hotspots']
+                    tree_key = (lat, lon, tuple((h['lat'], h['lon'], h['intensity']) for h in hotspots))
+                    cached_trees = st.session_state.get('tree_recommendations')
+                    if cached_trees is not None and cached_trees[0] == tree_key:
+                        tree_recommendations = results['trees'] = cached_trees[1]
+                        status_text.markdown(steps['trees'])
+                        progress_bar.progress(5 + int(85 * len(results) / len(steps)))
+                    else:
+                        pending[pool.submit(place_tree_recommendations, lat, lon, hotspots)] = 'trees'
+
+    if tree_recommendations is None:
+        status_text.markdown("📊 **Validating tree sites against satellite data...**")
+        grid = DispersionGrid(lat, lon, extent_m=SATELLITE_GRID_EXTENT_M, cell_size_m=SATELLITE_GRID_CELL_M)
+        tree_recommendations = apply_satellite_validation(results['trees'], results['modis'], results['viirs'], grid)
+        st.session_state['tree_recommendations'] = (tree_key, tree_recommendations)
+    progress_bar.progress(95)
+
+    return results['weather'], results['pollution'], results['hotspots'], tree_recommendations
+
 def display_results(city_name, lat, lon, weather_data, pollution_data, hotspots, tree_recommendations, current_aqi, current_pm25):
     """Display comprehensive results with 3D styling"""
 
@@ -1932,7 +5172,7 @@ def display_results(city_name, lat, lon, weather_data, pollution_data, hotspots,
     
     with tab2:
         st.markdown('<div class="tab-content">', unsafe_allow_html=True)
-        show_pollution_analysis(pollution_data, hotspots)
+        show_pollution_analysis(pollution_data, hotspots, city_name, lat, lon)
         st.markdown('</div>', unsafe_allow_html=True)
     
     with tab3:
@@ -1947,7 +5187,7 @@ def display_results(city_name, lat, lon, weather_data, pollution_data, hotspots,
     
     with tab5:
         st.markdown('<div class="tab-content">', unsafe_allow_html=True)
-        create_scenario_simulator(hotspots, tree_recommendations, weather_data)
+        create_scenario_simulator(hotspots, tree_recommendations, weather_data, lat, lon, pollution_data)
         st.markdown('</div>', unsafe_allow_html=True)
     
     with tab6:
@@ -2111,8 +5351,8 @@ def show_interactive_map(lat, lon, hotspots, tree_recommendations, weather_data,
         </div>
     </div>
     """, unsafe_allow_html=True)
-def show_pollution_analysis(pollution_data, hotspots):
-    """Show pollution analysis with 3D charts"""
+def show_pollution_analysis(pollution_data, hotspots, city_name=None, lat=None, lon=None):
+    """Show pollution analysis with 3D charts, using measured station history when it is stored"""
     
     st.markdown("""
     <h2 style="color: white; text-align: center; margin-bottom: 2rem;">
@@ -2120,6 +5360,22 @@ def show_pollution_analysis(pollution_data, hotspots):
     </h2>
     """, unsafe_allow_html=True)
     
+    trend_title = '30-Day Air Quality Trends'
+    if city_name is not None and PYARROW_AVAILABLE:
+        period_days = st.radio("History period", [30, 90, 365, 1825], horizontal=True,
+                               format_func=lambda d: f"{d} days" if d < 365 else f"{d // 365} year{'s' if d > 365 else ''}")
+        with st.spinner("Loading measured air quality history..."):
+            history = get_pollution_history(city_name, lat, lon, period_days)
+        if history is not None:
+            st.caption(f"Measured hourly history from {history.attrs.get('stations', 0)} OpenAQ/PurpleAir "
+                       f"stations, averaged per day ({len(history)} days with data)")
+            pollution_data = history
+            trend_title = f"{period_days}-Day Measured Air Quality Trends"
+        elif get_provider_cache().is_running_in_background(_history_sync_key(city_name)):
+            st.caption("Measured history for this city is being fetched; showing estimated trends until it is stored")
+        else:
+            st.caption("No measured history stored for this city yet; showing estimated trends")
+    
     # 30-day trend chart
     fig = go.Figure()
     
@@ -2148,7 +5404,7 @@ def show_pollution_analysis(pollution_data, hotspots):
     
     fig.update_layout(
         title={
-            'text': '30-Day Air Quality Trends',
+            'text': trend_title,
             'x': 0.5,
             'xanchor': 'center',
             'font': {'size': 24, 'color': 'white', 'family': 'Orbitron'}
@@ -2900,7 +6156,13 @@ def show_realtime_integration(lat, lon):
         - **Nearest Fire**: {fire_data.get('nearest_fire_km', 'None detected')} km
         - **Quality**: {fire_data['quality']}
         """)
+        if fire_data.get('fires'):
+            nearest_fires = pd.DataFrame(fire_data['fires']).sort_values('distance_km').head(10)
+            st.dataframe(nearest_fires[['distance_km', 'frp', 'brightness', 'confidence', 'acq_time']],
+                         use_container_width=True, hide_index=True)
     
+    show_fire_history(lat, lon)
+
     st.markdown("---")
     st.markdown("### 📊 NASA Data Integration Status")
     
@@ -2915,6 +6177,68 @@ def show_realtime_integration(lat, lon):
     st.info("**Data Freshness**: Updated every 30 minutes")
     st.info("**Coverage**: Global satellite monitoring")
 
+    show_provider_health()
+
+def show_fire_history(lat, lon):
+    """Fires within FIRE_RADIUS_KM over the last FIRE_HISTORY_DAYS, answered from the local fire store"""
+    st.markdown(f"### 🔥 {FIRE_HISTORY_DAYS}-Day Fire History (within {FIRE_RADIUS_KM} km)")
+
+    fires = get_fire_history(lat, lon)
+    if fires['syncing']:
+        st.caption("Fetching missing days from NASA FIRMS in the background; reload to see them")
+    if len(fires['lat']) == 0:
+        st.info("No fire detections stored for this area in the selected period")
+        return
+
+    history = pd.DataFrame({
+        'day': fires['acq_time'].astype('datetime64[D]'),
+        'sensor': fires['sensor'],
+        'frp': fires['frp'],
+    })
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        st.metric("Fire detections", f"{len(history):,}")
+        st.metric("Total fire radiative power", f"{np.nansum(history['frp']):,.0f} MW")
+    with col2:
+        daily = history.groupby(['day', 'sensor']).size().reset_index(name='detections')
+        fig = px.bar(daily, x='day', y='detections', color='sensor',
+                     labels={'day': 'Date', 'detections': 'Detections', 'sensor': 'Sensor'})
+        fig.update_layout(
+            height=300,
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)',
+            font=dict(color='white')
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+def show_provider_health():
+    """Live status of every data provider's connection and circuit breaker"""
+    st.markdown("### 🔌 Data Provider Health")
+
+    icons = {'healthy': '🟢', 'degraded': '🟡', 'down': '🔴'}
+    rows = []
+    for provider, state in get_provider_client().health().items():
+        rows.append({
+            'Provider': provider,
+            'Status': f"{icons[state['status']]} {state['status'].title()}",
+            'Consecutive failures': state['consecutive_failures'],
+            'Last success': datetime.fromtimestamp(state['last_success']).strftime('%H:%M:%S')
+                            if state['last_success'] else '—',
+            'Last error': state['last_error'] or '—',
+        })
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+    cache = get_provider_cache()
+    stats = cache.stats
+    st.caption(f"Provider cache ({type(cache.backend).__name__}): {stats['fresh']} fresh, {stats['stale']} stale "
+               f"and {stats['miss']} missed lookups; {cache.coalesced} requests coalesced")
+
+    if _CITY_PREFETCHER is not None:
+        status = _CITY_PREFETCHER.status
+        last_cycle = datetime.fromtimestamp(status['last_cycle']).strftime('%H:%M:%S') if status['last_cycle'] else 'in progress'
+        st.caption(f"Catalogue prefetch: {len(_CITY_PREFETCHER.cities)} cities, {status['cycles']} cycles "
+                   f"(last {last_cycle}), {status['requests']} upstream requests, {status['failures']} failures")
+
 def show_footer():
     st.markdown("""
     <div style="margin-top: 4rem; padding: 3rem; background: #000; border-radius: 20px; text-align: center; color: white;">
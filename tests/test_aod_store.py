@@ -0,0 +1,101 @@
+"""Local AOD grid store, seeded from sample files as an offline deployment would be"""
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+TODAY = datetime.now(timezone.utc).date()
+
+
+def day(offset):
+    return TODAY - timedelta(days=offset)
+
+
+@pytest.fixture
+def samples(tmp_path):
+    """A seed directory with one sample of each supported format"""
+    seed_dir = tmp_path / "seed"
+    seed_dir.mkdir()
+    grid = np.full(app.AOD_GRID_SHAPE, np.nan, dtype=np.float32)
+    grid[118, 257] = 0.6   # 28.x N, 77.x E
+    grid[119, 257] = -9999  # fill value
+    np.save(seed_dir / f"MOD08_D3.{day(0)}.npy", grid)
+    other = np.full(app.AOD_GRID_SHAPE, np.nan, dtype=np.float32)
+    other[118, 257] = 0.2
+    np.savez(seed_dir / f"{day(1)}.npz", aod=other)
+    pd.DataFrame({'date': [str(day(2))] * 3 + [str(day(3))], 'lat': [28.6, 28.9, 40.0, 28.1],
+                  'lon': [77.2, 77.5, 10.0, 77.9], 'aod': [0.3, 0.5, 0.9, 0.7]}).to_csv(seed_dir / "points.csv", index=False)
+    pd.DataFrame({'LAT': [28.5], ' Lon': [77.0], 'AOD': [1.1]}).to_csv(seed_dir / f"aod_{day(4)}.csv", index=False)
+    (seed_dir / "README.txt").write_text("not a grid")
+    return str(seed_dir)
+
+
+def test_seeded_store_answers_box_means_offline(tmp_path, samples):
+    store = app.AodStore(root=str(tmp_path / "store"))
+    assert sorted(store.seed(samples)) == [day(4), day(3), day(2), day(1), day(0)]
+
+    grid = store.grid(day(0))
+    assert isinstance(grid, np.memmap) and grid.dtype == np.float32
+    assert grid[118, 257] == pytest.approx(0.6) and np.isnan(grid[119, 257])
+
+    mean_aod, points, latest = store.box_mean(28.6, 77.2, half_deg=0.5, days=7)
+    values = [0.6, 0.2, (0.3 + 0.5) / 2, 0.7, 1.1]
+    assert points == len(values) and latest == day(0)
+    assert mean_aod == pytest.approx(np.mean(values), rel=1e-6)
+
+    patch = store.window_mean(np.array([118, 119]), np.array([257]), days=7)
+    assert patch[0, 0] == pytest.approx(np.mean(values), rel=1e-6) and np.isnan(patch[1, 0])
+    assert store.box_mean(-60.0, 0.0, days=7) is None
+
+
+def test_seed_from_a_single_file_and_bad_grids(tmp_path, samples):
+    store = app.AodStore(root=str(tmp_path / "store"))
+    assert store.seed(os.path.join(samples, f"{day(1)}.npz")) == [day(1)]
+    with pytest.raises(ValueError, match="shape"):
+        store.put(day(0), np.zeros((90, 180)))
+
+
+def test_sync_fetches_only_missing_days(tmp_path, samples):
+    store = app.AodStore(root=str(tmp_path / "store"))
+    store.seed(samples)
+    fetched = []
+
+    def fetch(requested_day):
+        fetched.append(requested_day)
+        return None  # no retrieval that day
+
+    assert store.sync(fetch, days=7) == 2
+    assert sorted(fetched) == [day(6), day(5)]
+    assert np.isnan(store.grid(day(6))).all()
+    assert store.sync(fetch, days=7) == 0
+
+
+def test_recent_days_are_refetched_and_reopened(tmp_path, samples):
+    store = app.AodStore(root=str(tmp_path / "store"))
+    store.seed(samples)
+    assert store.grid(day(0))[118, 257] == pytest.approx(0.6)
+
+    stale = datetime.now().timestamp() - app.AOD_RECENT_REFRESH_S - 1
+    for offset in (0, app.AOD_RECENT_DAYS):
+        path = store._path(day(offset))
+        os.utime(path, (stale, stale))
+    assert store.missing_days(days=5) == [day(0)]
+
+    store.sync(lambda requested_day: np.full(app.AOD_GRID_SHAPE, 0.4, dtype=np.float32), days=5)
+    assert store.grid(day(0))[118, 257] == pytest.approx(0.4)
+
+
+def test_app_reads_a_seeded_store_without_credentials(tmp_path, samples, monkeypatch):
+    monkeypatch.setattr(app.AodStore.__init__, '__defaults__', (str(tmp_path / "store"),))
+    monkeypatch.setattr(app, 'AOD_SEED_DIR', samples)
+    monkeypatch.setattr(app, '_AOD_STORE', None)
+    monkeypatch.setattr(app, 'nasa_credentials', lambda: (None, None))
+
+    result = app.get_real_nasa_modis_data(28.6, 77.2)
+    assert result['source'] == 'NASA MODIS Terra/Aqua (MOD08_D3)'
+    assert result['data_points'] == 5 and result['aod_value'] == pytest.approx(0.6, abs=1e-4)
@@ -0,0 +1,64 @@
+"""calculate_aqi against the original per-value AQI functions"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+def old_calculate_aqi(pm25):
+    """The scalar PM2.5 mapping calculate_aqi used before it was vectorized"""
+    if pm25 <= 12:
+        return int(pm25 * 4.17)
+    elif pm25 <= 35.4:
+        return int(50 + (pm25 - 12) * 2.13)
+    elif pm25 <= 55.4:
+        return int(100 + (pm25 - 35.4) * 2.5)
+    elif pm25 <= 150.4:
+        return int(150 + (pm25 - 55.4) * 0.53)
+    else:
+        return min(300, int(200 + (pm25 - 150.4) * 1.05))
+
+
+def legacy_samples():
+    boundaries = np.array([0, 12, 35.4, 55.4, 150.4, 245.6])
+    near = (boundaries[:, None] + np.array([-1e-9, 0, 1e-9, 0.05])[None, :]).ravel()
+    rng = np.random.default_rng(3)
+    return np.concatenate([near[near >= 0], np.round(rng.uniform(0, 600, 2000), 1), rng.uniform(0, 600, 2000)])
+
+
+def test_legacy_aqi_matches_old_scalar_function():
+    samples = legacy_samples()
+    expected = np.array([old_calculate_aqi(value) for value in samples])
+
+    np.testing.assert_array_equal(app.calculate_aqi(samples, mode='legacy'), expected)
+    for value, aqi in zip(samples[:200], expected[:200]):
+        result = app.calculate_aqi(float(value), mode='legacy')
+        assert isinstance(result, int) and result == aqi
+
+
+def test_legacy_aqi_keeps_pandas_shape_and_missing_values():
+    series = pd.Series([5.0, np.nan, 80.0], index=['a', 'b', 'c'], name='pm25')
+    result = app.calculate_aqi(series, mode='legacy')
+
+    assert list(result.index) == ['a', 'b', 'c'] and result.name == 'pm25'
+    assert result['a'] == old_calculate_aqi(5.0) and result['c'] == old_calculate_aqi(80.0)
+    assert np.isnan(result['b'])
+
+
+@pytest.mark.parametrize('pollutant', list(app.AQI_BREAKPOINTS))
+def test_epa_aqi_hits_every_breakpoint(pollutant):
+    _, table = app.AQI_BREAKPOINTS[pollutant]
+    for c_low, c_high, i_low, i_high in table:
+        assert app.calculate_aqi(c_low, pollutant, mode='epa') == i_low
+        assert app.calculate_aqi(c_high, pollutant, mode='epa') == i_high
+
+
+def test_epa_aqi_is_undefined_below_the_first_one_hour_ozone_breakpoint():
+    assert np.isnan(app.calculate_aqi(0.05, 'o3_1h'))
+    assert app.calculate_aqi(-1.0, 'pm25', mode='epa') == 0
+
+
+def test_epa_aqi_is_capped_at_500():
+    assert app.calculate_aqi(700.0, 'pm25', mode='epa') == 500
+    assert app.calculate_aqi(5000, 'no2') == 500
@@ -0,0 +1,125 @@
+"""Cache backends: one interface over memory, SQLite and Redis, with pickle-free storage"""
+import os
+import pickle
+import time
+
+import numpy as np
+import pytest
+
+import app
+
+
+class FakeRedis:
+    """Local stand-in for a Redis client: bytes values with optional expiry"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at < time.time():
+            del self.data[key]
+            return None
+        return value
+
+    def set(self, key, value, ex=None):
+        assert isinstance(value, bytes)
+        self.data[key] = (value, time.time() + ex if ex else None)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return app.MemoryCacheBackend()
+    if request.param == 'sqlite':
+        return app.SQLiteCacheBackend(path=str(tmp_path / "cache.sqlite"))
+    return app.RedisCacheBackend(FakeRedis())
+
+
+def test_backends_share_one_interface(backend):
+    value = {'aqi': 152, 'stations': [(28.6, 77.2, 61.5, 'ITO')], 'grid': np.arange(6.0).reshape(2, 3)}
+    now = time.time()
+    backend.set('k', value, now, ttl_s=60)
+
+    stored, stored_at = backend.get('k')
+    assert stored_at == now
+    assert stored['aqi'] == 152 and stored['stations'] == [(28.6, 77.2, 61.5, 'ITO')]
+    np.testing.assert_array_equal(stored['grid'], value['grid'])
+    assert backend.get('missing') is None
+
+    backend.delete('k')
+    assert backend.get('k') is None
+    backend.set('old', 1, time.time() - 120, ttl_s=60)
+    assert backend.get('old') is None
+
+
+def test_encoding_round_trips_arrays_tuples_and_numpy_scalars():
+    value = {'keys': np.array([[0, 1], [2, 3]], dtype=np.int64), 'stack': np.ones((2, 4, 4), np.float32),
+             'pair': (3, [np.float64(0.5), np.int32(7)]), 'name': "Delhi\nNCR", 'none': None}
+    decoded = app.decode_cache_value(app.encode_cache_value(value))
+
+    assert decoded['pair'] == (3, [0.5, 7]) and type(decoded['pair'][1][1]) is int
+    assert decoded['name'] == "Delhi\nNCR" and decoded['none'] is None
+    assert decoded['keys'].dtype == np.int64 and decoded['stack'].dtype == np.float32
+    np.testing.assert_array_equal(decoded['stack'], value['stack'])
+
+    with pytest.raises(ValueError):
+        app.encode_cache_value({'objects': np.array([{}, []], dtype=object)})
+
+
+class Exploit:
+    def __reduce__(self):
+        return (os.system, ("echo pwned",))
+
+
+def test_pickled_entries_are_never_loaded(tmp_path):
+    client = FakeRedis()
+    client.data['civai:k'] = (pickle.dumps((Exploit(), 0.0)), None)
+    assert app.RedisCacheBackend(client).get('k') is None
+    assert 'civai:k' not in client.data
+
+    sqlite = app.SQLiteCacheBackend(path=str(tmp_path / "cache.sqlite"))
+    sqlite._connect().execute("INSERT INTO cache VALUES ('k', ?, 0, NULL, 0)", (pickle.dumps(Exploit()),))
+    assert sqlite.get('k') is None
+
+
+def test_sqlite_entries_are_shared_and_capped(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    writer = app.SQLiteCacheBackend(path=path, max_entries=3)
+    for index in range(5):
+        writer.set(f"k{index}", {'index': index}, time.time())
+
+    reader = app.SQLiteCacheBackend(path=path)  # another process on the node
+    assert [reader.get(f"k{index}") is not None for index in range(5)] == [False, False, True, True, True]
+    assert reader.get('k4')[0] == {'index': 4}
+
+
+def test_scenario_results_round_trip_through_a_shared_backend():
+    lat, lon = 28.61, 77.21
+    grid = app.DispersionGrid(lat, lon)
+    baseline = {'sources': [{'lat': lat, 'lon': lon + 0.01, 'intensity': 0.8}]}
+    intervention = {'trees': [{'lat': lat + 0.005 * i, 'lon': lon, 'effectiveness': 0.6} for i in range(5)]}
+    weather = {'wind_direction': 120, 'wind_speed': 8}
+
+    cache = app.ScenarioBackendCache(app.RedisCacheBackend(FakeRedis()))
+    computed = app.AIClimateEngine(grid=grid, disk_cache=cache).run_scenario_analysis(baseline, intervention, weather)
+    cached = app.AIClimateEngine(grid=grid, disk_cache=cache).run_scenario_analysis(baseline, intervention, weather)
+
+    assert cached['pollution_reduction_percent'] == computed['pollution_reduction_percent']
+    for name in app.ScenarioBackendCache.LAYERS:
+        np.testing.assert_array_equal(cached[name].to_dense(), computed[name].to_dense())
+
+
+def test_memory_is_the_default_backend(monkeypatch):
+    monkeypatch.delenv('CIVAI_CACHE_BACKEND', raising=False)
+    import importlib.util
+    spec = importlib.util.spec_from_file_location('app_defaults', app.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    assert module.CACHE_BACKEND == 'memory'
+    assert isinstance(module.make_cache_backend(), module.MemoryCacheBackend)
+    assert isinstance(module.get_scenario_cache(), module.ScenarioDiskCache)
@@ -0,0 +1,51 @@
+"""Incremental canopy updates against a full canopy rebuild"""
+import numpy as np
+import pytest
+
+import app
+
+
+def random_trees(rng, n, center_lat, center_lon, spread_deg=0.03):
+    return [
+        {'lat': center_lat + rng.uniform(-spread_deg, spread_deg),
+         'lon': center_lon + rng.uniform(-spread_deg, spread_deg),
+         'effectiveness': rng.uniform(0.2, 0.95)}
+        for _ in range(n)
+    ]
+
+
+@pytest.mark.parametrize('tree_count', [3, 200])  # the stamping and the batched convolution paths
+def test_incremental_canopy_matches_full_model(tree_count):
+    rng = np.random.default_rng(7)
+    lat, lon = 23.81, 90.41
+    engine = app.AIClimateEngine(grid=app.DispersionGrid(lat, lon))
+    trees = random_trees(rng, tree_count, lat, lon)
+    extra = random_trees(rng, tree_count, lat, lon)
+
+    selections = [
+        trees,
+        trees + extra[:1],                    # one tree added
+        trees[:-1] + extra[:1],               # one removed, one added
+        trees[:tree_count // 2],              # half removed
+        trees[:tree_count // 2] + extra,      # many added
+        extra,                                # everything replaced
+    ]
+    for selection in selections:
+        incremental = engine._incremental_canopy(list(selection)).to_dense()
+        full = app.AIClimateEngine(grid=engine.grid)._canopy_effectiveness_model(selection, None).to_dense()
+        np.testing.assert_allclose(incremental, full, rtol=0, atol=1e-9)
+
+
+def test_changing_only_the_trees_reuses_the_cached_baseline():
+    rng = np.random.default_rng(9)
+    lat, lon = 23.81, 90.41
+    engine = app.AIClimateEngine(grid=app.DispersionGrid(lat, lon))
+    sources = {'sources': [{'lat': lat, 'lon': lon, 'intensity': 0.7}]}
+    weather = {'wind_direction': 120, 'wind_speed': 6}
+    trees = random_trees(rng, 30, lat, lon)
+
+    first = engine.run_scenario_analysis(sources, {'trees': trees[:10]}, weather)
+    second = engine.run_scenario_analysis(sources, {'trees': trees[:20]}, weather)
+
+    assert second['dispersion_grid'] is first['dispersion_grid']
+    assert second['pollution_reduction_percent'] > first['pollution_reduction_percent']
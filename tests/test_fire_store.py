@@ -0,0 +1,118 @@
+"""FireStore tile partitioning and the FIRMS area request"""
+import io
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+import app
+
+
+HEADER = 'latitude,longitude,bright_ti4,acq_date,acq_time,confidence,frp'
+
+
+def firms_csv(rows):
+    return io.StringIO('\n'.join([HEADER] + [f"{lat},{lon},330.5,{day},1205,n,4.2" for lat, lon, day in rows]))
+
+
+def test_sync_keeps_only_detections_in_the_tile_and_day(tmp_path):
+    today = datetime.now(timezone.utc).date()
+    yesterday = today - timedelta(days=1)
+    requests = []
+
+    def fetch(sensor, tile, start_day, day_range):
+        requests.append((sensor, tile, start_day, day_range))
+        lat, lon = tile[0] + 5.0, tile[1] + 5.0
+        return app.parse_firms_csv(firms_csv([
+            (lat, lon, yesterday),                               # kept
+            (lat + 0.1, lon - 0.1, today),                       # kept, on the other day
+            (tile[0] - 0.5, lon, yesterday),                     # south of the tile
+            (lat, tile[1] + app.FIRE_TILE_DEG + 0.5, today),     # east of the tile
+        ]))[0]
+
+    store = app.FireStore(root=str(tmp_path), sensors=('VIIRS_SNPP_NRT',))
+    made = store.sync(25.0, 85.0, radius_km=20, days=2, fetch=fetch)
+
+    assert made == 1 and requests == [('VIIRS_SNPP_NRT', (20, 80), yesterday, 2)]
+    for day, lat, lon in [(yesterday, 25.0, 85.0), (today, 25.1, 84.9)]:
+        with np.load(store._path(day, 'VIIRS_SNPP_NRT', (20, 80))) as part:
+            assert list(part['lat']) == [lat] and list(part['lon']) == [lon]
+
+    fires = store.query(25.0, 85.0, radius_km=20, days=2)
+    assert sorted(fires['lat']) == [25.0, 25.1]
+    # Synced days are not requested again
+    assert store.sync(25.0, 85.0, radius_km=20, days=2, fetch=fetch) == 0
+
+
+def test_fire_free_partitions_are_stored_and_not_refetched(tmp_path):
+    calls = []
+
+    def fetch(sensor, tile, start_day, day_range):
+        calls.append((start_day, day_range))
+        return app._empty_firms_columns()
+
+    store = app.FireStore(root=str(tmp_path), sensors=('MODIS_NRT',))
+    assert store.sync(25.0, 85.0, radius_km=20, days=3, fetch=fetch) == 1
+    today = datetime.now(timezone.utc).date()
+    for offset in range(3):
+        with np.load(store._path(today - timedelta(days=offset), 'MODIS_NRT', (20, 80))) as part:
+            assert part['lat'].size == 0
+    assert store.query(25.0, 85.0, radius_km=20, days=3)['lat'].size == 0
+
+    assert store.sync(25.0, 85.0, radius_km=20, days=3, fetch=fetch) == 0
+    assert calls == [(today - timedelta(days=2), 3)]
+
+
+def test_failed_fetch_is_retried(tmp_path):
+    outcomes = [RuntimeError("FIRMS down"), app._empty_firms_columns()]
+
+    def fetch(sensor, tile, start_day, day_range):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    store = app.FireStore(root=str(tmp_path), sensors=('MODIS_NRT',))
+    with pytest.raises(RuntimeError):
+        store.sync(25.0, 85.0, radius_km=20, days=2, fetch=fetch)
+    assert store.sync(25.0, 85.0, radius_km=20, days=2, fetch=fetch) == 1
+    assert not outcomes
+
+
+def test_todays_partition_is_refreshed(tmp_path, monkeypatch):
+    store = app.FireStore(root=str(tmp_path), sensors=('MODIS_NRT',))
+    fetch = lambda sensor, tile, start_day, day_range: app._empty_firms_columns()
+    store.sync(25.0, 85.0, radius_km=20, days=2, fetch=fetch)
+
+    today = datetime.now(timezone.utc).date()
+    stale = time.time() - app.FIRE_TODAY_REFRESH_S - 1
+    os.utime(store._path(today, 'MODIS_NRT', (20, 80)), (stale, stale))
+    requests = []
+    store.sync(25.0, 85.0, radius_km=20, days=2,
+               fetch=lambda *args: requests.append(args[2:]) or app._empty_firms_columns())
+    assert requests == [(today, 1)]
+
+
+def test_firms_area_is_west_south_east_north(monkeypatch):
+    sent = {}
+
+    class Response:
+        raw = io.BytesIO(HEADER.encode())
+
+        def raise_for_status(self):
+            pass
+
+        def close(self):
+            pass
+
+    class Client:
+        def get(self, provider, url, params=None, **kwargs):
+            sent.update(params)
+            return Response()
+
+    monkeypatch.setattr(app, 'get_provider_client', lambda: Client())
+    app._fetch_firms_range('VIIRS_SNPP_NRT', (20, 80), datetime(2024, 5, 1).date(), 3)
+
+    assert sent['area'] == f"80,20,{80 + app.FIRE_TILE_DEG},{20 + app.FIRE_TILE_DEG}"
@@ -0,0 +1,77 @@
+"""Streaming FIRMS CSV parsing"""
+import io
+
+import numpy as np
+import pytest
+
+import app
+
+
+VIIRS_HEADER = "latitude,longitude,bright_ti4,scan,track,acq_date,acq_time,satellite,confidence,version,bright_ti5,frp,daynight"
+MODIS_HEADER = "latitude,longitude,brightness,scan,track,acq_date,acq_time,satellite,confidence,version,bright_t31,frp,daynight"
+
+
+def viirs_rows(points):
+    return "\n".join(f"{lat},{lon},330.5,0.4,0.4,2026-10-17,{hhmm},N,n,2.0NRT,290.1,{frp},D"
+                     for lat, lon, hhmm, frp in points)
+
+
+def test_columns_are_parsed_and_distance_filtered():
+    csv = VIIRS_HEADER + "\n" + viirs_rows([(28.60, 77.20, 905, 4.2), (28.70, 77.20, 1430, 11.0),
+                                            (29.60, 77.20, 1, 2.0)])
+    fires, rows_read = app.parse_firms_csv(io.StringIO(csv), 28.60, 77.20, 20)
+
+    assert rows_read == 3
+    np.testing.assert_allclose(fires['lat'], [28.60, 28.70])
+    np.testing.assert_allclose(fires['distance_km'], [0.0, 0.1 * 111])
+    np.testing.assert_allclose(fires['brightness'], [330.5, 330.5])
+    np.testing.assert_allclose(fires['frp'], [4.2, 11.0])
+    assert list(fires['confidence']) == ['n', 'n']
+    assert list(fires['acq_time']) == [np.datetime64('2026-10-17T09:05'), np.datetime64('2026-10-17T14:30')]
+
+
+def test_chunked_parsing_matches_one_pass():
+    rng = np.random.default_rng(0)
+    points = [(28 + rng.uniform(-1, 1), 77 + rng.uniform(-1, 1), rng.integers(0, 2359), rng.uniform(0, 50))
+              for _ in range(500)]
+    csv = VIIRS_HEADER + "\n" + viirs_rows(points)
+
+    whole, rows = app.parse_firms_csv(io.StringIO(csv), 28, 77, 50)
+    chunked, chunked_rows = app.parse_firms_csv(io.StringIO(csv), 28, 77, 50, chunk_rows=37)
+    assert rows == chunked_rows == 500 and 0 < len(whole['lat']) < 500
+    for column in whole:
+        np.testing.assert_array_equal(chunked[column], whole[column])
+
+
+def test_modis_headers_and_bad_rows():
+    csv = (MODIS_HEADER + "\n"
+           "10.0,20.0,310.2,1,1,2026-10-17,0030,T,77,6.1NRT,290,8.5,N\n"
+           "not-a-number,20.0,310.2,1,1,2026-10-17,0030,T,77,6.1NRT,290,8.5,N\n"
+           "10.1,20.1,305.0,1,1,2026-10-17,0045,A,80,6.1NRT,290,3.0,N,extra,fields\n")
+    fires, rows_read = app.parse_firms_csv(io.StringIO(csv))
+
+    # Rows with unparseable coordinates are dropped; trailing extra fields are ignored
+    assert rows_read == 3
+    np.testing.assert_allclose(fires['brightness'], [310.2, 305.0])
+    assert np.isnan(fires['distance_km']).all()
+    assert list(fires['confidence']) == ['77', '80']
+
+
+def test_empty_and_unusable_files():
+    fires, rows_read = app.parse_firms_csv(io.StringIO(""))
+    assert rows_read == 0 and all(len(column) == 0 for column in fires.values())
+
+    fires, rows_read = app.parse_firms_csv(io.StringIO(VIIRS_HEADER + "\n"))
+    assert rows_read == 0 and len(fires['lat']) == 0
+
+    with pytest.raises(ValueError, match="latitude"):
+        app.parse_firms_csv(io.StringIO("x,y\n1,2\n"))
+
+
+def test_records_round_values_for_display():
+    csv = VIIRS_HEADER + "\n" + viirs_rows([(28.60, 77.237, 905, 4.2)])
+    fires, _ = app.parse_firms_csv(io.StringIO(csv), 28.60, 77.20, 20)
+    assert app.firms_records(fires) == [{
+        'lat': 28.6, 'lon': 77.237, 'distance_km': 4.1, 'brightness': 330.5, 'frp': 4.2,
+        'confidence': 'n', 'acq_time': '2026-10-17T09:05',
+    }]
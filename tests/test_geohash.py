@@ -0,0 +1,76 @@
+"""Geohash-keyed provider cache entries and per-caller distances"""
+import numpy as np
+import pytest
+
+import app
+
+
+def test_geohash_cell_matches_the_standard_encoding():
+    cell, cell_lat, cell_lon = app.geohash_cell(57.64911, 10.40744, 11)
+    assert cell == "u4pruydqqvj"
+    assert cell_lat == pytest.approx(57.64911, abs=1e-5) and cell_lon == pytest.approx(10.40744, abs=1e-5)
+    assert app.geohash_cell(-33.8688, 151.2093, 5)[0] == "r3gx2"
+
+
+@pytest.mark.parametrize('precision', [4, 5, 6])
+def test_points_share_a_cell_within_its_radius(precision):
+    rng = np.random.default_rng(precision)
+    radius = app.geohash_cell_radius_km(precision)
+    for lat, lon in zip(rng.uniform(-60, 60, 200), rng.uniform(-180, 180, 200)):
+        cell, cell_lat, cell_lon = app.geohash_cell(lat, lon, precision)
+        assert np.hypot(lat - cell_lat, lon - cell_lon) * 111 <= radius + 1e-9
+        assert app.geohash_cell(cell_lat, cell_lon, precision)[0] == cell
+
+
+def fires_around(lat, lon, n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{'lat': lat + dlat, 'lon': lon + dlon}
+            for dlat, dlon in rng.uniform(-0.5, 0.5, (n, 2))]
+
+
+def test_viirs_fires_are_measured_from_the_caller(monkeypatch):
+    monkeypatch.setattr(app, '_PROVIDER_CACHE', app.ProviderCache())
+    fetched_at = []
+
+    def fetch(cell_lat, cell_lon):
+        fetched_at.append((cell_lat, cell_lon))
+        reach = app.FIRE_RADIUS_KM + app.provider_cell_margin_km('nasa_firms')
+        fires = app.within_radius(fires_around(cell_lat, cell_lon), cell_lat, cell_lon, reach, digits=1)
+        return {'source': 'NASA VIIRS SNPP', 'fires': fires, 'fire_count': len(fires),
+                'nearest_fire_km': min(fire['distance_km'] for fire in fires)}
+    monkeypatch.setattr(app, '_fetch_viirs_fires', fetch)
+
+    # Two points at opposite edges of one cell share a single fetch at its centre
+    cell, cell_lat, cell_lon = app.geohash_cell(23.81, 90.41, app.PROVIDER_GEOHASH_PRECISION['nasa_firms'])
+    offset = app.geohash_cell_radius_km(5) / 111 / 2
+    callers = [(cell_lat - offset, cell_lon - offset), (cell_lat + offset, cell_lon + offset)]
+    assert {app.geohash_cell(la, lo, 5)[0] for la, lo in callers} == {cell}
+    results = [app.get_nasa_viirs_fire_data(la, lo) for la, lo in callers]
+    assert fetched_at == [(cell_lat, cell_lon)]
+
+    every_fire = fires_around(cell_lat, cell_lon)
+    for (lat, lon), result in zip(callers, results):
+        distances = [np.hypot(f['lat'] - lat, f['lon'] - lon) * 111 for f in every_fire]
+        expected = sorted(round(d, 1) for d in distances if d <= app.FIRE_RADIUS_KM)
+        assert sorted(fire['distance_km'] for fire in result['fires']) == expected
+        assert result['fire_count'] == len(expected)
+        assert result['nearest_fire_km'] == expected[0]
+    assert results[0]['fires'] != results[1]['fires']
+
+
+def test_openaq_stations_are_filtered_from_the_caller(monkeypatch):
+    monkeypatch.setattr(app, '_PROVIDER_CACHE', app.ProviderCache())
+    requested = []
+
+    def fetch(cell_lat, cell_lon, radius_km):
+        requested.append(radius_km)
+        return [(cell_lat + 0.2, cell_lon, 40.0, 'north'), (cell_lat - 0.2, cell_lon, 60.0, 'south')]
+    monkeypatch.setattr(app, '_fetch_openaq_stations', fetch)
+
+    _, cell_lat, cell_lon = app.geohash_cell(23.81, 90.41, app.PROVIDER_GEOHASH_PRECISION['openaq'])
+    north = app.get_openaq_sensors(cell_lat + 0.015, cell_lon, radius_km=21)
+    south = app.get_openaq_sensors(cell_lat - 0.015, cell_lon, radius_km=21)
+
+    assert requested == [21]
+    assert [h['sensor_name'] for h in north] == ['north'] and [h['sensor_name'] for h in south] == ['south']
+    assert north[0]['distance_km'] == pytest.approx(0.185 * 111)
@@ -0,0 +1,80 @@
+"""Sparse tiled grids, the grid memory budget and the default plume reach"""
+import numpy as np
+import pytest
+
+import app
+
+
+def test_tiled_grid_matches_dense_accumulation():
+    rng = np.random.default_rng(5)
+    shape = (300, 170)
+    grid = app.TiledGrid(shape, tile_size=64)
+    dense = np.zeros(shape)
+
+    rows, cols = rng.integers(0, 150, 500), rng.integers(0, 60, 500)
+    weights = rng.uniform(0, 1, 500)
+    grid.add_points(rows, cols, weights)
+    np.add.at(dense, (rows, cols), weights)
+
+    block = rng.uniform(0, 1, (40, 90))
+    grid.add_block(-10, 120, block)  # clipped at the top and right edges
+    dense[0:30, 120:170] += block[10:40, 0:50]
+
+    np.testing.assert_allclose(grid.to_dense(), dense)
+    assert grid.sum() == pytest.approx(dense.sum())
+    assert grid.mean() == pytest.approx(dense.mean())
+    # Only tiles something landed in are allocated
+    assert len(grid.tiles) < -(-shape[0] // 64) * -(-shape[1] // 64)
+
+    effectiveness = app.TiledGrid(shape, tile_size=64)
+    effectiveness.add_block(0, 0, np.full((64, 64), 0.25))
+    np.testing.assert_allclose(grid.reduced_by(effectiveness).to_dense(),
+                               dense * (1 - effectiveness.to_dense()))
+
+    keys, stack = grid.to_stack()
+    np.testing.assert_allclose(app.TiledGrid.from_stack(shape, 64, keys, stack).to_dense(), dense)
+
+
+def test_tiled_grid_downsample_is_a_block_mean():
+    grid = app.TiledGrid((100, 100), tile_size=32)
+    grid.add_block(0, 0, np.arange(100 * 100, dtype=float).reshape(100, 100))
+    small, factor = grid.downsample(25)
+
+    assert factor == 4 and small.shape == (25, 25)
+    np.testing.assert_allclose(small, grid.to_dense().reshape(25, 4, 25, 4).mean(axis=(1, 3)))
+
+
+def test_large_grids_use_float32_tiles_and_over_budget_grids_are_refused():
+    small = app.DispersionGrid(23.81, 90.41)
+    assert small.dtype == np.float64 and small.tile_size == small.size
+
+    large = app.DispersionGrid(23.81, 90.41, extent_m=50000, cell_size_m=50)
+    assert large.shape == (1000, 1000) and large.dtype == np.float32 and large.tile_size == 256
+
+    with pytest.raises(ValueError, match="budget"):
+        app.DispersionGrid(23.81, 90.41, extent_m=50000, cell_size_m=50, memory_budget_mb=8)
+    with pytest.raises(ValueError):
+        app.DispersionGrid(extent_m=40, cell_size_m=100)
+
+
+@pytest.mark.parametrize('extent_m', [5000, 10000])
+def test_default_plume_reach_spans_the_grid(extent_m):
+    lat, lon = 23.81, 90.41
+    grid = app.DispersionGrid(lat, lon, extent_m=extent_m)
+    assert grid.plume_reach_m == pytest.approx(extent_m * np.sqrt(2))
+
+    # A north-east wind from the centre carries the plume to the south-west corner
+    engine = app.AIClimateEngine(grid=grid)
+    dense = engine._pollution_dispersion_model([{'lat': lat, 'lon': lon, 'intensity': 1.0}],
+                                               {'wind_direction': 45, 'wind_speed': 10}, {}).to_dense()
+    assert dense[1, 1] > 0
+
+
+def test_dense_kernel_paths_respect_the_budget():
+    grid = app.DispersionGrid(23.81, 90.41, extent_m=50000, cell_size_m=50)
+    with pytest.raises(ValueError, match="rotation table"):
+        grid.rotation_table()
+
+    engine = app.AIClimateEngine(grid=grid)
+    with pytest.raises(ValueError, match="time-series"):
+        engine.run_time_series({'sources': []}, {'trees': []}, [{'wind_direction': 0}])
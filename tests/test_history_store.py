@@ -0,0 +1,92 @@
+"""Parquet air quality history: merging, daily reads, syncs and concurrent writers"""
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+pytestmark = pytest.mark.skipif(not app.PYARROW_AVAILABLE, reason="pyarrow is not installed")
+
+
+def readings(stations, start, hours, pm25=40.0, no2=20.0):
+    times = pd.date_range(start, periods=hours, freq='h', tz='UTC')
+    return pd.DataFrame({
+        'time': np.tile(times, len(stations)),
+        'station': np.repeat(stations, hours),
+        'lat': 28.6, 'lon': 77.2, 'pm25': pm25, 'no2': no2,
+    })
+
+
+def test_ingest_merges_months_and_reads_daily_means(tmp_path):
+    store = app.HistoryStore(root=str(tmp_path))
+    history = app.normalize_history(readings(['a', 'b'], '2026-09-30 20:00', 8), 'openaq')
+    assert store.ingest('Delhi, India', history) == 16
+    assert store.months('Delhi, India') == ['2026-09', '2026-10']
+
+    # Re-ingesting an overlapping window keeps the last reading per station and hour
+    update = app.normalize_history(readings(['a'], '2026-10-01 02:00', 2, pm25=100.0), 'openaq')
+    store.ingest('Delhi, India', update)
+
+    daily = store.read_daily('Delhi, India', '2026-09-30', '2026-10-02')
+    assert list(daily['date']) == [pd.Timestamp('2026-09-30'), pd.Timestamp('2026-10-01')]
+    assert daily['pm25'].iloc[0] == pytest.approx(40)
+    assert daily['pm25'].iloc[1] == pytest.approx((40 * 2 + 100 * 2 + 40 * 4) / 8)
+    assert daily.attrs['stations'] == 2
+    assert store.latest_time('Delhi, India', 'openaq') == pd.Timestamp('2026-10-01 03:00', tz='UTC')
+    assert store.latest_time('Delhi, India', 'purpleair') is None
+    assert store.read_daily('Oslo, Norway', '2026-09-30', '2026-10-02').empty
+
+
+def test_sync_resumes_from_the_latest_hour(tmp_path, monkeypatch):
+    store = app.HistoryStore(root=str(tmp_path))
+    windows = []
+
+    def fetch(start, end):
+        windows.append((start, end))
+        return app.normalize_history(readings(['a'], start, int((end - start) / pd.Timedelta(hours=1))), 'openaq')
+
+    first = app.sync_city_history('Lima, Peru', 0, 0, store=store, days=3, fetch=fetch)
+    assert first == 72 and store.synced_at('Lima, Peru') is not None
+    # Synced recently: skipped
+    assert app.sync_city_history('Lima, Peru', 0, 0, store=store, days=3, fetch=fetch) == 0
+
+    monkeypatch.setattr(app, 'HISTORY_REFRESH_S', -1)
+    latest = store.latest_time('Lima, Peru', 'openaq')
+    requested = len(windows)
+    app.sync_city_history('Lima, Peru', 0, 0, store=store, days=3, fetch=fetch)
+    assert windows[requested][0] == latest
+
+
+WRITER = """
+import sys
+import pandas as pd
+import app
+root, worker = sys.argv[1], int(sys.argv[2])
+store = app.HistoryStore(root=root)
+for batch in range(6):
+    times = pd.date_range('2026-10-01', periods=24, freq='h', tz='UTC')
+    rows = pd.DataFrame({'time': times, 'station': f"w{worker}-{batch}", 'lat': 0.0, 'lon': 0.0,
+                         'pm25': float(worker), 'no2': 1.0})
+    store.ingest('Shared City', app.normalize_history(rows, 'openaq'))
+"""
+
+
+def test_concurrent_processes_never_drop_each_others_rows(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    writers = [subprocess.Popen([sys.executable, '-c', WRITER, str(tmp_path), str(worker)], cwd=root,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+               for worker in range(4)]
+    for writer in writers:
+        _, stderr = writer.communicate(timeout=300)
+        assert writer.returncode == 0, stderr
+
+    store = app.HistoryStore(root=str(tmp_path))
+    table = app.pq.read_table(store._month_path('Shared City', '2026-10')).to_pandas()
+    assert len(table) == 4 * 6 * 24
+    assert table['station'].nunique() == 4 * 6
+    assert not [name for name in os.listdir(os.path.dirname(store._month_path('Shared City', '2026-10')))
+                if name.endswith('.tmp')]
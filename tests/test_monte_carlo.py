@@ -0,0 +1,122 @@
+"""Monte Carlo uncertainty bands: batched footprints, seeding, caching and the pool fallback"""
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import app
+
+
+LAT, LON = 23.81, 90.41
+
+
+def scenario(n_trees=25, seed=4):
+    rng = np.random.default_rng(seed)
+    sources = [{'lat': LAT + rng.uniform(-0.02, 0.02), 'lon': LON + rng.uniform(-0.02, 0.02),
+                'intensity': rng.uniform(0.3, 1.0)} for _ in range(5)]
+    sources.append({'lat': LAT + 0.2, 'lon': LON, 'intensity': 1.0})  # too far away to reach the grid
+    trees = [{'lat': LAT + rng.uniform(-0.015, 0.015), 'lon': LON + rng.uniform(-0.015, 0.015),
+              'effectiveness': rng.uniform(0.3, 0.9)} for _ in range(n_trees)]
+    return {'sources': sources}, {'trees': trees}, {'wind_direction': 200, 'wind_speed': 12}
+
+
+def per_realization_exposure(engine, sources, trees, weather, n, seed):
+    """Exposure-weighted reduction of each realization, one plume footprint at a time"""
+    effectiveness = engine._canopy_effectiveness_model(trees, None).to_dense()
+    rows, cols, _ = engine.grid.locate(sources)
+    intensities = np.array([source['intensity'] for source in sources])
+    sigma_y = min(15, weather['wind_speed'] * 0.3)
+    sizes = [app.MONTE_CARLO_CHUNK_SIZE] * (n // app.MONTE_CARLO_CHUNK_SIZE)
+    if n % app.MONTE_CARLO_CHUNK_SIZE:
+        sizes.append(n % app.MONTE_CARLO_CHUNK_SIZE)
+
+    exposures = []
+    for size, chunk_seed in zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))):
+        rng = np.random.default_rng(chunk_seed)
+        factor = np.clip(rng.normal(1, app.TREE_EFFECTIVENESS_SD, size), 0.3, None)
+        directions = weather['wind_direction'] + rng.normal(0, app.WIND_DIRECTION_SD, size)
+        intensity_factor = rng.lognormal(0, app.HOTSPOT_INTENSITY_SD, (size, len(sources)))
+        for k in range(size):
+            offset_i, offset_j, unit = engine.grid.plume_footprint(directions[k], sigma_y)
+            cell_i, cell_j = rows[:, None] + offset_i, cols[:, None] + offset_j
+            on_grid = (cell_i >= 0) & (cell_i < engine.grid.size) & (cell_j >= 0) & (cell_j < engine.grid.size)
+            concentration = ((intensities * intensity_factor[k])[:, None] * unit)[on_grid]
+            total = concentration.sum()
+            covered = (concentration * effectiveness[cell_i[on_grid], cell_j[on_grid]]).sum()
+            exposures.append(factor[k] * covered / total * 100 if total > 0 else 0.0)
+    return np.array(exposures)
+
+
+@pytest.mark.parametrize('extent_m, cell_size_m', [(5000, 100), (10000, 50), (25000, 250)])
+def test_plume_cells_match_plume_footprint(extent_m, cell_size_m):
+    grid = app.DispersionGrid(LAT, LON, extent_m=extent_m, cell_size_m=cell_size_m)
+    directions = np.concatenate([[0, 45, 90, 135, 180, 225, 270, 315], np.random.default_rng(2).uniform(-90, 450, 40)])
+    di, dj, concentration = grid.plume_cells(directions, 3.6)
+
+    for k, direction in enumerate(directions):
+        offset_i, offset_j, unit = grid.plume_footprint(direction, 3.6)
+        expected = dict(zip(zip(offset_i, offset_j), unit))
+        kept = concentration[k] > 0
+        assert dict(zip(zip(di[k][kept], dj[k][kept]), concentration[k][kept])) == pytest.approx(expected)
+        assert kept.sum() == len(expected)
+
+
+@pytest.fixture
+def in_process(monkeypatch):
+    def no_pool(workers):
+        raise RuntimeError("no pool in this test")
+    monkeypatch.setattr(app, 'get_monte_carlo_pool', no_pool)
+
+
+def test_batched_footprints_match_per_realization_plumes(in_process):
+    baseline, intervention, weather = scenario()
+    engine = app.AIClimateEngine(grid=app.DispersionGrid(LAT, LON))
+    bands = engine.run_monte_carlo(baseline, intervention, weather, n_realizations=600, seed=3)
+
+    expected = per_realization_exposure(engine, baseline['sources'], intervention['trees'], weather, 600, 3)
+    band = bands['exposure_weighted_reduction_percent']
+    np.testing.assert_allclose([band['p5'], band['p50'], band['p95'], band['mean']],
+                               [*np.percentile(expected, [5, 50, 95]), expected.mean()], rtol=1e-9)
+
+    median = np.median(expected)
+    assert bands['confidence_score'] == pytest.approx(
+        np.mean(np.abs(expected - median) <= app.MONTE_CARLO_CONFIDENCE_TOLERANCE * median))
+
+
+def test_pool_fallback_is_reported(in_process):
+    baseline, intervention, weather = scenario()
+    bands = app.AIClimateEngine(grid=app.DispersionGrid(LAT, LON)).run_monte_carlo(
+        baseline, intervention, weather, n_realizations=300, seed=1)
+
+    assert bands['workers'] == 1 and "no pool in this test" in bands['fallback']
+
+
+def test_seeded_runs_are_reproducible_across_workers_and_cached():
+    baseline, intervention, weather = scenario()
+    engine = app.AIClimateEngine(grid=app.DispersionGrid(LAT, LON))
+
+    one = engine.run_monte_carlo(baseline, intervention, weather, n_realizations=800, workers=1, seed=9)
+    two = app.AIClimateEngine(grid=engine.grid).run_monte_carlo(baseline, intervention, weather,
+                                                                n_realizations=800, workers=2, seed=9)
+    assert one['fallback'] is None and two['fallback'] is None
+    for metric in ('pollution_reduction_percent', 'heat_reduction', 'exposure_weighted_reduction_percent'):
+        assert one[metric] == pytest.approx(two[metric], rel=1e-12)
+
+    cached = engine.run_monte_carlo(baseline, intervention, weather, n_realizations=800, workers=1, seed=9)
+    assert cached == one and cached is not one
+
+
+def test_importing_the_app_draws_no_page():
+    # Process-pool workers import the app module; only main() may draw the page
+    probe = ("import streamlit as st\n"
+             "calls = []\n"
+             "st.set_page_config = lambda *a, **k: calls.append('set_page_config')\n"
+             "st.markdown = lambda *a, **k: calls.append('markdown')\n"
+             "import app\n"
+             "print(calls)\n")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', probe], cwd=root, capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == '[]'
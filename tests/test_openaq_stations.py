@@ -0,0 +1,81 @@
+"""Concurrent per-station OpenAQ lookups on the shared station pool"""
+import threading
+import time
+
+import pytest
+import requests
+
+import app
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def json(self):
+        return self.payload
+
+
+class StationSession:
+    """Serves /locations and per-station /latest; slow stations sleep, broken ones time out"""
+
+    def __init__(self, n_stations, slow=(), timing_out=()):
+        self.n_stations = n_stations
+        self.slow = set(slow)
+        self.timing_out = set(timing_out)
+        self.threads = set()
+
+    def get(self, url, timeout=None, **kwargs):
+        if url.endswith('/locations'):
+            return FakeResponse({'results': [
+                {'id': i, 'name': f"station {i}", 'coordinates': {'latitude': 10 + i / 100, 'longitude': 20}}
+                for i in range(self.n_stations)]})
+        location_id = int(url.rsplit('/', 1)[1])
+        self.threads.add(threading.current_thread().name)
+        if location_id in self.timing_out:
+            raise requests.Timeout(f"station {location_id} timed out")
+        if location_id in self.slow:
+            time.sleep(1.0)
+        return FakeResponse({'results': [{'measurements': [{'parameter': 'pm25', 'value': 30 + location_id}]}]})
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(app, 'RETRY_BACKOFF_S', 0)
+
+
+def test_stations_are_fetched_on_one_bounded_pool():
+    session = StationSession(20)
+    client = app.ProviderClient(session=session)
+
+    stations = app._openaq_station_latest(client, 10, 20, 25)
+    assert sorted(pm25 for _, _, pm25, _ in stations) == [30 + i for i in range(20)]
+    app._openaq_station_latest(client, 10, 20, 25)
+
+    assert app.get_openaq_station_pool() is app.get_openaq_station_pool()
+    assert len(session.threads) <= app.OPENAQ_MAX_WORKERS
+    assert all(name.startswith('openaq-station') for name in session.threads)
+
+
+def test_deadline_returns_the_stations_that_answered():
+    client = app.ProviderClient(session=StationSession(6, slow={4, 5}))
+
+    started = time.monotonic()
+    stations = app._openaq_station_latest(client, 10, 20, 25, deadline_s=0.3)
+    assert time.monotonic() - started < 0.9
+    assert sorted(name for _, _, _, name in stations) == [f"station {i}" for i in range(4)]
+
+
+def test_station_timeouts_do_not_open_the_openaq_circuit():
+    client = app.ProviderClient(session=StationSession(12, timing_out=set(range(10))))
+
+    stations = app._openaq_station_latest(client, 10, 20, 25)
+    assert len(stations) == 2
+    assert client.is_available('openaq')
+    assert client.health()['openaq']['consecutive_failures'] == 0
+
+    # A timed-out provider-wide request still counts
+    with pytest.raises(requests.Timeout):
+        client.get('openaq', "https://api.openaq.org/v2/latest/0")
+    assert client.health()['openaq']['consecutive_failures'] == 1
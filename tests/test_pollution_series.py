@@ -0,0 +1,53 @@
+"""Columnar synthetic pollution history"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+END = pd.Timestamp('2026-10-18 00:00')
+
+
+def test_single_city_series_shape_and_ranges():
+    series = app.generate_pollution_series(100, days=28, end=END, seed=1)
+
+    assert list(series.columns) == ['date', 'pm25', 'no2', 'aqi']
+    assert len(series) == 28 and series['date'].iloc[-1] == END
+    assert series['date'].diff().dropna().eq(pd.Timedelta(days=1)).all()
+    assert series['pm25'].dtype == np.float32 and series['aqi'].dtype == np.int16
+
+    weekend = series['date'].dt.dayofweek >= 5
+    # 0.8-1.2 of the baseline on weekdays, scaled to 70% at weekends
+    assert series.loc[~weekend, 'pm25'].between(80, 120).all()
+    assert series.loc[weekend, 'pm25'].between(56, 84).all()
+    assert (series['no2'] >= 3).all()
+    np.testing.assert_array_equal(series['aqi'], app.calculate_aqi(series['pm25'].to_numpy()).astype(np.int16))
+
+
+def test_seed_reproduces_the_series():
+    one = app.generate_pollution_series(60, days=10, end=END, seed=7)
+    pd.testing.assert_frame_equal(one, app.generate_pollution_series(60, days=10, end=END, seed=7))
+    assert not one['pm25'].equals(app.generate_pollution_series(60, days=10, end=END, seed=8)['pm25'])
+
+
+def test_hourly_multi_year_and_low_baselines():
+    hourly = app.generate_pollution_series(10, days=3, freq='h', end=END, seed=0)
+    assert len(hourly) == 72 and (hourly['pm25'] >= 8).all()
+
+    years = app.generate_pollution_series(40, days=3 * 365, end=END, seed=0)
+    assert len(years) == 3 * 365 and years['date'].iloc[0] == END - pd.Timedelta(days=3 * 365 - 1)
+
+
+def test_multi_city_frame_is_ordered_city_by_city():
+    bases = {'Delhi': 150, 'Oslo': 12, 'Lima': 45}
+    frame = app.generate_pollution_series(bases, days=14, end=END, seed=3)
+
+    assert len(frame) == 3 * 14
+    assert isinstance(frame['city'].dtype, pd.CategoricalDtype)
+    assert list(frame['city'].cat.categories) == list(bases)
+    assert list(frame['city'][::14]) == list(bases)
+    for city, base in bases.items():
+        rows = frame[frame['city'] == city]
+        assert (rows['date'].to_numpy() == frame['date'][:14].to_numpy()).all()
+        assert rows['pm25'].max() <= max(8, base * 1.2) * (1 + 1e-6)
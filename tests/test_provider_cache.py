@@ -0,0 +1,101 @@
+"""Stale-while-revalidate provider cache"""
+import threading
+
+import pytest
+
+import app
+
+
+TTLS = {'alpha': (60, 600)}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(app.time, 'time', lambda: now[0])
+    return now
+
+
+def drain(cache):
+    # One refresh worker: a no-op queued behind the refresh finishes after it
+    cache._executor.submit(lambda: None).result(timeout=10)
+
+
+class Fetcher:
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        value = self.values.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+def test_fresh_values_are_served_without_fetching(clock):
+    cache = app.ProviderCache(ttls=TTLS, workers=1)
+    fetch = Fetcher({'pm25': [40]})
+
+    first = cache.get('alpha', ('x',), fetch)
+    first['pm25'].append(99)  # callers get copies
+    clock[0] += 59
+    assert cache.get('alpha', ('x',), fetch) == {'pm25': [40]}
+    assert fetch.calls == 1 and cache.stats['miss'] == 1 and cache.stats['fresh'] == 1
+
+
+def test_stale_values_are_served_while_one_refresh_runs(clock):
+    cache = app.ProviderCache(ttls=TTLS, workers=1)
+    fetch = Fetcher('old', 'new')
+    cache.get('alpha', ('x',), fetch)
+
+    release = threading.Event()
+    def slow_fetch():
+        release.wait(10)
+        return fetch()
+
+    clock[0] += 120
+    assert [cache.get('alpha', ('x',), slow_fetch) for _ in range(3)] == ['old'] * 3
+    release.set()
+    drain(cache)
+    assert fetch.calls == 2 and cache.stats['stale'] == 3
+    assert cache.get('alpha', ('x',), fetch) == 'new'
+    assert cache.stats['fresh'] == 1
+
+
+def test_failed_refresh_keeps_the_stale_value(clock):
+    cache = app.ProviderCache(ttls=TTLS, workers=1)
+    fetch = Fetcher('good', RuntimeError("provider down"), 'better')
+    cache.get('alpha', ('x',), fetch)
+
+    clock[0] += 120
+    assert cache.get('alpha', ('x',), fetch) == 'good'
+    drain(cache)
+    assert cache.stats['refresh_failed'] == 1
+    # The failure did not replace the value, and the next stale read retries
+    assert cache.get('alpha', ('x',), fetch) == 'good'
+    drain(cache)
+    assert cache.get('alpha', ('x',), fetch) == 'better'
+
+
+def test_expired_values_are_refetched_synchronously(clock):
+    cache = app.ProviderCache(ttls=TTLS, workers=1)
+    fetch = Fetcher('old', RuntimeError("provider down"), 'new')
+    cache.get('alpha', ('x',), fetch)
+
+    clock[0] += 601
+    with pytest.raises(RuntimeError):
+        cache.get('alpha', ('x',), fetch)
+    assert cache.get('alpha', ('x',), fetch) == 'new'
+    assert cache.stats['miss'] == 3 and cache.stats['stale'] == 0
+
+
+def test_warm_at_refetches_entries_about_to_go_stale(clock):
+    cache = app.ProviderCache(ttls=TTLS, workers=1)
+    fetch_at = lambda lat, lon: (round(lat, 1), round(lon, 1))
+
+    assert cache.warm_at('alpha', 10.0, 20.0, fetch_at)
+    assert not cache.warm_at('alpha', 10.0, 20.0, fetch_at, horizon_s=30)
+    clock[0] += 40
+    assert cache.warm_at('alpha', 10.0, 20.0, fetch_at, horizon_s=30)
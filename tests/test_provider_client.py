@@ -0,0 +1,97 @@
+"""Provider HTTP client: retries, backoff and per-provider circuit breakers"""
+import pytest
+import requests
+
+import app
+
+
+class FakeResponse:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+
+class ScriptedSession:
+    """Returns (or raises) the scripted outcomes in order, repeating the last one"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def get(self, url, timeout=None, **kwargs):
+        self.calls.append((url, timeout))
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    sleeps = []
+    monkeypatch.setattr(app.time, 'time', lambda: now[0])
+    monkeypatch.setattr(app.time, 'sleep', sleeps.append)
+    return now, sleeps
+
+
+SETTINGS = {'alpha': (7, 2), 'beta': (3, 0)}
+
+
+def test_transient_failures_are_retried_with_backoff(clock):
+    _, sleeps = clock
+    session = ScriptedSession(requests.ConnectionError("reset"), 503, 200)
+    client = app.ProviderClient(session=session, settings=SETTINGS)
+
+    assert client.get('alpha', "https://alpha").status_code == 200
+    assert [timeout for _, timeout in session.calls] == [7, 7, 7]
+    assert len(sleeps) == 2 and sleeps[1] > sleeps[0] > 0
+    assert client.health()['alpha']['status'] == 'healthy'
+
+
+def test_final_failure_is_returned_or_raised(clock):
+    client = app.ProviderClient(session=ScriptedSession(429), settings=SETTINGS)
+    assert client.get('alpha', "https://alpha").status_code == 429
+
+    client = app.ProviderClient(session=ScriptedSession(requests.Timeout("slow")), settings=SETTINGS)
+    with pytest.raises(requests.Timeout):
+        client.get('alpha', "https://alpha", timeout=2)
+    assert client.health()['alpha']['status'] == 'degraded'
+    # Client errors other than 429 are answers, not failures
+    client = app.ProviderClient(session=ScriptedSession(404), settings=SETTINGS)
+    assert client.get('alpha', "https://alpha").status_code == 404
+    assert client.health()['alpha']['consecutive_failures'] == 0
+
+
+def test_circuit_opens_per_provider_and_half_opens_after_reset(clock):
+    now, _ = clock
+    session = ScriptedSession(500)
+    client = app.ProviderClient(session=session, settings=SETTINGS)
+
+    for _ in range(app.CIRCUIT_FAILURE_THRESHOLD):
+        client.get('beta', "https://beta")
+    assert client.health()['beta']['status'] == 'down'
+    assert client.is_available('alpha') and not client.is_available('beta')
+
+    calls = len(session.calls)
+    with pytest.raises(app.ProviderUnavailable):
+        client.get('beta', "https://beta")
+    assert len(session.calls) == calls
+
+    # After the reset one trial request goes through; a success closes the circuit
+    now[0] += app.CIRCUIT_RESET_S + 1
+    session.outcomes = [200]
+    assert client.get('beta', "https://beta").status_code == 200
+    assert client.health()['beta']['status'] == 'healthy'
+
+
+def test_failed_trial_request_reopens_the_circuit(clock):
+    now, _ = clock
+    client = app.ProviderClient(session=ScriptedSession(500), settings=SETTINGS)
+    for _ in range(app.CIRCUIT_FAILURE_THRESHOLD):
+        client.get('beta', "https://beta")
+
+    now[0] += app.CIRCUIT_RESET_S + 1
+    client.get('beta', "https://beta")
+    assert not client.is_available('beta')
+    with pytest.raises(app.ProviderUnavailable):
+        client.get('beta', "https://beta")
@@ -0,0 +1,67 @@
+"""Per-cell AOD and PM2.5 surfaces from the stored MODIS grids"""
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+import app
+
+
+LAT, LON = 28.61, 77.21
+MODIS = {'aod_value': 0.5}
+
+
+def store_with(tmp_path, grid):
+    store = app.AodStore(root=str(tmp_path))
+    store.put(datetime.now(timezone.utc).date(), grid)
+    return store
+
+
+def linear_aod(lat, lon):
+    return 0.4 + 0.05 * (lat - LAT) - 0.03 * (lon - LON)
+
+
+def cell_coordinates(grid):
+    steps = (np.arange(grid.size) - grid.center_cell[0]) * grid.cell_size_m / app.METERS_PER_DEGREE
+    return grid.center_lat + steps, grid.center_lon + steps / np.cos(np.radians(grid.center_lat))
+
+
+def test_surface_interpolates_the_stored_grid(tmp_path):
+    # A linear field sampled at 1 degree cell centres is reproduced exactly by bilinear interpolation
+    centre_lats = np.arange(app.AOD_GRID_SHAPE[0]) - 90 + 0.5
+    centre_lons = np.arange(app.AOD_GRID_SHAPE[1]) - 180 + 0.5
+    stored = linear_aod(centre_lats[:, None], centre_lons[None, :]).astype(np.float32)
+    grid = app.DispersionGrid(LAT, LON, extent_m=25000, cell_size_m=250)
+
+    surface = app.satellite_aod_surface(grid, MODIS, store=store_with(tmp_path, stored))
+    cell_lats, cell_lons = cell_coordinates(grid)
+    np.testing.assert_allclose(surface['aod'], linear_aod(cell_lats[:, None], cell_lons[None, :]), atol=1e-6)
+    np.testing.assert_allclose(surface['pm25'], surface['aod'] * app.AOD_TO_PM25)
+    np.testing.assert_array_equal(surface['predicted_aod'], surface['aod'])
+
+
+def test_cells_without_retrievals_take_the_city_value(tmp_path):
+    grid = app.DispersionGrid(LAT, LON)
+    empty = store_with(tmp_path, np.full(app.AOD_GRID_SHAPE, np.nan, dtype=np.float32))
+    np.testing.assert_allclose(app.satellite_aod_surface(grid, MODIS, store=empty)['aod'], 0.5)
+
+    # A grid without a location never touches the store
+    surface = app.satellite_aod_surface(app.DispersionGrid(), MODIS, store=object())
+    assert surface['aod'].shape == (50, 50) and (surface['aod'] == 0.5).all()
+
+
+def test_trees_reduce_aod_under_their_canopy(tmp_path):
+    grid = app.DispersionGrid(LAT, LON)
+    store = store_with(tmp_path, np.full(app.AOD_GRID_SHAPE, np.nan, dtype=np.float32))
+    tree = {'lat': LAT, 'lon': LON}
+    one = app.satellite_aod_surface(grid, MODIS, [tree], store=store)
+    row, col = grid.center_cell
+
+    assert one['predicted_aod'][row, col] == pytest.approx(0.5 * (1 - app.TREE_AOD_REDUCTION))
+    assert one['predicted_aod'][0, 0] == pytest.approx(0.5)
+    assert (one['predicted_aod'] <= one['aod']).all()
+    np.testing.assert_allclose(one['predicted_pm25'], one['predicted_aod'] * app.AOD_TO_PM25)
+
+    # Overlapping canopies do not stack, and trees off the grid change nothing
+    two = app.satellite_aod_surface(grid, MODIS, [tree, dict(tree), {'lat': LAT + 1, 'lon': LON}], store=store)
+    np.testing.assert_array_equal(two['predicted_aod'], one['predicted_aod'])
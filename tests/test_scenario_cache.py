@@ -0,0 +1,102 @@
+"""Content-addressed on-disk scenario results"""
+import os
+import threading
+import time
+
+import numpy as np
+
+import app
+
+
+LAT, LON = 28.61, 77.21
+
+
+def scenario(n_trees=15, seed=0):
+    rng = np.random.default_rng(seed)
+    sources = [{'lat': LAT + rng.uniform(-0.01, 0.01), 'lon': LON + rng.uniform(-0.01, 0.01), 'intensity': 0.8}]
+    trees = [{'lat': LAT + rng.uniform(-0.01, 0.01), 'lon': LON + rng.uniform(-0.01, 0.01),
+              'effectiveness': rng.uniform(0.3, 0.9)} for _ in range(n_trees)]
+    return {'sources': sources}, {'trees': trees}, {'wind_direction': 80, 'wind_speed': 9, 'temperature': 29}
+
+
+def test_results_round_trip_through_the_disk_cache(tmp_path):
+    baseline, intervention, weather = scenario()
+    grid = app.DispersionGrid(LAT, LON)
+    cache = app.ScenarioDiskCache(str(tmp_path))
+
+    computed = app.AIClimateEngine(grid=grid, disk_cache=cache).run_scenario_analysis(baseline, intervention, weather)
+    key = cache.fingerprint(baseline['sources'], intervention['trees'], weather, grid)
+    assert os.path.isdir(os.path.join(str(tmp_path), key))
+
+    # A fresh engine (another session or a restart) is served from disk
+    cached = app.AIClimateEngine(grid=grid, disk_cache=cache).run_scenario_analysis(baseline, intervention, weather)
+    assert cached['pollution_reduction_percent'] == computed['pollution_reduction_percent']
+    assert cached['heat_reduction'] == computed['heat_reduction']
+    for name in app.ScenarioDiskCache.LAYERS:
+        np.testing.assert_array_equal(cached[name].to_dense(), computed[name].to_dense())
+
+
+def test_fingerprint_covers_every_input():
+    baseline, intervention, weather = scenario()
+    grid = app.DispersionGrid(LAT, LON)
+    key = app.ScenarioDiskCache.fingerprint(baseline['sources'], intervention['trees'], weather, grid)
+
+    assert key == app.ScenarioDiskCache.fingerprint(baseline['sources'], list(intervention['trees']), dict(weather), grid)
+    variants = [
+        (baseline['sources'], intervention['trees'][:-1], weather, grid),
+        (baseline['sources'], intervention['trees'], dict(weather, wind_direction=81), grid),
+        (baseline['sources'], intervention['trees'], dict(weather, temperature=30), grid),
+        ([dict(baseline['sources'][0], intensity=0.9)], intervention['trees'], weather, grid),
+        (baseline['sources'], intervention['trees'], weather, app.DispersionGrid(LAT, LON, cell_size_m=50)),
+    ]
+    assert len({key} | {app.ScenarioDiskCache.fingerprint(*variant) for variant in variants}) == len(variants) + 1
+
+
+def test_concurrent_puts_of_one_key_leave_one_readable_entry(tmp_path):
+    baseline, intervention, weather = scenario()
+    grid = app.DispersionGrid(LAT, LON)
+    result = app.AIClimateEngine(grid=grid).run_scenario_analysis(baseline, intervention, weather)
+    cache = app.ScenarioDiskCache(str(tmp_path))
+
+    threads = [threading.Thread(target=cache.put, args=('same-key', result)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert os.listdir(str(tmp_path)) == ['same-key']
+    stored = cache.get('same-key', grid)
+    np.testing.assert_array_equal(stored['effectiveness_grid'].to_dense(), result['effectiveness_grid'].to_dense())
+
+
+def test_eviction_drops_least_recently_used_entries(tmp_path):
+    baseline, intervention, weather = scenario()
+    grid = app.DispersionGrid(LAT, LON)
+    result = app.AIClimateEngine(grid=grid).run_scenario_analysis(baseline, intervention, weather)
+
+    cache = app.ScenarioDiskCache(str(tmp_path), max_bytes=10**9)
+    cache.put('a', result)
+    entry_bytes = sum(os.path.getsize(os.path.join(str(tmp_path), 'a', name))
+                      for name in os.listdir(os.path.join(str(tmp_path), 'a')))
+    cache.max_bytes = int(2.5 * entry_bytes)
+
+    past = time.time() - 100
+    cache.put('b', result)
+    os.utime(os.path.join(str(tmp_path), 'a', 'meta.json'), (past, past))
+    os.utime(os.path.join(str(tmp_path), 'b', 'meta.json'), (past + 1, past + 1))
+    assert cache.get('a', grid) is not None  # reading marks 'a' as recently used
+    cache.put('c', result)
+
+    assert sorted(os.listdir(str(tmp_path))) == ['a', 'c']
+
+
+def test_missing_or_damaged_entries_are_misses(tmp_path):
+    baseline, intervention, weather = scenario()
+    grid = app.DispersionGrid(LAT, LON)
+    result = app.AIClimateEngine(grid=grid).run_scenario_analysis(baseline, intervention, weather)
+    cache = app.ScenarioDiskCache(str(tmp_path))
+
+    assert cache.get('absent', grid) is None
+    cache.put('damaged', result)
+    os.remove(os.path.join(str(tmp_path), 'damaged', 'dispersion_grid.npy'))
+    assert cache.get('damaged', grid) is None
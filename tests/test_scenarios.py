@@ -0,0 +1,55 @@
+"""Scenario sweeps against per-scenario runs"""
+import numpy as np
+import pytest
+
+import app
+
+
+def random_trees(rng, n, center_lat, center_lon, spread_deg=0.03):
+    return [
+        {'lat': center_lat + rng.uniform(-spread_deg, spread_deg),
+         'lon': center_lon + rng.uniform(-spread_deg, spread_deg),
+         'effectiveness': rng.uniform(0.2, 0.95)}
+        for _ in range(n)
+    ]
+
+
+def test_scenario_sweep_matches_per_count_runs():
+    rng = np.random.default_rng(11)
+    lat, lon = 28.61, 77.21
+    grid = app.DispersionGrid(lat, lon)
+    # A wide spread puts some trees off the grid and others with their kernel clipped at the edge
+    trees = random_trees(rng, 60, lat, lon, spread_deg=0.03)
+    sources = [{'lat': lat, 'lon': lon, 'intensity': 0.8}]
+    weather = {'wind_direction': 45, 'wind_speed': 8, 'temperature': 31}
+    counts = [0, 1, 5, 17, 60, 80]
+
+    sweep = app.AIClimateEngine(grid=grid).run_scenario_sweep({'trees': trees}, weather, counts)
+
+    engine = app.AIClimateEngine(grid=grid)
+    for row, count in zip(sweep.itertuples(), counts):
+        result = engine.run_scenario_analysis({'sources': sources}, {'trees': trees[:count]}, weather)
+        assert row.pollution_reduction_percent == pytest.approx(result['pollution_reduction_percent'],
+                                                                rel=1e-5, abs=1e-9)
+        assert row.air_quality_improvement == pytest.approx(result['air_quality_improvement'], rel=1e-5, abs=1e-9)
+        assert row.projected_temperature == pytest.approx(result['heat_reduction']['projected_temperature'])
+
+
+def test_scenario_sweep_spans_timelines_and_species_diversity():
+    rng = np.random.default_rng(12)
+    lat, lon = 28.61, 77.21
+    trees = random_trees(rng, 40, lat, lon)
+    timelines = list(app.TIMELINE_MULTIPLIERS)
+    engine = app.AIClimateEngine(grid=app.DispersionGrid(lat, lon))
+
+    sweep = engine.run_scenario_sweep({'trees': trees}, {'temperature': 30}, [10, 40],
+                                      timelines=timelines, species_diversities=[1, 5, 10])
+
+    assert len(sweep) == 2 * len(timelines) * 3
+    for row in sweep.itertuples():
+        expected = (row.air_quality_improvement * app.TIMELINE_MULTIPLIERS[row.timeline]
+                    * app.species_diversity_factor(row.species_diversity))
+        assert row.projected_aqi_improvement == pytest.approx(expected)
+    default_mix = sweep[sweep['species_diversity'] == 5]
+    np.testing.assert_allclose(default_mix['projected_aqi_improvement'],
+                               default_mix['air_quality_improvement'] * default_mix['timeline'].map(app.TIMELINE_MULTIPLIERS))
@@ -0,0 +1,64 @@
+"""Coalescing concurrent calls that share a key"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app
+
+
+def test_concurrent_callers_share_one_call():
+    flight = app.SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(10)
+        return {'pm25': 42}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(flight.do, 'delhi', fetch) for _ in range(8)]
+        while flight.coalesced < 7:
+            time.sleep(0.01)
+        release.set()
+        results = [future.result(timeout=10) for future in futures]
+
+    assert len(calls) == 1 and flight.coalesced == 7
+    assert all(result is results[0] for result in results)
+    # Once the call has finished the next one runs again
+    assert flight.do('delhi', lambda: 'fresh') == 'fresh'
+
+
+def test_waiters_receive_the_leaders_exception():
+    flight = app.SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(10)
+        raise RuntimeError("provider down")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(flight.do, 'k', fail) for _ in range(4)]
+        while flight.coalesced < 3:
+            time.sleep(0.01)
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match="provider down"):
+                future.result(timeout=10)
+    assert flight._calls == {}
+
+
+def test_different_keys_run_independently():
+    flight = app.SingleFlight()
+    barrier = threading.Barrier(3, timeout=10)
+
+    def fetch(key):
+        barrier.wait()  # all three must be in flight at once
+        return key
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(flight.do, key, lambda key=key: fetch(key)) for key in 'abc']
+        assert [future.result(timeout=10) for future in futures] == ['a', 'b', 'c']
+    assert flight.coalesced == 0
@@ -0,0 +1,79 @@
+"""Time-stepped dispersion over weather frames built from the pollution history"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+LAT, LON = 19.08, 72.88
+
+
+def history(days=5, end='2026-10-01'):
+    dates = pd.date_range(end=end, periods=days, freq='D')
+    return pd.DataFrame({'date': dates, 'pm25': np.linspace(40, 80, days)})
+
+
+def scenario(seed=6):
+    rng = np.random.default_rng(seed)
+    sources = [{'lat': LAT + rng.uniform(-0.015, 0.015), 'lon': LON + rng.uniform(-0.015, 0.015),
+                'intensity': rng.uniform(0.3, 1.0)} for _ in range(4)]
+    trees = [{'lat': LAT + rng.uniform(-0.015, 0.015), 'lon': LON + rng.uniform(-0.015, 0.015),
+              'effectiveness': rng.uniform(0.3, 0.9)} for _ in range(30)]
+    return {'sources': sources}, {'trees': trees}
+
+
+def test_weather_frames_replay_for_a_city_and_day():
+    weather = {'wind_direction': 120, 'wind_speed': 8}
+    seed = app.weather_frames_seed(LAT, LON, history())
+    assert seed == app.weather_frames_seed(LAT, LON, history())
+
+    frames = app.build_weather_frames(weather, history(), hourly=True, seed=seed)
+    pd.testing.assert_frame_equal(frames, app.build_weather_frames(weather, history(), hourly=True, seed=seed))
+    assert len(frames) == 5 * 24
+    np.testing.assert_allclose(frames.groupby(frames['time'].dt.date)['weight'].first(),
+                               np.linspace(40, 80, 5) / 60)
+
+    other_city = app.weather_frames_seed(LAT + 1, LON, history())
+    other_day = app.weather_frames_seed(LAT, LON, history(end='2026-10-02'))
+    assert len({seed, other_city, other_day}) == 3
+    assert not np.allclose(frames['wind_direction'],
+                           app.build_weather_frames(weather, history(), seed=other_day)['wind_direction'])
+
+
+@pytest.mark.parametrize('hourly', [True, False])
+def test_time_series_matches_per_frame_dispersion(hourly):
+    baseline, intervention = scenario()
+    frames = app.build_weather_frames({'wind_direction': 250, 'wind_speed': 11}, history(), hourly=hourly, seed=2)
+    engine = app.AIClimateEngine(grid=app.DispersionGrid(LAT, LON))
+    series = engine.run_time_series(baseline, intervention, frames)
+
+    effectiveness = engine._canopy_effectiveness_model(intervention['trees'], None).to_dense()
+    np.testing.assert_allclose(series['effectiveness_grid'].to_dense(), effectiveness)
+
+    exposure = np.zeros_like(effectiveness)
+    covered, total = [], []
+    for frame in frames.itertuples():
+        weather = {'wind_direction': frame.wind_direction, 'wind_speed': frame.wind_speed}
+        dense = engine._pollution_dispersion_model(baseline['sources'], weather, {}).to_dense()
+        exposure += frame.weight * dense
+        covered.append((dense * effectiveness).sum())
+        total.append(dense.sum())
+    covered, total = np.array(covered), np.array(total)
+
+    result = series['frames']
+    np.testing.assert_allclose(result['mean_concentration'], total / engine.grid.size**2, rtol=1e-9)
+    np.testing.assert_allclose(result['exposure_weighted_reduction_percent'], covered / total * 100, rtol=1e-9)
+    np.testing.assert_allclose(series['exposure_grid'].to_dense(), exposure, rtol=1e-9, atol=1e-12)
+    weights = frames['weight'].to_numpy()
+    assert series['exposure_weighted_reduction_percent'] == pytest.approx(
+        (weights * covered).sum() / (weights * total).sum() * 100, rel=1e-9)
+
+
+def test_time_series_without_sources_is_empty():
+    frames = app.build_weather_frames({'wind_direction': 10}, history(days=2), hourly=False, seed=1)
+    series = app.AIClimateEngine(grid=app.DispersionGrid(LAT, LON)).run_time_series(
+        {'sources': []}, scenario()[1], frames)
+
+    assert series['exposure_weighted_reduction_percent'] == 0.0
+    assert (series['frames']['mean_concentration'] == 0).all()
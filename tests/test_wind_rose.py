@@ -0,0 +1,67 @@
+"""Wind-rose dispersion from cached rotation tables"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+LAT, LON = 41.01, 28.98
+
+
+def sources():
+    rng = np.random.default_rng(8)
+    return [{'lat': LAT + rng.uniform(-0.01, 0.01), 'lon': LON + rng.uniform(-0.01, 0.01),
+             'intensity': rng.uniform(0.3, 1.0)} for _ in range(4)]
+
+
+@pytest.mark.parametrize('bin_index', [0, 7, 18, 31])
+def test_single_bin_rose_is_the_plume_at_the_bin_centre(bin_index):
+    engine = app.AIClimateEngine(grid=app.DispersionGrid(LAT, LON))
+    rose = np.zeros(app.WIND_ROSE_BINS)
+    rose[bin_index] = 3.0  # frequencies are normalized
+    direction = bin_index * 360 / app.WIND_ROSE_BINS
+    weather = {'wind_direction': direction, 'wind_speed': 9}
+
+    expected = engine._pollution_dispersion_model(sources(), weather, {}).to_dense()
+    actual = engine._wind_rose_dispersion_model(sources(), dict(weather, wind_rose=rose)).to_dense()
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-12)
+
+
+def test_rose_is_the_frequency_weighted_sum_of_bin_plumes():
+    engine = app.AIClimateEngine(grid=app.DispersionGrid(LAT, LON))
+    rose = np.random.default_rng(1).uniform(0, 1, app.WIND_ROSE_BINS)
+    rose[rose < 0.5] = 0
+    weather = {'wind_speed': 14}
+
+    expected = np.zeros(engine.grid.shape)
+    for index, frequency in enumerate(rose / rose.sum()):
+        if frequency:
+            plume = engine._pollution_dispersion_model(
+                sources(), dict(weather, wind_direction=index * 360 / app.WIND_ROSE_BINS), {})
+            expected += frequency * plume.to_dense()
+    actual = engine._wind_rose_dispersion_model(sources(), dict(weather, wind_rose=list(rose))).to_dense()
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-12)
+
+
+def test_rotation_tables_and_kernels_are_cached():
+    grid = app.DispersionGrid(LAT, LON)
+    assert grid.rotation_table() is app.DispersionGrid(LAT + 1, LON).rotation_table()
+    assert grid.rotation_table(12) is not grid.rotation_table()
+
+    engine = app.AIClimateEngine(grid=grid)
+    rose = [1.0] * app.WIND_ROSE_BINS
+    engine._wind_rose_dispersion_model(sources(), {'wind_speed': 10, 'wind_rose': rose})
+    kernels = engine._rose_kernels[(3.0, app.WIND_ROSE_BINS)]
+    engine._wind_rose_dispersion_model(sources(), {'wind_speed': 10, 'wind_rose': rose[::-1]})
+    assert engine._rose_kernels[(3.0, app.WIND_ROSE_BINS)] is kernels
+
+
+def test_rose_from_frames_weights_each_bin():
+    frames = pd.DataFrame({'wind_direction': [0, 2, 355, 90, 95], 'weight': [1, 1, 2, 3, 1]})
+    rose = app.wind_rose_from_frames(frames, bins=36)
+
+    assert len(rose) == 36 and sum(rose) == pytest.approx(1)
+    assert rose[0] == pytest.approx(4 / 8)  # 355 rounds into the 0 bin
+    assert rose[9] == pytest.approx(3 / 8)
+    assert rose[10] == pytest.approx(1 / 8)